@@ -0,0 +1,197 @@
+"""Lectura incremental del dataset de transcripts de Apify.
+
+run-sync-get-dataset-items devuelve un array JSON con un item por video. En lugar de
+cargar la respuesta entera con response.json(), los items se decodifican uno a uno a
+medida que llegan los bytes y cada uno se reduce enseguida a un registro normalizado
+{video_id, url, text}; el item original (captions, metadatos del canal...) se descarta.
+Así la memoria depende del video más largo y no del tamaño del lote.
+"""
+import codecs
+import json
+import os
+
+from logs import get_logger
+from video_metadata import parse_video_id
+
+log = get_logger("apify_dataset")
+
+# Bytes que se leen de la respuesta de Apify en cada paso
+APIFY_STREAM_CHUNK_SIZE = int(os.getenv("APIFY_STREAM_CHUNK_SIZE", "65536"))
+
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayParser:
+    """Parser incremental de un array JSON: feed(texto) devuelve los elementos ya completos
+
+    Si la raíz no es un array (p. ej. {"error": ...} o un único item) se acumula entera
+    y se devuelve en close().
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        # Tamaño pendiente con el que falló el último intento de decodificar un elemento
+        self._failed_at = 0
+
+    @property
+    def is_array(self):
+        return self._state != "root"
+
+    def _skip_whitespace(self):
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _error(self, message):
+        return ValueError(f"Respuesta de Apify no es JSON válido: {message}")
+
+    def _drain(self, final=False):
+        items = []
+        while self._skip_whitespace():
+            char = self._buffer[self._pos]
+            if self._state == "start":
+                if char != "[":
+                    self._state = "root"
+                    break
+                self._pos += 1
+                self._state = "first"
+            elif self._state in ("first", "value"):
+                if char == "]" and self._state == "first":
+                    self._pos += 1
+                    self._state = "end"
+                    continue
+                pending = len(self._buffer) - self._pos
+                # Un elemento grande llega en muchos trozos: no se reintenta hasta que lo
+                # pendiente se duplique, para que el coste total siga siendo lineal
+                if not final and pending < 2 * self._failed_at:
+                    break
+                try:
+                    item, end = _decoder.raw_decode(self._buffer, self._pos)
+                except json.JSONDecodeError as e:
+                    if final:
+                        raise self._error(e)
+                    self._failed_at = pending
+                    break
+                # Un número al final del buffer podría seguir en el próximo trozo
+                if end == len(self._buffer) and not final and isinstance(item, (int, float)):
+                    self._failed_at = pending
+                    break
+                items.append(item)
+                self._pos = end
+                self._failed_at = 0
+                self._state = "separator"
+            elif self._state == "separator":
+                self._pos += 1
+                if char == ",":
+                    self._state = "value"
+                elif char == "]":
+                    self._state = "end"
+                else:
+                    raise self._error(f"carácter inesperado {char!r}")
+            elif self._state == "end":
+                raise self._error("datos después del array")
+            else:
+                break
+        if self._state != "root":
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        return items
+
+    def feed(self, text):
+        self._buffer += text
+        return self._drain()
+
+    def close(self):
+        """Procesa lo que quede en el buffer y comprueba que el JSON terminó bien"""
+        items = self._drain(final=True)
+        if self._state == "root":
+            try:
+                items.append(json.loads(self._buffer))
+            except json.JSONDecodeError as e:
+                raise self._error(e)
+        elif self._state != "end":
+            raise self._error("respuesta incompleta")
+        self._buffer = ""
+        return items
+
+
+def transcript_from_item(item):
+    """Extrae el texto del transcript de un item de Apify (formatos 'text', 'captions' o string)"""
+    if isinstance(item, str):
+        return item
+    if not isinstance(item, dict):
+        return None
+
+    # Formato con campo 'text' (nuevo formato simplificado)
+    if item.get('text'):
+        return item['text']
+
+    # Formato antiguo con 'captions'
+    if item.get('captions'):
+        caption_texts = []
+        for caption in item['captions']:
+            if isinstance(caption, dict) and 'text' in caption:
+                caption_texts.append(caption['text'])
+            elif isinstance(caption, str):
+                caption_texts.append(caption)
+            else:
+                caption_texts.append(str(caption))
+        # Un caption por línea para que el chunker pueda cortar en sus límites
+        return "\n".join(caption_texts)
+
+    log.warning("Item de Apify sin transcript; keys disponibles: %s", list(item.keys()))
+    return None
+
+
+def video_id_from_item(item):
+    """Obtiene el video ID de un item de Apify, si lo trae"""
+    if not isinstance(item, dict):
+        return None
+    video_id = item.get('videoId') or item.get('id')
+    if not video_id and item.get('url'):
+        try:
+            video_id = parse_video_id(item['url'])
+        except ValueError:
+            video_id = None
+    return video_id
+
+
+def normalize_item(item):
+    """Reduce un item de Apify a {video_id, url, text}; None si no trae transcript"""
+    if isinstance(item, dict) and 'error' in item and not item.get('text') and not item.get('captions'):
+        log.warning("Error de Apify: %s", item['error'], extra={"video_id": video_id_from_item(item)})
+        return None
+    text = transcript_from_item(item)
+    if not text:
+        return None
+    return {
+        "video_id": video_id_from_item(item),
+        "url": item.get('url') if isinstance(item, dict) else None,
+        "text": text,
+    }
+
+
+def _normalized(items, root_is_array):
+    for item in items:
+        # {"error": ...} como raíz es un fallo de la llamada entera, no de un video
+        if not root_is_array and isinstance(item, dict) and 'error' in item:
+            log.error("Error de Apify: %s", item['error'])
+            raise ValueError(f"Apify error: {item['error']}")
+        record = normalize_item(item)
+        if record:
+            yield record
+
+
+async def aiter_transcript_records(byte_chunks):
+    """Genera un registro normalizado por video a partir de los bytes (iterable asíncrono) de la respuesta"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = JsonArrayParser()
+    async for chunk in byte_chunks:
+        for record in _normalized(parser.feed(decoder.decode(chunk)), True):
+            yield record
+    parser.feed(decoder.decode(b"", final=True))
+    for record in _normalized(parser.close(), parser.is_array):
+        yield record
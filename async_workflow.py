@@ -0,0 +1,911 @@
+"""Workflow de videos sobre asyncio: la única implementación de las llamadas externas.
+
+Todas las etapas usan el cliente HTTP asíncrono de http_client, de modo que muchos
+videos pueden procesarse a la vez en un solo event loop; los límites de concurrencia
+por proveedor están en http_client.PROVIDER_CONCURRENCY. La configuración, la
+construcción de peticiones, el parseo de respuestas, los prompts y las cachés están
+en workflow.py, que además ejecuta este workflow desde la línea de comandos.
+"""
+import asyncio
+import json
+import time
+import weakref
+from datetime import datetime
+
+import httpx
+
+import hedging
+import fair_share
+import http_client
+import metrics
+import workflow
+from apify_dataset import APIFY_STREAM_CHUNK_SIZE, aiter_transcript_records
+from cache import summary_cache
+from chunking import estimate_tokens, split_transcript
+from circuit_breaker import CircuitOpenError
+from job_queue import PermanentJobError
+from logs import get_logger, job_context, lazy
+from pipeline import Pipeline, Stage
+from playlist_checkpoint import DELETED, SAVED, SUMMARIZED, TRANSCRIBED, playlist_checkpoint, reached
+from rate_limit import RateLimitError
+from readwise_ledger import document_key, readwise_ledger
+from video_metadata import MetadataBatcher, parse_video_id
+
+log = get_logger("async_workflow")
+
+
+async def send_notification(message):
+    """Envía notificación a tu teléfono"""
+    if workflow.PUSHOVER_TOKEN and workflow.PUSHOVER_USER:
+        try:
+            await http_client.apost(workflow.PUSHOVER_URL, json=workflow._pushover_payload(message))
+        except Exception:
+            pass
+
+
+async def send_telegram_message(chat_id, message, parse_mode="HTML"):
+    """Envía mensaje a Telegram; devuelve su message_id (None si no se pudo enviar)"""
+    if workflow.TELEGRAM_BOT_TOKEN:
+        try:
+            response = await http_client.apost(
+                workflow._telegram_url("sendMessage"),
+                json=workflow._telegram_message_payload(chat_id, message, parse_mode),
+            )
+            return (response.json().get("result") or {}).get("message_id")
+        except Exception as e:
+            log.warning("Error enviando mensaje a Telegram: %s", e)
+    return None
+
+
+async def edit_telegram_message(chat_id, message_id, message):
+    """Reemplaza el texto de un mensaje ya enviado (texto plano)"""
+    if workflow.TELEGRAM_BOT_TOKEN and message_id:
+        try:
+            await http_client.apost(
+                workflow._telegram_url("editMessageText"),
+                json=workflow._telegram_edit_payload(chat_id, message_id, message),
+            )
+        except Exception as e:
+            log.warning("Error editando mensaje de Telegram: %s", e)
+
+
+async def _fetch_videos_info(video_ids):
+    """Una llamada a videos de la YouTube Data API para un lote de hasta 50 IDs"""
+    response = await http_client.aget(workflow.YT_VIDEOS_URL, params=workflow._video_info_params(video_ids))
+    if response.status_code != 200:
+        try:
+            error_msg = response.json().get('error', {}).get('message', f'HTTP {response.status_code}')
+        except ValueError:
+            error_msg = f'HTTP {response.status_code}'
+        # Un 4xx (clave inválida, petición mal formada) no se arregla reintentando; un 429 sí
+        error_class = PermanentJobError if 400 <= response.status_code < 500 and response.status_code != 429 else ValueError
+        raise error_class(f"YouTube videos error: {error_msg}")
+    return workflow._parse_videos_response(response.json())
+
+
+# Junta las consultas de metadatos que llegan a la vez (varios mensajes de Telegram)
+_metadata_batcher = MetadataBatcher(_fetch_videos_info)
+
+
+async def get_video_info(video_url):
+    """Obtiene información de un video de YouTube individual"""
+    return await _metadata_batcher.get(parse_video_id(video_url))
+
+
+async def get_playlist_videos(playlist_id):
+    """Recorre todas las páginas de la playlist y genera una tupla de listas por página"""
+    page_token = None
+    while True:
+        with metrics.STAGE_SECONDS.time(stage="playlist_fetch"):
+            response = await http_client.aget(
+                workflow.YT_PLAYLIST_ITEMS_URL, params=workflow._playlist_params(playlist_id, page_token)
+            )
+        data = response.json()
+        if response.status_code != 200:
+            error_msg = data.get('error', {}).get('message', f'HTTP {response.status_code}')
+            raise ValueError(f"YouTube playlistItems error: {error_msg}")
+
+        yield workflow._parse_playlist_items(data)
+
+        page_token = data.get('nextPageToken')
+        if not page_token:
+            break
+
+
+# Un lock por event loop (asyncio.Lock no se comparte entre loops); se olvida con el loop
+_token_locks = weakref.WeakKeyDictionary()
+
+
+def _token_lock():
+    loop = asyncio.get_running_loop()
+    lock = _token_locks.get(loop)
+    if lock is None:
+        lock = _token_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def _get_youtube_access_token():
+    """Obtiene un token de acceso OAuth 2.0 (de la caché o refrescándolo con el Refresh Token)
+
+    Solo refresca una tarea a la vez: las demás esperan el lock y encuentran el token
+    nuevo en la caché, en vez de pedir cada una el suyo.
+    """
+    token = workflow._youtube_token_cache.get()
+    if token:
+        return token
+
+    async with _token_lock():
+        token = workflow._youtube_token_cache.get()
+        if token:
+            return token
+        response = await http_client.apost(workflow.YT_OAUTH_TOKEN_URL, data=workflow._youtube_token_request_data())
+        if response.status_code != 200:
+            log.error("❌ Error de Google Auth (%s): %s", response.status_code, response.text)
+            response.raise_for_status()
+        return workflow._youtube_token_cache.store(response.json())
+
+
+async def _delete_playlist_item(item_id, headers):
+    """Borra un item de la playlist con backoff ante 5xx; devuelve True si se borró"""
+    for attempt in range(workflow.YT_DELETE_MAX_RETRIES + 1):
+        try:
+            response = await http_client.adelete(workflow.YT_PLAYLIST_ITEMS_URL, params={"id": item_id}, headers=headers)
+        except Exception as e:
+            log.error("❌ Excepción al eliminar %s: %s", item_id, e)
+            return False
+
+        if response.status_code == 204:
+            log.debug("🗑️ Eliminado item %s de la playlist", item_id)
+            return True
+        if response.status_code == 401:
+            workflow._youtube_token_cache.invalidate()
+        if not workflow._is_retryable_status(response.status_code) or attempt == workflow.YT_DELETE_MAX_RETRIES:
+            log.warning("⚠️ Error eliminando %s: %s - %s", item_id, response.status_code, response.text)
+            return False
+        metrics.RETRIES.inc(operation="playlist_delete")
+        await asyncio.sleep(workflow._retry_delay(response, attempt))
+    return False
+
+
+async def clear_playlist_items(playlist_item_ids, max_workers=None):
+    """Elimina los videos de la playlist de YouTube en paralelo; devuelve {'deleted': [...], 'failed': [...]}"""
+    if not playlist_item_ids:
+        log.info("No hay items para borrar de la playlist.")
+        return {"deleted": [], "failed": []}
+
+    try:
+        access_token = await _get_youtube_access_token()
+    except Exception as e:
+        log.error("❌ Error obteniendo token de acceso para YouTube: %s", e)
+        return {"deleted": [], "failed": list(playlist_item_ids)}
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    semaphore = asyncio.Semaphore(max_workers or workflow.YT_DELETE_WORKERS)
+
+    async def delete_one(item_id):
+        async with semaphore:
+            return await _delete_playlist_item(item_id, headers)
+
+    with metrics.STAGE_SECONDS.time(stage="playlist_cleanup"):
+        results = await asyncio.gather(*[delete_one(item_id) for item_id in playlist_item_ids])
+    deleted = [item_id for item_id, ok in zip(playlist_item_ids, results) if ok]
+    return workflow._clear_summary(playlist_item_ids, deleted)
+
+
+async def get_transcripts(video_urls):
+    """Obtiene transcripciones con Apify; genera un registro {video_id, url, text} por video"""
+    url, payload = workflow._apify_request(video_urls)
+    log.info("Enviando petición a Apify con %d URLs", len(video_urls))
+    async with http_client.astream("POST", url, json=payload, timeout=300) as response:
+        if response.status_code not in [200, 201]:
+            body = (await response.aread()).decode("utf-8", errors="replace")
+            raise workflow._apify_http_error(response.status_code, body)
+        async for record in aiter_transcript_records(response.aiter_bytes(APIFY_STREAM_CHUNK_SIZE)):
+            yield record
+
+
+async def get_transcripts_by_video(video_urls, video_ids):
+    """Devuelve {video_id: transcript} usando la caché local y pidiendo a Apify solo los que faltan"""
+    transcripts_map, missing_urls, missing_ids = workflow._split_cached_transcripts(video_urls, video_ids)
+    if not missing_ids:
+        return transcripts_map
+
+    # Cada registro se asigna (y se guarda en caché) según llega, sin acumular la respuesta
+    assignment = workflow._TranscriptAssignment(missing_ids)
+    with metrics.STAGE_SECONDS.time(stage="apify"):
+        async for record in get_transcripts(missing_urls):
+            assignment.add(record)
+    transcripts_map.update(assignment.finish())
+    return transcripts_map
+
+
+async def _stream_llm(provider, url, headers, payload, prompt, parse_response, stream_text, on_progress):
+    """Llamada SSE al LLM: va pasando el texto acumulado a on_progress y devuelve el total"""
+    started = time.monotonic()
+    parts = []
+    async with http_client.astream("POST", url, headers=headers, json=payload, timeout=workflow.LLM_TIMEOUT,
+                                   rate_tokens=estimate_tokens(prompt)) as response:
+        if response.status_code != 200:
+            body = await response.aread()
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = {}
+            parse_response(response.status_code, data if isinstance(data, dict) else {})
+        if "text/event-stream" not in response.headers.get("content-type", ""):
+            # El proveedor ignoró el streaming y devolvió la respuesta completa
+            result = parse_response(response.status_code, json.loads(await response.aread()))
+            on_progress(result)
+            workflow._record_llm_latency(provider, started)
+            return result
+        async for line in response.aiter_lines():
+            data = workflow._sse_data(line)
+            if not data:
+                continue
+            text = stream_text(data)
+            if text is None:
+                break
+            if text:
+                parts.append(text)
+                on_progress("".join(parts))
+    result = "".join(parts)
+    if not result:
+        raise ValueError(f"{provider}: respuesta vacía")
+    workflow._record_llm_latency(provider, started)
+    return result
+
+
+async def _call_openrouter(prompt, on_progress=None):
+    """Llama a Gemini a través de OpenRouter (evita bloqueo de IP)
+
+    Con on_progress la respuesta llega por streaming y se va notificando el texto parcial.
+    """
+    if on_progress is not None:
+        url, headers, payload = workflow._openrouter_request(prompt, stream=True)
+        return await _stream_llm("openrouter", url, headers, payload, prompt,
+                                 workflow._parse_openrouter_response, workflow._openrouter_stream_text, on_progress)
+    url, headers, payload = workflow._openrouter_request(prompt)
+    started = time.monotonic()
+    response = await http_client.apost(url, headers=headers, json=payload, timeout=workflow.LLM_TIMEOUT,
+                                       rate_tokens=estimate_tokens(prompt))
+    result = workflow._parse_openrouter_response(response.status_code, response.json())
+    workflow._record_llm_latency("openrouter", started)
+    return result
+
+
+async def _call_gemini_direct(prompt, on_progress=None):
+    """Llama directamente a la API de Gemini (por streaming si se pasa on_progress)"""
+    if on_progress is not None:
+        url, payload = workflow._gemini_request(prompt, stream=True)
+        return await _stream_llm("gemini", url, None, payload, prompt,
+                                 workflow._parse_gemini_response, workflow._gemini_stream_text, on_progress)
+    url, payload = workflow._gemini_request(prompt)
+    started = time.monotonic()
+    response = await http_client.apost(url, json=payload, timeout=workflow.LLM_TIMEOUT,
+                                       rate_tokens=estimate_tokens(prompt))
+    result = workflow._parse_gemini_response(response.status_code, response.json())
+    workflow._record_llm_latency("gemini", started)
+    return result
+
+
+async def _summarize_hedged(prompt, max_retries):
+    """Como _summarize_uncached pero corriendo OpenRouter y Gemini en modo hedged"""
+    last_error = None
+    for attempt in range(1, max_retries + 1):
+        if attempt > 1:
+            metrics.RETRIES.inc(operation="llm")
+        workflow._check_llm_circuits()
+        try:
+            log.debug("Intento %d/%d (hedged OpenRouter/Gemini)...", attempt, max_retries)
+            provider, result = await hedging.arun_hedged(
+                *workflow._hedge_providers(prompt, _call_openrouter, _call_gemini_direct)
+            )
+            log.debug("✅ Resumen generado via %s", provider)
+            return result, workflow._HEDGE_MODELS[provider]
+        except (ValueError, httpx.HTTPError) as e:
+            last_error = str(e)
+            log.warning("❌ Error (intento %d): %s", attempt, e)
+            if attempt < max_retries:
+                await asyncio.sleep(attempt * 3)
+
+    raise ValueError(f"Error al generar resumen después de {max_retries} intentos: {last_error}")
+
+
+async def _summarize_uncached(prompt, max_retries, on_progress=None):
+    """Llama al LLM con reintentos y fallback; devuelve (resumen, modelo usado)
+
+    on_progress(texto_parcial) activa el streaming (salvo en modo hedged, donde dos
+    respuestas parciales competirían por el mismo mensaje).
+    """
+    metrics.PROMPT_TOKENS.observe(estimate_tokens(prompt))
+    if hedging.LLM_HEDGE_ENABLED and workflow.OPENROUTER_KEY and workflow.GEMINI_KEY:
+        return await _summarize_hedged(prompt, max_retries)
+
+    last_error = None
+    for attempt in range(1, max_retries + 1):
+        if attempt > 1:
+            metrics.RETRIES.inc(operation="llm")
+        workflow._check_llm_circuits()
+        try:
+            # Intentar con OpenRouter primero (evita bloqueo de IP de Render), salvo que su
+            # circuito esté abierto: entonces se va directo a Gemini
+            if workflow._use_openrouter():
+                log.debug("Intento %d/%d via OpenRouter...", attempt, max_retries)
+                result = await _call_openrouter(prompt, on_progress)
+                log.debug("✅ Resumen generado via OpenRouter")
+                return result, workflow.OPENROUTER_MODEL
+
+            # Fallback: Gemini directo (funciona localmente, puede fallar en Render)
+            if workflow.GEMINI_KEY:
+                if workflow.OPENROUTER_KEY:
+                    metrics.LLM_FALLBACKS.inc(from_provider="openrouter", to_provider="gemini")
+                log.debug("Intento %d/%d via Gemini directo...", attempt, max_retries)
+                result = await _call_gemini_direct(prompt, on_progress)
+                log.debug("✅ Resumen generado via Gemini directo")
+                return result, workflow.GEMINI_MODEL
+
+            raise ValueError("No hay API key configurada. Configura OPENROUTER_KEY o GEMINI_KEY.")
+
+        except ValueError as e:
+            last_error = str(e)
+            log.warning("❌ Error (intento %d): %s", attempt, e)
+
+            # Si OpenRouter falló, intentar Gemini directo como fallback
+            if workflow.OPENROUTER_KEY and workflow.GEMINI_KEY and 'OpenRouter' in str(e):
+                try:
+                    log.info("Intentando fallback con Gemini directo...")
+                    metrics.LLM_FALLBACKS.inc(from_provider="openrouter", to_provider="gemini")
+                    result = await _call_gemini_direct(prompt, on_progress)
+                    log.info("✅ Resumen generado via Gemini directo (fallback)")
+                    return result, workflow.GEMINI_MODEL
+                except ValueError as e2:
+                    log.warning("❌ Fallback Gemini también falló: %s", e2)
+                    last_error = f"OpenRouter: {e} | Gemini: {e2}"
+
+            # Tras un 429 el limitador del proveedor ya impone la espera del Retry-After, y
+            # con un circuito abierto la siguiente vuelta decide sin esperar
+            if attempt < max_retries and not isinstance(e, (RateLimitError, CircuitOpenError)):
+                wait_time = attempt * 3
+                log.debug("Esperando %ds antes de reintentar...", wait_time)
+                await asyncio.sleep(wait_time)
+
+        except httpx.HTTPError as e:
+            last_error = str(e)
+            log.warning("Error de conexión (intento %d): %s", attempt, e)
+            if attempt < max_retries:
+                await asyncio.sleep(attempt * 3)
+
+    raise ValueError(f"Error al generar resumen después de {max_retries} intentos: {last_error}")
+
+
+async def _summarize_chunk(chunk, video_title, part, total_parts, max_retries):
+    """Fase map: genera las notas de una parte (con caché propia)"""
+    prompt = workflow._build_chunk_prompt(chunk, video_title, part, total_parts)
+    cached = workflow._get_cached_summary(chunk, prompt)
+    if cached is not None:
+        return cached
+    result, model = await _summarize_uncached(prompt, max_retries)
+    summary_cache.set(workflow._summary_cache_key(chunk, prompt, model), result)
+    return result
+
+
+async def _summarize_map_reduce(text, video_title, max_retries, on_progress=None):
+    """Resume un transcript largo por partes y une las notas en el formato NIVEL 1 / NIVEL 2"""
+    chunks = split_transcript(text, workflow.SUMMARY_CHUNK_TOKENS)
+    total = len(chunks)
+    log.info("✂️ Transcript largo (%d tokens aprox.): resumiendo en %d partes", estimate_tokens(text), total)
+
+    # La concurrencia real la limita el semáforo del proveedor en http_client
+    notes = await asyncio.gather(*[
+        _summarize_chunk(chunk, video_title, i + 1, total, max_retries)
+        for i, chunk in enumerate(chunks)
+    ])
+
+    log.info("🧩 Combinando notas de %d partes...", total)
+    prompt = workflow._build_reduce_prompt(workflow._combine_chunk_notes(notes), video_title, total)
+    # Solo la combinación final se emite por streaming: es la que produce el NIVEL 1
+    return await _summarize_uncached(prompt, max_retries, on_progress)
+
+
+async def summarize_with_gemini(text, video_title="Video", max_retries=3, on_progress=None):
+    """Resume texto usando OpenRouter (primario) o Gemini directo (fallback)
+
+    Con on_progress(texto_parcial) la respuesta se recibe por streaming (SSE).
+    """
+    prompt = workflow._build_summary_prompt(text, video_title)
+
+    cached = workflow._get_cached_summary(text, prompt)
+    if cached is not None:
+        return cached
+
+    # Transcripts muy largos: resumir por partes en paralelo y combinar
+    with metrics.STAGE_SECONDS.time(stage="summary"):
+        if estimate_tokens(text) > workflow.SUMMARY_CHUNK_THRESHOLD_TOKENS:
+            result, model = await _summarize_map_reduce(text, video_title, max_retries, on_progress)
+        else:
+            result, model = await _summarize_uncached(prompt, max_retries, on_progress)
+    summary_cache.set(workflow._summary_cache_key(text, prompt, model), result)
+    return result
+
+
+async def _summarize_video_safe(transcript, title):
+    """Resume un video; devuelve (resumen, None) o (None, error) en vez de propagar la excepción"""
+    try:
+        return await summarize_with_gemini(transcript, title), None
+    except Exception as e:
+        log.error("❌ No se pudo resumir '%s': %s", title, e)
+        return None, str(e)
+
+
+async def save_to_readwise(html_content, title, video_url=None):
+    """Guarda en Readwise con timeout y reintentos; un documento ya guardado no se reenvía"""
+    headers, payload = workflow._readwise_request(html_content, title, video_url)
+    key = document_key(html_content, title, payload["url"])
+    saved = workflow._already_saved(key, title)
+    if saved is not None:
+        return saved
+
+    with metrics.STAGE_SECONDS.time(stage="readwise_save"):
+        for attempt in range(workflow.READWISE_MAX_RETRIES + 1):
+            response = None
+            try:
+                response = await http_client.apost(
+                    workflow.READWISE_SAVE_URL, headers=headers, json=payload, timeout=workflow.READWISE_TIMEOUT
+                )
+            except httpx.HTTPError as e:
+                error = e
+            else:
+                if response.status_code in (200, 201):
+                    result = response.json()
+                    readwise_ledger.record(key, title, payload["url"], result)
+                    return result
+                error = workflow._readwise_error(response.status_code, response.text)
+                if not workflow._is_retryable_status(response.status_code):
+                    raise error
+            if attempt < workflow.READWISE_MAX_RETRIES:
+                log.warning("⚠️ Readwise falló (intento %d): %s", attempt + 1, error)
+                metrics.RETRIES.inc(operation="readwise")
+                await asyncio.sleep(workflow._retry_delay(response, attempt))
+        raise error
+
+
+async def save_documents_to_readwise(documents, title, video_url=None):
+    """Guarda cada parte del resumen como un documento de Readwise; devuelve sus respuestas"""
+    return await asyncio.gather(*[
+        save_to_readwise(document, part_title, part_url)
+        for document, part_title, part_url in workflow._document_parts(documents, title, video_url)
+    ])
+
+
+class _VideoFlight:
+    """Procesado en curso de un video, compartido por todos los chats que lo pidieron"""
+
+    def __init__(self):
+        self.chat_ids = []
+        self.task = None
+
+    async def notify(self, message):
+        """Envía un mensaje de progreso a todos los chats que esperan este video"""
+        await asyncio.gather(*[send_telegram_message(chat_id, message) for chat_id in list(self.chat_ids)])
+
+
+class _SummaryProgress:
+    """Muestra el NIVEL 1 a medida que llega editando un mensaje por chat, como mucho
+    una vez cada TELEGRAM_EDIT_INTERVAL segundos"""
+
+    def __init__(self, chat_ids, interval=workflow.TELEGRAM_EDIT_INTERVAL):
+        # La lista viva del flight: los chats que se unen a mitad también reciben el resumen
+        self.chat_ids = chat_ids
+        self.interval = interval
+        self.message_ids = {}
+        self._contacted = set()
+        self._latest = ""
+        self._shown = None
+        self._last_edit = 0.0
+        self._edit_task = None
+
+    async def start(self, message):
+        """Envía el mensaje que se irá editando con el resumen parcial"""
+        await self._send_to_new_chats(message, parse_mode="HTML")
+
+    async def _send_to_new_chats(self, message, parse_mode=None):
+        """Envía message a los chats que aún no tienen mensaje; devuelve cuáles eran"""
+        new_chats = [chat_id for chat_id in dict.fromkeys(self.chat_ids) if chat_id not in self._contacted]
+        self._contacted.update(new_chats)
+        ids = await asyncio.gather(*[send_telegram_message(chat_id, message, parse_mode) for chat_id in new_chats])
+        self.message_ids.update({chat_id: message_id for chat_id, message_id in zip(new_chats, ids) if message_id})
+        return new_chats
+
+    def update(self, partial_summary):
+        """Callback del streaming: programa una edición si ha pasado el intervalo"""
+        self._latest = partial_summary
+        if self._edit_task is not None and not self._edit_task.done():
+            return
+        if time.monotonic() - self._last_edit >= self.interval:
+            self._edit_task = asyncio.ensure_future(self._edit())
+
+    async def _edit(self):
+        preview = workflow._summary_preview(self._latest)
+        if not preview:
+            return
+        # Quien se unió después recibe un mensaje nuevo que ya trae el resumen parcial
+        joined = await self._send_to_new_chats(preview)
+        if preview == self._shown:
+            return
+        self._shown = preview
+        self._last_edit = time.monotonic()
+        await asyncio.gather(*[
+            edit_telegram_message(chat_id, message_id, preview)
+            for chat_id, message_id in list(self.message_ids.items())
+            if chat_id not in joined
+        ])
+
+    async def finish(self, summary):
+        """Deja en el mensaje el NIVEL 1 completo"""
+        if self._edit_task is not None:
+            await self._edit_task
+        self._latest = summary
+        await self._edit()
+
+
+# Procesados en curso por video_id: peticiones simultáneas del mismo video comparten uno
+_video_flights = {}
+
+
+async def _run_video_flight(video_url, flight):
+    """Obtiene transcript, resumen y guarda en Readwise una sola vez; devuelve la info del video"""
+    # Obtener información del video
+    video_info = await get_video_info(video_url)
+    log.info("📹 Video: %s", video_info['title'], extra={"video_id": video_info['video_id']})
+
+    # Obtener transcripción (primero de la caché local, si no de Apify)
+    log.debug("📝 Obteniendo transcripción...")
+    transcripts_map = await get_transcripts_by_video([video_url], [video_info['video_id']])
+    transcript = transcripts_map.get(video_info['video_id'])
+
+    if not transcript:
+        raise PermanentJobError("No se pudo obtener la transcripción del video")
+
+    log.debug("Texto total para resumen: %d caracteres", len(transcript))
+    text, _, _ = workflow.compact_for_summary(transcript, video_info['title'])
+
+    # Generar resumen; con streaming, el NIVEL 1 se va mostrando en el chat según llega
+    log.info("🤖 Generando resumen con Gemini...")
+    if workflow.LLM_STREAMING_ENABLED and workflow.TELEGRAM_BOT_TOKEN:
+        progress = _SummaryProgress(flight.chat_ids)
+        await progress.start("🤖 Generando resumen con IA...")
+        summary = await summarize_with_gemini(text, on_progress=progress.update)
+        await progress.finish(summary)
+    else:
+        await flight.notify("🤖 <b>Generando resumen con IA...</b>")
+        summary = await summarize_with_gemini(text)
+    log.info("✅ Resumen generado")
+
+    # Formatear HTML
+    log.debug("🎨 Formateando HTML...")
+    documents = workflow.format_as_documents(summary, [transcript], [video_info['title']], video_url)
+
+    # Guardar en Readwise
+    log.info("💾 Guardando en Readwise...")
+    await flight.notify("💾 <b>Guardando en Readwise...</b>")
+    result = await save_documents_to_readwise(documents, f"Video - {video_info['title']}", video_url)
+    log.info("✅ Guardado en Readwise: %s", result)
+    return video_info
+
+
+def _join_video_flight(video_id, video_url, chat_id):
+    """Devuelve (flight, nuevo) para el video, creando el procesado si no hay uno en curso"""
+    flight = _video_flights.get(video_id)
+    if flight is not None:
+        flight.chat_ids.append(chat_id)
+        return flight, False
+
+    flight = _VideoFlight()
+    flight.chat_ids.append(chat_id)
+    flight.task = asyncio.create_task(_run_video_flight(video_url, flight))
+
+    def forget(_task):
+        if _video_flights.get(video_id) is flight:
+            del _video_flights[video_id]
+
+    flight.task.add_done_callback(forget)
+    _video_flights[video_id] = flight
+    return flight, True
+
+
+async def process_video_from_telegram(video_url, chat_id, attempt=1):
+    """Procesa un video individual enviado desde Telegram
+
+    Si el mismo video ya se está procesando (mensaje repetido o pegado en otro chat),
+    se espera a ese procesado en lugar de repetir Apify, LLM y Readwise; cada chat
+    recibe igualmente su respuesta. El aviso de inicio solo se envía en el primer
+    intento, y los errores no se notifican aquí: lo hace el worker cuando el trabajo
+    ya no se va a reintentar.
+    """
+    with job_context(), fair_share.tenant_context("telegram"):
+        await _process_video_from_telegram(video_url, chat_id, attempt)
+
+
+async def _process_video_from_telegram(video_url, chat_id, attempt):
+    log.info("🚀 Iniciando procesamiento desde Telegram: %s (intento %d)", video_url, attempt)
+    try:
+        video_id = parse_video_id(video_url)
+    except ValueError as e:
+        raise PermanentJobError(str(e)) from e
+    flight, started = _join_video_flight(video_id, video_url, chat_id)
+    if not started:
+        log.info("🔗 Video %s ya en proceso, esperando el resultado compartido", video_id)
+    if attempt == 1:
+        if started:
+            await send_telegram_message(chat_id, "🚀 <b>Procesando video...</b>\nExtrayendo información y transcripción")
+        else:
+            await send_telegram_message(chat_id, "⏳ <b>Este video ya se está procesando</b>\nTe aviso en cuanto esté listo.")
+
+    # shield: si este chat se cancela, el procesado sigue para los demás
+    video_info = await asyncio.shield(flight.task)
+
+    # Notificar éxito
+    await send_telegram_message(chat_id, f"✅ <b>¡Listo!</b>\n\n📹 <b>{video_info['title']}</b>\n👤 {video_info['channel']}\n\nEl resumen ha sido guardado en Readwise.")
+    log.info("✅ Proceso completado exitosamente")
+
+
+def _restore_progress(record, progress):
+    """Retoma el video donde lo dejó un intento anterior (ver playlist_checkpoint)
+
+    Un video que ya agotó sus intentos fallidos se salta (skipped) con su último error:
+    sigue en la playlist, pero no vuelve a pasar por Apify ni por el LLM.
+    """
+    record["stage"] = progress["stage"] if progress else None
+    record["resumed"] = reached(record["stage"], SUMMARIZED)
+    record["skipped"] = not record["resumed"] and playlist_checkpoint.exhausted(progress)
+    if record["resumed"]:
+        record.update(error=None, tokens_before=0, tokens_after=0, summary=progress["summary"],
+                      html_block=progress["html_block"])
+    elif record["skipped"]:
+        record.update(error=progress["error"] or "Demasiados intentos fallidos", summary=None,
+                      tokens_before=0, tokens_after=0)
+    record["saved"] = reached(record["stage"], SAVED)
+    return record
+
+
+def _pending(record):
+    """True si al video aún le falta el resumen (las etapas 1-4 no se saltan)"""
+    return not reached(record["stage"], SUMMARIZED)
+
+
+async def _iter_playlist_records(playlist_id):
+    """Convierte las páginas de la playlist en un registro por video, en orden"""
+    progress = playlist_checkpoint.load(playlist_id)
+    index = 0
+    async for page in get_playlist_videos(playlist_id):
+        page_urls, page_titles, page_ids, page_item_ids, page_channels = page
+        log.info("📄 Página con %d videos", len(page_ids))
+        log.debug("📄 IDs de la página: %s", lazy(", ".join, page_ids))
+        for url, title, video_id, item_id, channel in zip(page_urls, page_titles, page_ids, page_item_ids, page_channels):
+            yield _restore_progress({
+                "index": index,
+                "playlist_id": playlist_id,
+                "url": url,
+                "title": title,
+                "video_id": video_id,
+                "item_id": item_id,
+                "channel": channel,
+            }, progress.get(item_id))
+            index += 1
+
+
+async def _transcript_stage(records):
+    """Etapa 1: transcripts de un lote pequeño de videos (caché + una sola llamada a Apify)"""
+    pending = [record for record in records if _needs_summary(record)]
+    if not pending:
+        return records
+    transcripts_map = await get_transcripts_by_video(
+        [record["url"] for record in pending], [record["video_id"] for record in pending]
+    )
+    fetched = []
+    for record in pending:
+        transcript = transcripts_map.get(record["video_id"])
+        if transcript:
+            record["transcript"] = transcript
+            fetched.append(record)
+        else:
+            # Sin transcript no hay resumen: el video se queda en la playlist para el próximo intento
+            log.warning("⚠️ No se encontró transcript para video_id: %s", record["video_id"])
+            record.update(error="No se pudo obtener la transcripción del video", permanent=True,
+                          summary=None, tokens_before=0, tokens_after=0)
+    playlist_checkpoint.mark(records[0]["playlist_id"], fetched, TRANSCRIBED)
+    return records
+
+
+def _needs_summary(record):
+    """True si al video le falta el resumen y no ha fallado (ni se salta) en este intento"""
+    return _pending(record) and not record.get("error")
+
+
+async def _compaction_stage(record):
+    """Etapa 2: transcript compactado (sin solapes ni ruido) para el prompt del LLM"""
+    if not _needs_summary(record):
+        return record
+    record["summary_text"], record["tokens_before"], record["tokens_after"] = workflow.compact_for_summary(
+        record["transcript"], record["title"]
+    )
+    return record
+
+
+async def _summary_stage(record):
+    """Etapa 3: resumen del video con el LLM"""
+    if not _needs_summary(record):
+        return record
+    log.info("🤖 Generando resumen para video %d: %s", record['index'] + 1, record['title'],
+             extra={"video_id": record["video_id"]})
+    record["summary"], record["error"] = await _summarize_video_safe(record.pop("summary_text"), record["title"])
+    return record
+
+
+async def _assembly_stage(record):
+    """Etapa 4: bloque HTML del video para el documento final"""
+    if not _needs_summary(record):
+        return record
+    record["html_block"] = workflow._format_video_block(
+        record["index"], record["transcript"], record["title"], record["url"], record["channel"]
+    )
+    # El transcript ya está en el bloque HTML; no mantener una segunda copia hasta el final
+    del record["transcript"]
+    if not record["error"]:
+        # Resumen y bloque quedan guardados: un nuevo intento solo tendrá que guardarlos
+        playlist_checkpoint.mark(record["playlist_id"], [record], SUMMARIZED)
+        record["stage"] = SUMMARIZED
+    return record
+
+
+async def _persist_stage(record):
+    """Etapa 5 (modo per_video): guarda el documento del video en cuanto está listo
+
+    Un fallo solo afecta a ese video: queda marcado y su item no se borra de la playlist.
+    """
+    if record["saved"] or record["error"]:
+        return record
+    documents = workflow._format_documents(record["summary"], [record["html_block"]])
+    try:
+        await save_documents_to_readwise(documents, f"Video - {record['title']}", record["url"])
+        record["saved"] = True
+        playlist_checkpoint.mark(record["playlist_id"], [record], SAVED)
+        log.info("💾 Guardado en Readwise: %s", record['title'], extra={"video_id": record["video_id"]})
+    except Exception as e:
+        record["save_error"] = str(e)
+        log.error("❌ No se pudo guardar '%s' en Readwise: %s", record['title'], e, extra={"video_id": record["video_id"]})
+    return record
+
+
+def build_playlist_pipeline(save_mode=None):
+    """Pipeline transcript -> compactación -> resumen -> ensamblado HTML (-> guardado por video)"""
+    stages = [
+        Stage("transcripts", _transcript_stage, workers=http_client.PROVIDER_CONCURRENCY["apify"],
+              batch_size=workflow.APIFY_BATCH_SIZE, queue_size=workflow.PIPELINE_QUEUE_SIZE, batch_wait=0.5),
+        Stage("compaction", _compaction_stage, queue_size=workflow.PIPELINE_QUEUE_SIZE),
+        Stage("summaries", _summary_stage, workers=workflow.SUMMARY_WORKERS,
+              queue_size=workflow.PIPELINE_QUEUE_SIZE),
+        Stage("assembly", _assembly_stage, queue_size=workflow.PIPELINE_QUEUE_SIZE),
+    ]
+    if (save_mode or workflow.READWISE_SAVE_MODE) == "per_video":
+        stages.append(Stage("persist", _persist_stage, workers=http_client.PROVIDER_CONCURRENCY["readwise"],
+                            queue_size=workflow.PIPELINE_QUEUE_SIZE))
+    return Pipeline(stages, report_interval=workflow.PIPELINE_REPORT_INTERVAL or None, name="playlist")
+
+
+async def process_playlist(playlist_id=workflow.PLAYLIST_ID, name=None):
+    """Ejecuta el workflow completo
+
+    name es el nombre de la playlist en PLAYLISTS: con varias playlists aparece en el título
+    del documento y en las notificaciones, y sus peticiones comparten la concurrencia con las demás
+    playlists a partes iguales (fair_share).
+    """
+    with job_context(), fair_share.tenant_context(f"playlist:{name or playlist_id}"):
+        await _process_playlist(playlist_id, name)
+
+
+async def _process_playlist(playlist_id, name=None):
+    # Con una sola playlist configurada, títulos y avisos quedan como siempre
+    if len(workflow.PLAYLISTS) < 2:
+        name = None
+    label = f" ({name})" if name else ""
+    try:
+        log.info("🚀 Iniciando procesamiento de la playlist %s%s", playlist_id, label)
+        await send_notification(f"🚀 Iniciando procesamiento de videos{label}...")
+
+        # Pasos 1-4: playlist -> transcripts (en lotes) -> compactación -> resúmenes -> HTML,
+        # cada video avanza en cuanto su etapa anterior termina
+        log.info("📹 Procesando videos de la playlist...")
+        per_video = workflow.READWISE_SAVE_MODE == "per_video"
+        pipeline = build_playlist_pipeline()
+        records = await pipeline.run(_iter_playlist_records(playlist_id))
+        records.sort(key=lambda record: record["index"])
+        pipeline.report()
+        log.info("✅ Procesados %d videos", len(records))
+
+        tokens_before = sum(record["tokens_before"] for record in records)
+        tokens_after = sum(record["tokens_after"] for record in records)
+        log.info("✂️ Tokens de transcript para el LLM: %d → %d", tokens_before, tokens_after)
+
+        resumed = sum(record["resumed"] for record in records)
+        if resumed:
+            log.info("♻️ %d videos retomados de un intento anterior (sin repetir transcript ni resumen)", resumed)
+
+        failures = [record for record in records if record["error"] and not record["skipped"]]
+        if failures:
+            log.warning("⚠️ %d de %d videos no se pudieron resumir", len(failures), len(records))
+            playlist_checkpoint.fail(playlist_id, failures)
+        skipped = sum(record["skipped"] for record in records)
+        if skipped:
+            log.warning("⏭️ %d videos omitidos por agotar sus intentos (siguen en la playlist)", skipped)
+
+        if per_video:
+            # Paso 5 ya hecho en la etapa persist
+            log.info("✅ Guardados en Readwise %d de %d videos", sum(record["saved"] for record in records), len(records))
+        else:
+            # Paso 5: Guardar en Readwise los videos resumidos que no se guardaron en un intento anterior;
+            # los que fallaron siguen en la playlist para el próximo intento
+            pending_save = [record for record in records if not record["saved"] and not record["error"]]
+            if pending_save:
+                summary = "\n\n".join(record["summary"] for record in pending_save)
+                documents = workflow._format_documents(summary, [record["html_block"] for record in pending_save])
+                log.info("💾 Guardando en Readwise...")
+                if len(documents) > 1:
+                    log.info("📄 Documento repartido en %d partes (límite %d bytes)", len(documents), workflow.READWISE_MAX_DOCUMENT_BYTES)
+                title = f"Video Resumen{' - ' + name if name else ''} - {datetime.now().strftime('%Y-%m-%d')}"
+                result = await save_documents_to_readwise(documents, title, None)
+                log.info("✅ Guardado en Readwise: %s", result)
+                playlist_checkpoint.mark(playlist_id, pending_save, SAVED)
+                for record in pending_save:
+                    record["saved"] = True
+
+        # Paso 6: Limpiar la playlist, solo de los videos guardados
+        saved = [record for record in records if record["saved"]]
+        log.info("🧹 Limpiando la playlist en YouTube...")
+        cleared = await clear_playlist_items([record["item_id"] for record in saved])
+        deleted = set(cleared["deleted"])
+        playlist_checkpoint.mark(playlist_id, [record for record in saved if record["item_id"] in deleted], DELETED)
+
+        unsaved = [record for record in records if not record["saved"]]
+        if unsaved and not saved and any(not record["skipped"] for record in unsaved):
+            # Reintentar el trabajo entero no arreglaría ninguno: cada video ya lleva su cuenta
+            raise PermanentJobError(f"Ninguno de los {len(records)} videos se pudo resumir o guardar en Readwise")
+        if unsaved:
+            # Los que faltan se quedan en la playlist; no se hunde el resto del trabajo por ellos
+            await send_notification(f"⚠️ Video Resumen{label}: guardados {len(saved)} de {len(records)} videos. "
+                                    f"Sin guardar:\n{_unsaved_summary(unsaved)}")
+        else:
+            await send_notification(f"✅ Video Resumen{label} completado, guardado en Readwise y playlist limpiada!")
+        log.info("✅ Proceso completado exitosamente")
+
+    except Exception as e:
+        error_msg = f"❌ Error en workflow{label}: {str(e)}"
+        log.error(error_msg)
+        await send_notification(error_msg)
+        raise
+
+
+def _unsaved_summary(records, limit=10):
+    """Una línea por video sin guardar, con su motivo (como mucho limit líneas)"""
+    lines = []
+    for record in records[:limit]:
+        reason = record["error"] or record.get("save_error") or "sin guardar"
+        lines.append(f"• {record['title']}: {reason}{' (omitido)' if record['skipped'] else ''}")
+    if len(records) > limit:
+        lines.append(f"… y {len(records) - limit} más")
+    return "\n".join(lines)
+
+
+async def process_playlists(playlists=None):
+    """Procesa a la vez varias playlists ({nombre: playlist_id}, por defecto PLAYLISTS)
+
+    Cada una avanza por su cuenta; si alguna falla se lanza el error al terminar todas.
+    """
+    playlists = playlists or workflow.PLAYLISTS
+    results = await asyncio.gather(
+        *[process_playlist(playlist_id, name) for name, playlist_id in playlists.items()],
+        return_exceptions=True,
+    )
+    failed = [name for name, result in zip(playlists, results) if isinstance(result, Exception)]
+    if failed:
+        raise ValueError(f"Fallaron {len(failed)} de {len(playlists)} playlists: {', '.join(failed)}")
@@ -0,0 +1,297 @@
+"""Benchmark de extremo a extremo sin red: el workflow contra servidores locales.
+
+Arranca los servidores de fake_apis.py y ejecuta cada escenario y tamaño en un
+proceso aparte (cachés vacías, memoria medida por separado), con HTTP_HOST_OVERRIDES
+apuntando a ellos. Informa del tiempo total, videos por segundo y pico de memoria.
+
+Escenarios:
+  playlist       workflow.process_playlist sobre un playlist de N videos
+  telegram       N mensajes de Telegram (async_workflow, como los procesa main.py)
+
+Ejemplos:
+  python benchmark.py
+  python benchmark.py --sizes 1,100,500 --llm-latency 2 --error-rate 0.02
+  python benchmark.py --scenarios playlist --provider-latency apify=3 --json resultados.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fake_apis import PROVIDER_HOSTS, FakeApiConfig, FakeApiServers, bench_playlist_id, bench_video_id
+
+SCENARIOS = ("playlist", "telegram")
+DEFAULT_SIZES = "1,10,50,100,500"
+# Mensajes de Telegram procesados a la vez (main.py tiene JOB_WORKERS trabajadores)
+DEFAULT_TELEGRAM_CONCURRENCY = int(os.getenv("JOB_WORKERS", "4"))
+
+_RESULT_PREFIX = "BENCH_RESULT "
+
+
+def _provider_values(entries):
+    """['apify=1.5', 'openrouter=2'] -> {'apify': 1.5, 'openrouter': 2.0}"""
+    values = {}
+    for entry in entries or []:
+        provider, _, value = entry.partition("=")
+        if provider not in PROVIDER_HOSTS or not value:
+            raise ValueError(f"Formato proveedor=valor no válido: {entry}")
+        values[provider] = float(value)
+    return values
+
+
+def _max_rss_mb():
+    """Pico de memoria residente del proceso
+
+    En Linux se lee VmHWM: ru_maxrss de un proceso lanzado con fork+exec puede arrastrar
+    el pico del padre. ru_maxrss está en KB en Linux y en bytes en macOS.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def _child_env(args, servers, data_dir):
+    """Entorno del proceso medido: credenciales falsas, hosts redirigidos y estado en data_dir"""
+    env = dict(os.environ)
+    env.update({
+        "HTTP_HOST_OVERRIDES": servers.host_overrides(),
+        "NO_PROXY": "127.0.0.1,localhost",
+        "CACHE_DB_PATH": os.path.join(data_dir, "cache.sqlite3"),
+        "READWISE_LEDGER_PATH": os.path.join(data_dir, "readwise.sqlite3"),
+        "PLAYLIST_CHECKPOINT_PATH": os.path.join(data_dir, "playlist_progress.sqlite3"),
+        "JOB_DB_PATH": os.path.join(data_dir, "jobs.sqlite3"),
+        "PIPELINE_REPORT_INTERVAL": "0",
+        "YT_API_KEY": "bench",
+        "YT_CLIENT_ID": "bench",
+        "YT_CLIENT_SECRET": "bench",
+        "YT_REFRESH_TOKEN": "bench",
+        "APIFY_TOKEN": "bench",
+        "OPENROUTER_KEY": "bench",
+        "GEMINI_KEY": "bench",
+        "READWISE_TOKEN": "bench",
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "PUSHOVER_TOKEN": "bench",
+        "PUSHOVER_USER": "bench",
+    })
+    if not args.rate_limits:
+        # Sin límites de ritmo se mide el workflow, no la cuota configurada
+        for provider in PROVIDER_HOSTS:
+            env[f"RATE_LIMIT_{provider.upper()}_RPM"] = "0"
+            env[f"RATE_LIMIT_{provider.upper()}_TPM"] = "0"
+    if not args.verbose:
+        # El log va a stdout por su propio handler: redirect_stdout no lo silencia
+        env["LOG_LEVEL"] = "WARNING"
+    return env
+
+
+def run_case(args, servers, scenario, size):
+    """Ejecuta un escenario en un proceso nuevo y devuelve su resultado"""
+    servers.reset_stats()
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario, str(size),
+               "--telegram-concurrency", str(args.telegram_concurrency)]
+    if args.tracemalloc:
+        command.append("--tracemalloc")
+    if args.verbose:
+        command.append("--verbose")
+    with tempfile.TemporaryDirectory(prefix="bench-") as data_dir:
+        completed = subprocess.run(command, env=_child_env(args, servers, data_dir), stdout=subprocess.PIPE, text=True)
+    if args.verbose:
+        print(completed.stdout, end="")
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(_RESULT_PREFIX)]
+    if not lines:
+        result = {"scenario": scenario, "size": size, "ok": 0, "failed": size,
+                  "error": f"el proceso terminó con código {completed.returncode}"}
+    else:
+        result = json.loads(lines[-1][len(_RESULT_PREFIX):])
+    result["http"] = servers.stats()
+    return result
+
+
+def _format_row(result):
+    if "wall_seconds" not in result:
+        return f"{result['scenario']:<14} {result['size']:>5}  ❌ {result['error']}"
+    requests = sum(result["http"]["requests"].values())
+    errors = sum(result["http"]["errors"].values())
+    row = (
+        f"{result['scenario']:<14} {result['size']:>5} {result['ok']:>5} {result['failed']:>6} "
+        f"{result['wall_seconds']:>9.2f} {result['throughput']:>10.2f} {result['peak_rss_mb']:>9.1f} "
+        f"{result['peak_rss_mb'] - result['baseline_rss_mb']:>8.1f} {requests:>8} {errors:>6}"
+    )
+    if result.get("tracemalloc_peak_mb") is not None:
+        row += f" {result['tracemalloc_peak_mb']:>9.1f}"
+    if result.get("error"):
+        row += f"  ⚠️ {result['error'][:80]}"
+    return row
+
+
+def _header(tracemalloc_enabled):
+    header = (
+        f"{'escenario':<14} {'N':>5} {'ok':>5} {'fallos':>6} {'tiempo_s':>9} {'videos/s':>10} "
+        f"{'pico_MB':>9} {'delta_MB':>8} {'peticion':>8} {'503':>6}"
+    )
+    if tracemalloc_enabled:
+        header += f" {'py_pico_MB':>9}"
+    return header
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del workflow contra APIs simuladas en local")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Tamaños del playlist, separados por comas ({DEFAULT_SIZES})")
+    parser.add_argument("--scenarios", default="playlist,telegram", help=f"Escenarios a medir: {', '.join(SCENARIOS)}")
+    parser.add_argument("--latency", type=float, default=0.02, help="Latencia de cada petición (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Latencia de OpenRouter y Gemini (s)")
+    parser.add_argument("--provider-latency", action="append", metavar="PROVEEDOR=S", help="Latencia de un proveedor concreto")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones que responden 503")
+    parser.add_argument("--provider-error-rate", action="append", metavar="PROVEEDOR=F", help="Tasa de error de un proveedor concreto")
+    parser.add_argument("--transcript-words", type=int, default=1500, help="Palabras de cada transcript")
+    parser.add_argument("--summary-words", type=int, default=400, help="Palabras de cada resumen")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="Eventos SSE por respuesta en streaming")
+    parser.add_argument("--telegram-concurrency", type=int, default=DEFAULT_TELEGRAM_CONCURRENCY,
+                        help="Mensajes de Telegram procesados a la vez")
+    parser.add_argument("--rate-limits", action="store_true", help="Mantener los límites de ritmo configurados")
+    parser.add_argument("--tracemalloc", action="store_true", help="Medir también el pico de memoria de Python (más lento)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los errores simulados")
+    parser.add_argument("--json", metavar="FICHERO", help="Guardar los resultados en JSON")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida del workflow")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    provider_latency = {"openrouter": args.llm_latency, "gemini": args.llm_latency}
+    try:
+        provider_latency.update(_provider_values(args.provider_latency))
+        provider_error_rate = _provider_values(args.provider_error_rate)
+    except ValueError as e:
+        parser.error(str(e))
+    config = FakeApiConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        provider_latency=provider_latency,
+        provider_error_rate=provider_error_rate,
+        transcript_words=args.transcript_words,
+        summary_words=args.summary_words,
+        stream_chunks=args.stream_chunks,
+        seed=args.seed,
+    )
+
+    results = []
+    with FakeApiServers(config) as servers:
+        print(_header(args.tracemalloc))
+        for scenario in scenarios:
+            for size in sizes:
+                result = run_case(args, servers, scenario, size)
+                results.append(result)
+                print(_format_row(result), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(config), "results": results}, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}")
+    return results
+
+
+# --- Proceso medido ---
+
+def _video_url(index):
+    return f"https://www.youtube.com/watch?v={bench_video_id(index)}"
+
+
+def _run_playlist(size, concurrency):
+    import workflow
+    workflow.process_playlist(bench_playlist_id(size))
+    return size, 0, None
+
+
+async def _run_telegram_async(size, concurrency):
+    import async_workflow
+    import http_client
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            await async_workflow.process_video_from_telegram(_video_url(index), index + 1)
+
+    try:
+        outcomes = await asyncio.gather(*[one(index) for index in range(size)], return_exceptions=True)
+    finally:
+        await http_client.aclose_all()
+    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    return size - len(errors), len(errors), str(errors[0]) if errors else None
+
+
+def _run_telegram(size, concurrency):
+    return asyncio.run(_run_telegram_async(size, concurrency))
+
+
+_RUNNERS = {
+    "playlist": _run_playlist,
+    "telegram": _run_telegram,
+}
+
+
+def child_main(argv):
+    """Ejecuta un único escenario y escribe su resultado como última línea"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", nargs=2, metavar=("ESCENARIO", "N"))
+    parser.add_argument("--telegram-concurrency", type=int, default=DEFAULT_TELEGRAM_CONCURRENCY)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    scenario, size = args.child[0], int(args.child[1])
+
+    # Importar antes de medir: la memoria base incluye los módulos cargados
+    import async_workflow  # noqa: F401
+    import workflow  # noqa: F401
+    baseline_rss = _max_rss_mb()
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    started = time.perf_counter()
+    with output:
+        try:
+            ok, failed, error = _RUNNERS[scenario](size, args.telegram_concurrency)
+        except Exception as e:
+            ok, failed, error = 0, size, str(e)
+    wall = time.perf_counter() - started
+
+    result = {
+        "scenario": scenario,
+        "size": size,
+        "ok": ok,
+        "failed": failed,
+        "error": error,
+        "wall_seconds": round(wall, 3),
+        "throughput": round(ok / wall, 3) if wall > 0 else 0.0,
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(_max_rss_mb(), 1),
+        "tracemalloc_peak_mb": None,
+    }
+    if args.tracemalloc:
+        result["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    print(_RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv[1:]:
+        child_main(sys.argv[1:])
+    else:
+        main()
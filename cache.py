@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Ruta de la base de datos local donde se guardan las cachés
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(".cache", "video_resumen.sqlite3"))
+
+
+def make_key(*parts):
+    """Genera una clave SHA-256 estable a partir de varias partes de texto"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = (part or "").encode("utf-8")
+        # Prefijo con la longitud para que ("ab", "c") y ("a", "bc") no colisionen
+        digest.update(str(len(data)).encode("ascii") + b":")
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class SqliteCache:
+    """Caché clave -> texto persistida en SQLite con expiración por edad y límite de tamaño"""
+
+    def __init__(self, table, path=CACHE_DB_PATH, max_bytes=None, max_age=None, enabled=True):
+        self.table = table
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """Abre la conexión (perezosamente) y crea la tabla si no existe"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """Devuelve el valor guardado o None si no existe o ha expirado"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.max_age is not None and now - created_at > self.max_age:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Guarda un valor y aplica las políticas de expulsión"""
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"""INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?)""",
+                (key, value, size, now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now):
+        """Elimina entradas caducadas y, si se supera el tamaño máximo, las menos usadas"""
+        if self.max_age is not None:
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.max_age,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+        if self.max_bytes is None:
+            return
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Devuelve contadores de aciertos/fallos y el tamaño actual de la caché"""
+        entries, total = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, total = self._connect().execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+                ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+
+summary_cache = SqliteCache(
+    "summaries",
+    max_bytes=int(float(os.getenv("SUMMARY_CACHE_MAX_MB", "100")) * 1024 * 1024),
+    max_age=float(os.getenv("SUMMARY_CACHE_MAX_AGE_DAYS", "30")) * 86400,
+    enabled=os.getenv("SUMMARY_CACHE_ENABLED", "1") != "0",
+)
+
+transcript_cache = SqliteCache(
+    "transcripts",
+    max_bytes=int(float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "200")) * 1024 * 1024),
+    max_age=float(os.getenv("TRANSCRIPT_CACHE_TTL_DAYS", "7")) * 86400,
+    enabled=os.getenv("TRANSCRIPT_CACHE_ENABLED", "1") != "0",
+)
@@ -0,0 +1,67 @@
+import math
+import re
+
+# Aproximación habitual para modelos tipo Gemini/GPT: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text):
+    """Estima el número de tokens de un texto sin necesidad de un tokenizer"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _split_oversized(segment, max_tokens):
+    """Divide un segmento demasiado largo por frases y, si hace falta, por palabras"""
+    pieces = []
+    for sentence in _SENTENCE_END.split(segment):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words = sentence.split()
+        current = []
+        current_tokens = 0
+        for word in words:
+            word_tokens = estimate_tokens(word) + 1
+            if current and current_tokens + word_tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+
+def split_transcript(text, max_tokens):
+    """Divide un transcript en bloques de como máximo max_tokens respetando los límites de caption
+
+    Los captions vienen separados por saltos de línea; solo se corta dentro de un
+    caption (por frases o palabras) cuando uno solo ya supera el presupuesto.
+    """
+    segments = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if estimate_tokens(line) > max_tokens:
+            segments.extend(_split_oversized(line, max_tokens))
+        else:
+            segments.append(line)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for segment in segments:
+        segment_tokens = estimate_tokens(segment) + 1
+        if current and current_tokens + segment_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += segment_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -0,0 +1,124 @@
+"""Circuit breaker por proveedor externo, compartido por todos los trabajos.
+
+Tras CIRCUIT_FAILURE_THRESHOLD fallos seguidos (errores de conexión o 5xx) el
+circuito se abre y las llamadas a ese proveedor fallan al instante con
+CircuitOpenError, sin esperar timeouts. Pasado CIRCUIT_COOLDOWN pasa a semiabierto
+y deja pasar una única petición de prueba: si va bien se cierra, si falla se vuelve
+a abrir otro periodo completo.
+"""
+import os
+import threading
+import time
+
+from logs import get_logger
+
+log = get_logger("circuit_breaker")
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "60"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ValueError):
+    """El proveedor tiene el circuito abierto: la llamada no se ha hecho"""
+
+
+class CircuitBreaker:
+    """Estado cerrado / abierto / semiabierto de un proveedor"""
+
+    def __init__(self, provider, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.trips = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+        # Una prueba que nunca informó (p. ej. cancelada) no bloquea el circuito para siempre
+        elif self.state == HALF_OPEN and self._probe_in_flight and now - self._probe_started >= self.cooldown:
+            self._probe_in_flight = False
+
+    def available(self):
+        """True si una llamada ahora mismo no sería rechazada"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self.state == CLOSED or (self.state == HALF_OPEN and not self._probe_in_flight)
+
+    def before_call(self):
+        """Deja pasar la llamada o lanza CircuitOpenError"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_started = time.monotonic()
+                log.info("🔌 %s: circuito semiabierto, enviando petición de prueba", self.provider)
+                return
+            self.rejected += 1
+            remaining = max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.opened_at else 0.0
+        raise CircuitOpenError(f"Circuito abierto para {self.provider} (reintento en {remaining:.0f}s)")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                log.info("🔌 %s: circuito cerrado de nuevo", self.provider)
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                self._probe_in_flight = False
+                log.warning("🔌 %s: circuito abierto tras %d fallos seguidos", self.provider, self.failures)
+
+    def stats(self):
+        with self._lock:
+            self._refresh(time.monotonic())
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    """Circuit breaker compartido del proveedor"""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+
+def is_available(provider):
+    return get_breaker(provider).available()
+
+
+def stats():
+    """Estado del circuito de cada proveedor usado hasta ahora"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.provider: breaker.stats() for breaker in breakers}
@@ -0,0 +1,113 @@
+"""Compactación de transcripts antes de mandarlos al LLM.
+
+Los subtítulos automáticos que devuelve Apify repiten texto entre captions
+consecutivos (cada ventana incluye el final de la anterior), traen marcas como
+[Music] o [Aplausos], timestamps escritos como texto y muletillas. Nada de eso
+aporta al resumen y el tamaño del prompt es lo que marca la latencia y el coste.
+"""
+import os
+import re
+
+from chunking import estimate_tokens
+
+TRANSCRIPT_COMPACTION_ENABLED = os.getenv("TRANSCRIPT_COMPACTION_ENABLED", "true").lower() not in ("0", "false", "no")
+TRANSCRIPT_STRIP_FILLER = os.getenv("TRANSCRIPT_STRIP_FILLER", "true").lower() not in ("0", "false", "no")
+# Muletillas que se eliminan (solo palabras que nunca llevan contenido)
+TRANSCRIPT_FILLER_WORDS = [
+    word.strip()
+    for word in os.getenv("TRANSCRIPT_FILLER_WORDS", "eh,ehm,em,mm,mmm,um,umm,uh,uhm,hmm").split(",")
+    if word.strip()
+]
+# Palabras del final del texto ya emitido con las que se busca solape en cada caption
+TRANSCRIPT_OVERLAP_WORDS = int(os.getenv("TRANSCRIPT_OVERLAP_WORDS", "40"))
+
+# Marcas de ruido de los subtítulos automáticos: [Music], [Música], (risas), [ __ ], ♪ ... ♪
+# Solo las conocidas: otro texto entre corchetes ("[sic]", "[1]", "[Parte 2]") puede ser contenido
+_NOISE_WORDS = (
+    "music|música|musica|applause|aplausos|laughter|laughs|risas|risa|inaudible|"
+    "silence|silencio|noise|ruido|cheering|ovación|background music|música de fondo"
+)
+_MARKERS = re.compile(
+    rf"\[\s*(?:{_NOISE_WORDS}|_+)\s*\]|\(\s*(?:{_NOISE_WORDS})\s*\)|[♪♫]+", re.IGNORECASE
+)
+# 00:01:02,345 --> 00:01:04,000 (SRT/VTT) en cualquier sitio, o 1:02 / 01:02:03.5 al inicio
+# del caption (una hora dentro de una frase, "a las 10:30", se respeta)
+_TIME = r"\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?"
+_TIMESTAMPS = re.compile(rf"{_TIME}\s*-->\s*{_TIME}|^\s*{_TIME}(?!\w)")
+# Una a cuatro palabras repetidas seguidas: "que que que" o "lo que lo que"
+_REPEATS = re.compile(r"\b(\w+(?:\s+\w+){0,3})(?:[\s,]+\1\b)+", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def _filler_pattern(words):
+    if not words:
+        return None
+    alternatives = "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)[,.…]*", re.IGNORECASE)
+
+
+_FILLER = _filler_pattern(TRANSCRIPT_FILLER_WORDS)
+
+
+def _clean_line(line, strip_filler):
+    """Quita marcas, timestamps y muletillas de un caption y colapsa repeticiones"""
+    line = _MARKERS.sub(" ", line)
+    line = _TIMESTAMPS.sub(" ", line)
+    if strip_filler and _FILLER is not None:
+        line = _FILLER.sub(" ", line)
+    line = _REPEATS.sub(r"\1", line)
+    line = _SPACES.sub(" ", line).strip(" ,")
+    # Líneas que solo eran el número de un bloque SRT
+    if line.isdigit():
+        return ""
+    return line
+
+
+def _normalized_words(words):
+    return [" ".join(_WORD.findall(word.lower())) for word in words]
+
+
+def _overlap(tail, words):
+    """Número de palabras iniciales de words que repiten el final de tail"""
+    limit = min(len(tail), len(words))
+    for size in range(limit, 0, -1):
+        if tail[-size:] == words[:size]:
+            return size
+    return 0
+
+
+def compact_transcript(text, strip_filler=TRANSCRIPT_STRIP_FILLER, overlap_words=TRANSCRIPT_OVERLAP_WORDS):
+    """Devuelve el transcript sin solapes entre captions, repeticiones ni ruido
+
+    Mantiene un caption por línea para que el chunker siga pudiendo cortar en sus límites.
+    """
+    lines = []
+    tail = []
+    for raw_line in (text or "").splitlines():
+        line = _clean_line(raw_line, strip_filler)
+        if not line:
+            continue
+        words = line.split(" ")
+        normalized = _normalized_words(words)
+        skip = _overlap(tail, normalized)
+        # Una sola palabra en común puede ser casualidad ("... y" / "y luego ...", "no" / "no")
+        if skip < 2:
+            skip = 0
+        if skip == len(words):
+            continue
+        if skip:
+            words = words[skip:]
+            normalized = normalized[skip:]
+        lines.append(" ".join(words))
+        tail = (tail + normalized)[-overlap_words:]
+    return "\n".join(lines)
+
+
+def compact_with_stats(text, enabled=TRANSCRIPT_COMPACTION_ENABLED):
+    """Compacta (si está activado) y devuelve (texto, tokens_antes, tokens_después)"""
+    tokens_before = estimate_tokens(text)
+    if not enabled or not text:
+        return text, tokens_before, tokens_before
+    compacted = compact_transcript(text)
+    return compacted, tokens_before, estimate_tokens(compacted)
@@ -0,0 +1,113 @@
+"""Reparto justo de la concurrencia por proveedor entre trabajos simultáneos.
+
+Cada trabajo se ejecuta como un "inquilino" (una playlist, los mensajes de Telegram)
+guardado en un contextvar, igual que el ID de correlación de logs.py. Los semáforos por
+proveedor de http_client son FairSemaphore: cuando hay espera, el hueco que se libera
+va al inquilino que menos huecos tiene en uso, y entre empatados por turnos. Así una
+playlist de 300 videos (o un transcript partido en 20 trozos) no deja sin LLM ni Apify
+a las demás: con N inquilinos esperando, cada uno obtiene ~1/N de la capacidad.
+"""
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+DEFAULT_TENANT = "default"
+
+_tenant = contextvars.ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+def current_tenant():
+    return _tenant.get()
+
+
+@contextmanager
+def tenant_context(tenant):
+    """Atribuye al inquilino todas las peticiones hechas dentro del bloque (y sus tareas)"""
+    token = _tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _tenant.reset(token)
+
+
+class FairSemaphore:
+    """Semáforo asíncrono que reparte los huecos por inquilino en vez de por orden de llegada"""
+
+    def __init__(self, value):
+        self.capacity = value
+        self._free = value
+        self._in_use = {}
+        # Inquilino -> cola de futures; el orden del dict es el turno entre empatados
+        self._waiters = OrderedDict()
+        self._granted = {}
+
+    def _take(self, tenant):
+        self._free -= 1
+        self._in_use[tenant] = self._in_use.get(tenant, 0) + 1
+        self._granted[tenant] = self._granted.get(tenant, 0) + 1
+
+    async def acquire(self):
+        tenant = current_tenant()
+        if self._free > 0 and not self._waiters:
+            self._take(tenant)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # El hueco llegó a la vez que la cancelación: devolverlo
+                self.release()
+            else:
+                self._discard(tenant, future)
+            raise
+
+    def _discard(self, tenant, future):
+        queue = self._waiters.get(tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiters[tenant]
+
+    def release(self):
+        tenant = current_tenant()
+        self._in_use[tenant] -= 1
+        if not self._in_use[tenant]:
+            del self._in_use[tenant]
+        self._free += 1
+        self._wake()
+
+    def _wake(self):
+        while self._free > 0 and self._waiters:
+            # min() devuelve el primero de los empatados: el que lleva más turnos sin servir
+            tenant = min(self._waiters, key=lambda name: self._in_use.get(name, 0))
+            queue = self._waiters[tenant]
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(tenant)
+            else:
+                del self._waiters[tenant]
+            if future.done():
+                continue
+            self._take(tenant)
+            future.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "in_use": dict(self._in_use),
+            "waiting": {tenant: len(queue) for tenant, queue in self._waiters.items()},
+            "granted": dict(self._granted),
+        }
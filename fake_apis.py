@@ -0,0 +1,344 @@
+"""Servidores locales que imitan las APIs externas del workflow (para benchmark.py).
+
+Un servidor HTTP por proveedor (YouTube Data API, OAuth de Google, Apify, OpenRouter,
+Gemini, Readwise, Telegram y Pushover), cada uno en su puerto de 127.0.0.1. Cada
+proveedor tiene su latencia y su tasa de errores 503, y los tamaños de los transcripts
+y resúmenes son configurables. Las respuestas largas (dataset de Apify, streaming SSE
+de los LLM) se envían por trozos, como las APIs reales.
+
+El workflow se redirige a ellos con HTTP_HOST_OVERRIDES (ver host_overrides()).
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Host real de cada proveedor (el mismo reparto que http_client.PROVIDER_HOSTS)
+PROVIDER_HOSTS = {
+    "youtube": "www.googleapis.com",
+    "oauth": "oauth2.googleapis.com",
+    "apify": "api.apify.com",
+    "openrouter": "openrouter.ai",
+    "gemini": "generativelanguage.googleapis.com",
+    "readwise": "readwise.io",
+    "telegram": "api.telegram.org",
+    "pushover": "api.pushover.net",
+}
+
+# Los playlistId "bench-<n>" tienen n videos
+BENCH_PLAYLIST_PREFIX = "bench-"
+PLAYLIST_PAGE_SIZE = 50
+CAPTION_WORDS = 12
+
+_VOCABULARY = (
+    "datos modelo sistema proceso usuario video resumen ejemplo tiempo parte idea "
+    "problema solución equipo cliente producto mercado precio valor riesgo cambio "
+    "memoria servidor consulta red latencia coste diseño prueba error versión código "
+    "análisis estrategia objetivo resultado método pregunta respuesta contexto nivel"
+).split()
+
+
+def bench_video_id(index):
+    """Video ID (11 caracteres, como los de YouTube) del video index de un playlist de prueba"""
+    return f"bench{index:06d}"
+
+
+def bench_playlist_id(size):
+    return f"{BENCH_PLAYLIST_PREFIX}{size}"
+
+
+class FakeApiConfig:
+    """Latencias (segundos), tasas de error (0-1) y tamaños de las respuestas simuladas"""
+
+    def __init__(self, latency=0.02, error_rate=0.0, provider_latency=None, provider_error_rate=None,
+                 transcript_words=1500, summary_words=400, stream_chunks=20, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.provider_latency = dict(provider_latency or {})
+        self.provider_error_rate = dict(provider_error_rate or {})
+        self.transcript_words = transcript_words
+        self.summary_words = summary_words
+        self.stream_chunks = stream_chunks
+        self.seed = seed
+
+    def latency_for(self, provider):
+        return self.provider_latency.get(provider, self.latency)
+
+    def error_rate_for(self, provider):
+        return self.provider_error_rate.get(provider, self.error_rate)
+
+
+def fake_transcript_lines(video_id, words):
+    """Captions deterministas de un video: líneas de CAPTION_WORDS palabras sin repeticiones"""
+    rng = random.Random(video_id)
+    lines = []
+    for start in range(0, words, CAPTION_WORDS):
+        count = min(CAPTION_WORDS, words - start)
+        lines.append(" ".join(rng.choice(_VOCABULARY) for _ in range(count)))
+    return lines
+
+
+def fake_summary(words):
+    """Resumen HTML con la estructura de niveles que genera el LLM"""
+    rng = random.Random(words)
+    text = " ".join(rng.choice(_VOCABULARY) for _ in range(max(1, words)))
+    return (
+        "<h2>NIVEL 1: Resumen ejecutivo</h2>\n<ul><li>Idea principal del video.</li>"
+        "<li>Segunda idea clave.</li></ul>\n"
+        f"<h2>NIVEL 2: Análisis detallado</h2>\n<p>{text}</p>"
+    )
+
+
+def _split_text(text, parts):
+    size = max(1, -(-len(text) // max(1, parts)))
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+class FakeApiServers:
+    """Arranca un servidor por proveedor y lleva la cuenta de peticiones y bytes servidos"""
+
+    def __init__(self, config=None):
+        self.config = config or FakeApiConfig()
+        self._servers = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._message_ids = 0
+        self.requests = {}
+        self.errors = {}
+        self.bytes_sent = {}
+
+    def start(self):
+        for provider in PROVIDER_HOSTS:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_class(self, provider))
+            server.daemon_threads = True
+            thread = threading.Thread(target=server.serve_forever, name=f"fake-{provider}", daemon=True)
+            thread.start()
+            self._servers[provider] = server
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def host_overrides(self):
+        """Valor de HTTP_HOST_OVERRIDES que redirige cada host real a su servidor local"""
+        return ",".join(
+            f"{PROVIDER_HOSTS[provider]}=http://127.0.0.1:{server.server_address[1]}"
+            for provider, server in self._servers.items()
+        )
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+            self.bytes_sent.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "errors": dict(self.errors),
+                "bytes_sent": dict(self.bytes_sent),
+            }
+
+    def _count(self, provider, sent=0, error=False):
+        with self._lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+            self.bytes_sent[provider] = self.bytes_sent.get(provider, 0) + sent
+            if error:
+                self.errors[provider] = self.errors.get(provider, 0) + 1
+
+    def _should_fail(self, provider):
+        with self._lock:
+            return self._rng.random() < self.config.error_rate_for(provider)
+
+    def _next_message_id(self):
+        with self._lock:
+            self._message_ids += 1
+            return self._message_ids
+
+
+def _handler_class(servers, provider):
+    """Handler HTTP de un proveedor concreto"""
+    return type(f"Fake{provider.title()}Handler", (_FakeApiHandler,), {"servers": servers, "provider": provider})
+
+
+class _FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    servers = None
+    provider = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- Envío de respuestas ---
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _send_empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return 0
+
+    def _send_chunked(self, status, content_type, chunks, delay=0.0):
+        """Respuesta con Transfer-Encoding: chunked, esperando delay entre trozos"""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            sent += len(data)
+            if delay:
+                time.sleep(delay)
+        self.wfile.write(b"0\r\n\r\n")
+        return sent
+
+    def _send_sse(self, events):
+        """Stream SSE: la latencia del proveedor se reparte entre los eventos"""
+        delay = self.servers.config.latency_for(self.provider) / max(1, len(events))
+        return self._send_chunked(200, "text/event-stream", [f"data: {event}\n\n" for event in events], delay)
+
+    # --- Entrada ---
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw)
+        return {key: values[0] for key, values in parse_qs(raw.decode("utf-8")).items()}
+
+    def _handle(self, method):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        body = self._read_body()
+        config = self.servers.config
+        streaming = "stream" in parts.path.lower() or body.get("stream") is True
+        if not streaming:
+            # En los streams la latencia se reparte entre los trozos
+            time.sleep(config.latency_for(self.provider))
+        if self.servers._should_fail(self.provider):
+            sent = self._send_json(503, {"error": {"message": f"{self.provider}: error simulado"}})
+            self.servers._count(self.provider, sent, error=True)
+            return
+        route = getattr(self, f"_{self.provider}")
+        try:
+            self.servers._count(self.provider, route(method, parts.path, query, body))
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó la conexión (p. ej. un trabajo cancelado a mitad de stream)
+            self.servers._count(self.provider)
+            self.close_connection = True
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    # --- Proveedores ---
+
+    def _youtube(self, method, path, query, body):
+        if method == "DELETE":
+            return self._send_empty(204)
+        if path.endswith("/playlistItems"):
+            playlist_id = query.get("playlistId", "")
+            size = int(playlist_id[len(BENCH_PLAYLIST_PREFIX):]) if playlist_id.startswith(BENCH_PLAYLIST_PREFIX) else 0
+            start = int(query.get("pageToken") or 0)
+            end = min(size, start + PLAYLIST_PAGE_SIZE)
+            data = {"items": [
+                {
+                    "id": f"item-{index}",
+                    "contentDetails": {"videoId": bench_video_id(index)},
+                    "snippet": {"title": f"Video de prueba {index}", "videoOwnerChannelTitle": "Canal de prueba"},
+                }
+                for index in range(start, end)
+            ]}
+            if end < size:
+                data["nextPageToken"] = str(end)
+            return self._send_json(200, data)
+        video_ids = [video_id for video_id in query.get("id", "").split(",") if video_id]
+        return self._send_json(200, {"items": [
+            {"id": video_id, "snippet": {"title": f"Video {video_id}", "channelTitle": "Canal de prueba"}}
+            for video_id in video_ids
+        ]})
+
+    def _oauth(self, method, path, query, body):
+        return self._send_json(200, {"access_token": "fake-access-token", "expires_in": 3600})
+
+    def _apify(self, method, path, query, body):
+        words = self.servers.config.transcript_words
+
+        def items():
+            urls = body.get("urls", [])
+            yield "["
+            for position, url in enumerate(urls):
+                video_id = url.rsplit("v=", 1)[-1].rsplit("/", 1)[-1]
+                item = {
+                    "videoId": video_id,
+                    "url": url,
+                    "captions": [{"text": line} for line in fake_transcript_lines(video_id, words)],
+                }
+                yield ("," if position else "") + json.dumps(item)
+            yield "]"
+
+        return self._send_chunked(200, "application/json", items())
+
+    def _openrouter(self, method, path, query, body):
+        config = self.servers.config
+        summary = fake_summary(config.summary_words)
+        if body.get("stream"):
+            events = [
+                json.dumps({"choices": [{"delta": {"content": piece}}]})
+                for piece in _split_text(summary, config.stream_chunks)
+            ]
+            return self._send_sse(events + ["[DONE]"])
+        return self._send_json(200, {"choices": [{"message": {"content": summary}}]})
+
+    def _gemini(self, method, path, query, body):
+        config = self.servers.config
+        summary = fake_summary(config.summary_words)
+        if ":streamGenerateContent" in path:
+            return self._send_sse([
+                json.dumps({"candidates": [{"content": {"parts": [{"text": piece}]}}]})
+                for piece in _split_text(summary, config.stream_chunks)
+            ])
+        return self._send_json(200, {"candidates": [{"content": {"parts": [{"text": summary}]}}]})
+
+    def _readwise(self, method, path, query, body):
+        return self._send_json(201, {"id": f"doc-{self.servers._next_message_id()}", "url": body.get("url")})
+
+    def _telegram(self, method, path, query, body):
+        if path.endswith("/sendMessage"):
+            return self._send_json(200, {"ok": True, "result": {"message_id": self.servers._next_message_id()}})
+        return self._send_json(200, {"ok": True, "result": True})
+
+    def _pushover(self, method, path, query, body):
+        return self._send_json(200, {"status": 1})
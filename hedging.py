@@ -0,0 +1,109 @@
+"""Peticiones "hedged" al LLM: si el proveedor principal tarda más de lo habitual
+se lanza el mismo prompt al otro y se usa la primera respuesta válida.
+
+El retraso antes de lanzar la segunda petición es un percentil (LLM_HEDGE_PERCENTILE)
+de las latencias recientes del proveedor principal, así que solo se duplican las
+peticiones de la cola lenta. La petición perdedora se cancela (se cierra su conexión).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+# Retraso mientras no haya LLM_HEDGE_MIN_SAMPLES latencias medidas, y mínimo absoluto
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "5"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "50"))
+
+_lock = threading.Lock()
+_latencies = {}
+_stats = {"calls": 0, "hedged": 0, "cancelled": 0, "failed": 0, "wins": {}}
+
+
+def observe(provider, seconds):
+    """Registra la latencia de una respuesta correcta del proveedor"""
+    with _lock:
+        window = _latencies.get(provider)
+        if window is None:
+            window = _latencies[provider] = deque(maxlen=LLM_HEDGE_WINDOW)
+        window.append(seconds)
+
+
+def hedge_delay(provider):
+    """Segundos que se espera al proveedor antes de lanzar la petición de respaldo"""
+    with _lock:
+        samples = sorted(_latencies.get(provider, ()))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * LLM_HEDGE_PERCENTILE / 100))
+    return max(LLM_HEDGE_MIN_DELAY, samples[index])
+
+
+def _count(key, provider=None):
+    with _lock:
+        if provider is None:
+            _stats[key] += 1
+        else:
+            _stats[key][provider] = _stats[key].get(provider, 0) + 1
+
+
+def stats():
+    """Llamadas, porcentaje de hedging, victorias por proveedor y retraso actual de cada uno"""
+    with _lock:
+        snapshot = dict(_stats, wins=dict(_stats["wins"]))
+        providers = list(_latencies)
+    snapshot["enabled"] = LLM_HEDGE_ENABLED
+    snapshot["hedge_rate"] = round(snapshot["hedged"] / snapshot["calls"], 3) if snapshot["calls"] else 0.0
+    snapshot["delays"] = {provider: round(hedge_delay(provider), 3) for provider in providers}
+    return snapshot
+
+
+def _combined_error(errors):
+    return ValueError(" | ".join(f"{name}: {error}" for name, error in errors))
+
+
+async def arun_hedged(primary, secondary):
+    """primary/secondary son (nombre, función que devuelve una corrutina)
+
+    Devuelve (nombre del ganador, resultado); si fallan ambos lanza ValueError.
+    """
+    _count("calls")
+    names = {}
+    errors = []
+    delay = hedge_delay(primary[0])
+    started = time.monotonic()
+    primary_task = asyncio.ensure_future(primary[1]())
+    names[primary_task] = primary[0]
+    pending = {primary_task}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        while True:
+            for task in done:
+                if task.exception() is not None:
+                    errors.append((names[task], task.exception()))
+                    continue
+                _count("wins", names[task])
+                return names[task], task.result()
+            if secondary[0] not in names.values():
+                _count("hedged")
+                task = asyncio.ensure_future(secondary[1]())
+                names[task] = secondary[0]
+                pending.add(task)
+            if not pending:
+                _count("failed")
+                raise _combined_error(errors)
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+            _count("cancelled")
+            if task is primary_task:
+                # El principal perdió por lento: su latencia real es al menos la ya esperada.
+                # Sin esta muestra solo contarían las respuestas rápidas y el retraso iría a menos
+                observe(primary[0], max(time.monotonic() - started, delay))
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,129 @@
+"""Construcción del documento HTML que se guarda en Readwise.
+
+Los fragmentos se acumulan en una lista y se unen una sola vez al final (coste
+lineal en el tamaño del documento). Todo lo que viene de fuera (títulos, canales,
+URLs y transcripts) se escapa; el resumen del LLM es HTML por diseño y se inserta
+tal cual. Si el documento supera READWISE_MAX_DOCUMENT_BYTES se reparte en varios
+documentos, cortando siempre entre bloques de video.
+"""
+import html
+import os
+
+# Tamaño máximo (bytes UTF-8) de cada documento que se manda a Readwise
+READWISE_MAX_DOCUMENT_BYTES = int(os.getenv("READWISE_MAX_DOCUMENT_BYTES", str(1024 * 1024)))
+
+# Margen para las diferencias de longitud de la cabecera "(parte k/n)" entre partes
+_HEADER_SLACK = 64
+
+
+def escape(text):
+    """Texto plano listo para insertar en HTML (contenido o atributo)"""
+    return html.escape(str(text if text is not None else ""), quote=True)
+
+
+def safe_url(url):
+    """URL escapada para un href; cualquier esquema que no sea http(s) se sustituye por '#'"""
+    url = str(url or "").strip()
+    if not url.lower().startswith(("http://", "https://")):
+        return "#"
+    return escape(url)
+
+
+class HtmlBuilder:
+    """Acumula fragmentos HTML en una lista y lleva la cuenta de su tamaño en bytes"""
+
+    def __init__(self):
+        self._parts = []
+        self.size = 0
+
+    def add(self, fragment):
+        self._parts.append(fragment)
+        self.size += len(fragment.encode("utf-8"))
+        return self
+
+    def build(self):
+        return "".join(self._parts)
+
+
+def video_block(index, transcript, title, url, channel):
+    """Bloque HTML del NIVEL 3 para un video (index empieza en 0)"""
+    link = safe_url(url)
+    builder = HtmlBuilder()
+    builder.add('\n        <div style="margin-bottom: 30px; padding: 15px; border: 1px solid #eee; border-radius: 8px;">\n')
+    builder.add(f'            <h3 style="margin-top: 0;">Video {index + 1}: {escape(title)}</h3>\n')
+    builder.add("            <p>\n")
+    builder.add(f"                <b>📺 Canal:</b> {escape(channel)}<br>\n")
+    builder.add(f'                <b>🔗 Link:</b> <a href="{link}">{link}</a>\n')
+    builder.add("            </p>\n")
+    builder.add("            <details>\n")
+    builder.add('                <summary style="cursor: pointer; color: #555; text-decoration: underline;">Ver Transcript del Video</summary>\n')
+    builder.add('                <div style="background-color: #f9f9f9; padding: 10px; border-left: 3px solid #ccc; margin-top: 10px;">\n')
+    builder.add(escape(transcript))
+    builder.add("\n                </div>\n            </details>\n        </div>\n        ")
+    return builder.build()
+
+
+def _first_header(summary, part, total):
+    heading = "Análisis de Videos" if total == 1 else f"Análisis de Videos (parte {part}/{total})"
+    return (
+        f"\n    <h1>{heading}</h1>\n    \n    {summary}\n    \n    <hr>\n"
+        "    <h2>NIVEL 3: Transcripts y Enlaces</h2>\n"
+        "    <p><i>Este nivel contiene información detallada y los enlaces directos a cada video procesado.</i></p>\n    "
+    )
+
+
+def _continuation_header(part, total):
+    return (
+        f"\n    <h1>Análisis de Videos (parte {part}/{total})</h1>\n"
+        "    <h2>NIVEL 3: Transcripts y Enlaces (continuación)</h2>\n    "
+    )
+
+
+def _group_blocks(summary, video_blocks, max_bytes):
+    """Reparte los bloques en grupos que quepan en max_bytes junto con su cabecera"""
+    first_size = len(_first_header(summary, 1, 1).encode("utf-8")) + _HEADER_SLACK
+    continuation_size = len(_continuation_header(1, 1).encode("utf-8")) + _HEADER_SLACK
+    groups = [[]]
+    size = first_size
+    for block in video_blocks:
+        block_size = len(block.encode("utf-8"))
+        # Un bloque que por sí solo supera el límite va en su propio documento
+        if groups[-1] and size + block_size > max_bytes:
+            groups.append([])
+            size = continuation_size
+        groups[-1].append(block)
+        size += block_size
+    return groups
+
+
+def build_documents(summary, video_blocks, max_bytes=READWISE_MAX_DOCUMENT_BYTES):
+    """Documento(s) final(es): resumen + NIVEL 3, partido por tamaño si hace falta
+
+    max_bytes=None (o 0) devuelve siempre un único documento.
+    """
+    if max_bytes:
+        groups = _group_blocks(summary, video_blocks, max_bytes)
+    else:
+        groups = [list(video_blocks)]
+    total = len(groups)
+    documents = []
+    for part, blocks in enumerate(groups, start=1):
+        builder = HtmlBuilder()
+        builder.add(_first_header(summary, part, total) if part == 1 else _continuation_header(part, total))
+        for block in blocks:
+            builder.add(block)
+        documents.append(builder.build())
+    return documents
+
+
+def part_title(title, part, total):
+    """Título de cada documento cuando el resumen se reparte en varios"""
+    return title if total == 1 else f"{title} ({part}/{total})"
+
+
+def part_url(url, part):
+    """URL distinta por parte: Readwise no guarda dos documentos con la misma URL"""
+    if part == 1:
+        return url
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}parte={part}"
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+
+import circuit_breaker
+import fair_share
+import metrics
+import rate_limit
+
+# Timeout por defecto (conexión, lectura) en segundos para llamadas que no indican uno propio
+DEFAULT_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")),
+    float(os.getenv("HTTP_READ_TIMEOUT", "30")),
+)
+# Conexiones keep-alive que se mantienen abiertas por host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+
+# Proveedor externo al que pertenece cada host (para límites y métricas por proveedor)
+PROVIDER_HOSTS = {
+    "www.googleapis.com": "youtube",
+    "oauth2.googleapis.com": "oauth",
+    "api.apify.com": "apify",
+    "openrouter.ai": "openrouter",
+    "generativelanguage.googleapis.com": "gemini",
+    "readwise.io": "readwise",
+    "api.telegram.org": "telegram",
+    "api.pushover.net": "pushover",
+}
+
+# Peticiones simultáneas permitidas por proveedor en el cliente asíncrono
+PROVIDER_CONCURRENCY = {
+    "youtube": int(os.getenv("CONCURRENCY_YOUTUBE", "10")),
+    "oauth": int(os.getenv("CONCURRENCY_OAUTH", "2")),
+    "apify": int(os.getenv("CONCURRENCY_APIFY", "2")),
+    "openrouter": int(os.getenv("CONCURRENCY_OPENROUTER", "8")),
+    "gemini": int(os.getenv("CONCURRENCY_GEMINI", "4")),
+    "readwise": int(os.getenv("CONCURRENCY_READWISE", "4")),
+    "telegram": int(os.getenv("CONCURRENCY_TELEGRAM", "10")),
+    "pushover": int(os.getenv("CONCURRENCY_PUSHOVER", "2")),
+}
+DEFAULT_PROVIDER_CONCURRENCY = 10
+
+
+def _parse_host_overrides(value):
+    """'host=http://127.0.0.1:8001,host2=...' -> {host: base_url}"""
+    overrides = {}
+    for entry in value.split(","):
+        host, _, base_url = entry.strip().partition("=")
+        if host and base_url:
+            overrides[host.strip()] = base_url.strip().rstrip("/")
+    return overrides
+
+
+# Redirige hosts externos a otra base (p. ej. los servidores locales de benchmark.py)
+HTTP_HOST_OVERRIDES = _parse_host_overrides(os.getenv("HTTP_HOST_OVERRIDES", ""))
+
+_IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+_RETRY_STATUSES = (500, 502, 503, 504)
+
+# Clientes (por host) y semáforos (por proveedor) de cada event loop: no se pueden
+# compartir entre loops, y con claves débiles desaparecen al recogerse el loop
+_async_clients = weakref.WeakKeyDictionary()
+_async_semaphores = weakref.WeakKeyDictionary()
+
+
+def provider_for(url):
+    """Nombre del proveedor externo de una URL (o su host si no es conocido)"""
+    host = urlsplit(url).hostname or ""
+    return PROVIDER_HOSTS.get(host, host)
+
+
+def resolve_url(url):
+    """URL a la que se hace realmente la petición (aplica HTTP_HOST_OVERRIDES)
+
+    El proveedor (límites, circuitos, concurrencia) se sigue sacando de la URL original.
+    """
+    if not HTTP_HOST_OVERRIDES:
+        return url
+    parts = urlsplit(url)
+    base_url = HTTP_HOST_OVERRIDES.get(parts.hostname or "")
+    if base_url is None:
+        return url
+    base = urlsplit(base_url)
+    return urlunsplit((base.scheme, base.netloc, base.path + parts.path, parts.query, parts.fragment))
+
+
+def _throttled(limiter, response, throttled_attempts):
+    """Registra un 429 en el limitador; True si hay que reintentar la petición"""
+    if response.status_code != 429:
+        return False
+    limiter.penalize(rate_limit.retry_after_seconds(response.headers))
+    return throttled_attempts < rate_limit.RATE_LIMIT_MAX_RETRIES
+
+
+def _observe(provider, started, response=None):
+    """Registra latencia y código de una petición (response=None si no hubo respuesta)"""
+    metrics.HTTP_REQUEST_SECONDS.observe(time.monotonic() - started, provider=provider)
+    metrics.HTTP_RESPONSES.inc(provider=provider, status=response.status_code if response is not None else "error")
+
+
+def _record_outcome(breaker, response):
+    """Un 5xx cuenta como fallo del proveedor; cualquier otra respuesta, como éxito"""
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def _async_timeout(timeout):
+    """Convierte un timeout estilo requests (número o tupla) a httpx.Timeout"""
+    timeout = timeout or DEFAULT_TIMEOUT
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def get_async_client(url):
+    """Devuelve el cliente asíncrono (con su pool keep-alive) del host, para el loop actual"""
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    client = clients.get(key)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_MAX_RETRIES),
+        )
+        clients[key] = client
+    return client
+
+
+def _provider_semaphore(provider):
+    """Semáforo que limita las peticiones simultáneas a un proveedor en el loop actual
+
+    Es un FairSemaphore: con varios trabajos a la vez, los huecos se reparten entre ellos.
+    """
+    semaphores = _async_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get(provider)
+    if semaphore is None:
+        semaphore = fair_share.FairSemaphore(PROVIDER_CONCURRENCY.get(provider, DEFAULT_PROVIDER_CONCURRENCY))
+        semaphores[provider] = semaphore
+    return semaphore
+
+
+def concurrency_stats():
+    """Huecos en uso, en espera y concedidos por proveedor e inquilino en el loop actual"""
+    semaphores = _async_semaphores.get(asyncio.get_running_loop(), {})
+    return {provider: semaphore.stats() for provider, semaphore in semaphores.items()}
+
+
+async def arequest(method, url, timeout=None, rate_tokens=0, **kwargs):
+    """Hace una petición HTTP con el cliente compartido del host
+
+    Respeta el límite de ritmo del proveedor (rate_tokens = tokens de la petición para
+    los límites por tokens/min) y ante un 429 espera el Retry-After y reintenta. Si el
+    circuito del proveedor está abierto lanza CircuitOpenError sin hacer la petición.
+    httpx ya reintenta los errores de conexión; aquí se añaden los errores de lectura
+    y los 5xx para métodos idempotentes (un POST a un LLM o a Readwise no se repite a
+    ciegas), con backoff exponencial.
+    """
+    provider = provider_for(url)
+    url = resolve_url(url)
+    client = get_async_client(url)
+    semaphore = _provider_semaphore(provider)
+    limiter = rate_limit.get_limiter(provider)
+    breaker = circuit_breaker.get_breaker(provider)
+    breaker.before_call()
+    retryable = method.upper() in _IDEMPOTENT_METHODS
+    attempt = 0
+    throttled_attempts = 0
+    while True:
+        try:
+            async with semaphore:
+                # El token de ritmo se pide ya con el hueco: el reparto justo decide quién lo gasta
+                await limiter.aacquire(rate_tokens)
+                started = time.monotonic()
+                response = await client.request(method, url, timeout=_async_timeout(timeout), **kwargs)
+        except (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError):
+            _observe(provider, started)
+            if not retryable or attempt >= HTTP_MAX_RETRIES:
+                breaker.record_failure()
+                raise
+            metrics.HTTP_RETRIES.inc(provider=provider, reason="read_error")
+        except httpx.HTTPError:
+            _observe(provider, started)
+            breaker.record_failure()
+            raise
+        else:
+            _observe(provider, started, response)
+            if _throttled(limiter, response, throttled_attempts):
+                # La espera la impone el limitador en la siguiente vuelta
+                metrics.HTTP_RETRIES.inc(provider=provider, reason="rate_limit")
+                throttled_attempts += 1
+                continue
+            if not retryable or response.status_code not in _RETRY_STATUSES or attempt >= HTTP_MAX_RETRIES:
+                _record_outcome(breaker, response)
+                return response
+            metrics.HTTP_RETRIES.inc(provider=provider, reason="server_error")
+        await asyncio.sleep(0.5 * (2 ** attempt))
+        attempt += 1
+
+
+@asynccontextmanager
+async def astream(method, url, timeout=None, rate_tokens=0, **kwargs):
+    """Petición asíncrona cuyo cuerpo se lee por trozos (response.aiter_bytes())
+
+    Solo se reintentan los 429: el cuerpo ya consumido no se puede volver a entregar.
+    """
+    provider = provider_for(url)
+    url = resolve_url(url)
+    client = get_async_client(url)
+    limiter = rate_limit.get_limiter(provider)
+    breaker = circuit_breaker.get_breaker(provider)
+    breaker.before_call()
+    throttled_attempts = 0
+    while True:
+        async with _provider_semaphore(provider):
+            await limiter.aacquire(rate_tokens)
+            started = time.monotonic()
+            response = None
+            try:
+                async with client.stream(method, url, timeout=_async_timeout(timeout), **kwargs) as response:
+                    # La latencia de un stream es la de las cabeceras; el cuerpo lo lee quien llama
+                    _observe(provider, started, response)
+                    if not _throttled(limiter, response, throttled_attempts):
+                        _record_outcome(breaker, response)
+                        yield response
+                        return
+            except httpx.HTTPError:
+                # Incluye los cortes a mitad de la lectura del cuerpo
+                if response is None:
+                    _observe(provider, started)
+                breaker.record_failure()
+                raise
+        metrics.HTTP_RETRIES.inc(provider=provider, reason="rate_limit")
+        throttled_attempts += 1
+
+
+async def aget(url, **kwargs):
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url, **kwargs):
+    return await arequest("POST", url, **kwargs)
+
+
+async def adelete(url, **kwargs):
+    return await arequest("DELETE", url, **kwargs)
+
+
+async def aclose_all():
+    """Cierra los clientes asíncronos del loop actual"""
+    loop = asyncio.get_running_loop()
+    for client in _async_clients.pop(loop, {}).values():
+        await client.aclose()
+    _async_semaphores.pop(loop, None)
@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Base de datos de la cola de trabajos (debe sobrevivir a reinicios del proceso)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(".data", "jobs.sqlite3"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Espera antes del primer reintento; se duplica en cada intento fallido
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "30"))
+# Días que se guardan los trabajos terminados (y con ellos sus dedup_key) antes de borrarlos
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+# Cada cuánto (segundos) se borran los trabajos viejos al encolar
+_PRUNE_INTERVAL = 3600
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class PermanentJobError(ValueError):
+    """Fallo que no se arregla reintentando (p. ej. un video sin transcripción): el trabajo falla ya"""
+
+
+def _kind_filter(kinds):
+    """Condición SQL (y parámetros) para limitarse a unos tipos de trabajo"""
+    if not kinds:
+        return "", ()
+    return f" AND kind IN ({', '.join('?' * len(kinds))})", tuple(kinds)
+
+
+class JobQueue:
+    """Cola de trabajos persistida en SQLite con reintentos y exclusión por clave
+
+    Los trabajos con la misma concurrency_key nunca se ejecutan a la vez (por ejemplo,
+    dos procesados de la misma playlist), y un trabajo pendiente con esa clave absorbe
+    los nuevos encolados en lugar de duplicarse.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, max_attempts=JOB_MAX_ATTEMPTS, retry_base_delay=JOB_RETRY_BASE_DELAY,
+                 retention_days=JOB_RETENTION_DAYS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retention = retention_days * 86400
+        self._last_prune = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """Abre la conexión (perezosamente) y crea la tabla si no existe"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    concurrency_key TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    next_run_at REAL NOT NULL,
+                    dedup_key TEXT
+                )"""
+            )
+            # Bases creadas antes de existir dedup_key
+            columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            if "dedup_key" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN dedup_key TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, next_run_at)")
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key)")
+            self._conn.commit()
+        return self._conn
+
+    def enqueue(self, kind, payload, concurrency_key=None, max_attempts=None, dedup_key=None):
+        """Encola un trabajo y devuelve (id, creado)
+
+        Si ya existe un trabajo con la misma dedup_key (en cualquier estado) o uno pendiente
+        con la misma concurrency_key, no se crea otro y se devuelve el existente.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if dedup_key:
+                row = conn.execute("SELECT id FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()
+                if row:
+                    return row["id"], False
+            if concurrency_key:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE concurrency_key = ? AND status = ? ORDER BY id LIMIT 1",
+                    (concurrency_key, PENDING),
+                ).fetchone()
+                if row:
+                    return row["id"], False
+            cursor = conn.execute(
+                """INSERT INTO jobs (kind, payload, status, concurrency_key, max_attempts,
+                                     created_at, updated_at, next_run_at, dedup_key)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (kind, json.dumps(payload), PENDING, concurrency_key,
+                 max_attempts or self.max_attempts, now, now, now, dedup_key),
+            )
+            if self._last_prune is None or now - self._last_prune >= _PRUNE_INTERVAL:
+                self._prune(conn, now)
+            conn.commit()
+            return cursor.lastrowid, True
+
+    def claim(self, kinds=None):
+        """Marca como 'running' el siguiente trabajo listo (de uno de kinds, si se indica) y lo devuelve (o None)"""
+        now = time.time()
+        kind_filter, kind_params = _kind_filter(kinds)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"""SELECT * FROM jobs
+                   WHERE status = ? AND next_run_at <= ?{kind_filter}
+                     AND (concurrency_key IS NULL OR concurrency_key NOT IN (
+                          SELECT concurrency_key FROM jobs
+                          WHERE status = ? AND concurrency_key IS NOT NULL))
+                   ORDER BY next_run_at, id LIMIT 1""",
+                (PENDING, now, *kind_params, RUNNING),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, now, row["id"]),
+            )
+            conn.commit()
+            job = dict(row)
+            job["attempts"] += 1
+            job["payload"] = json.loads(job["payload"])
+            return job
+
+    def complete(self, job_id):
+        self._set_status(job_id, DONE)
+
+    def fail(self, job_id, error):
+        """Registra un fallo: reprograma con backoff o marca el trabajo como fallido
+
+        Un PermanentJobError lo marca como fallido aunque le queden intentos.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            will_retry = row["attempts"] < row["max_attempts"] and not isinstance(error, PermanentJobError)
+            delay = self.retry_base_delay * (2 ** (row["attempts"] - 1))
+            conn.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, updated_at = ?, next_run_at = ? WHERE id = ?",
+                (PENDING if will_retry else FAILED, str(error)[:1000], now, now + delay, job_id),
+            )
+            conn.commit()
+            return will_retry
+
+    def _set_status(self, job_id, status):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+            conn.commit()
+
+    def requeue_running(self):
+        """Devuelve a 'pending' los trabajos que quedaron a medias (p. ej. tras un reinicio)
+
+        Un trabajo que ya gastó todos sus intentos se marca como fallido: si es él el que
+        tumba el proceso (p. ej. por memoria), volver a encolarlo lo repetiría para siempre.
+        Devuelve (reencolados, fallidos).
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            failed = conn.execute(
+                """UPDATE jobs SET status = ?, last_error = ?, updated_at = ?
+                   WHERE status = ? AND attempts >= max_attempts""",
+                (FAILED, "Interrumpido en el último intento (reinicio del proceso)", now, RUNNING),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, next_run_at = ?, updated_at = ? WHERE status = ?",
+                (PENDING, now, now, RUNNING),
+            ).rowcount
+            conn.commit()
+            return requeued, failed
+
+    def prune(self):
+        """Borra los trabajos terminados hace más de JOB_RETENTION_DAYS; devuelve cuántos"""
+        with self._lock:
+            conn = self._connect()
+            deleted = self._prune(conn, time.time())
+            conn.commit()
+            return deleted
+
+    def _prune(self, conn, now):
+        self._last_prune = now
+        cursor = conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, now - self.retention)
+        )
+        return cursor.rowcount
+
+    def next_run_in(self, kinds=None):
+        """Segundos hasta el próximo trabajo pendiente programado (None si no hay)"""
+        kind_filter, kind_params = _kind_filter(kinds)
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT MIN(next_run_at) FROM jobs WHERE status = ?{kind_filter}", (PENDING, *kind_params)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def stats(self):
+        """Número de trabajos por estado"""
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
@@ -0,0 +1,133 @@
+"""Logging estructurado del servicio, con un ID de correlación por trabajo.
+
+Todos los módulos escriben en loggers hijos de "video_resumen" (get_logger). Cada
+línea lleva el ID del trabajo en curso, guardado en un contextvar que asyncio hereda
+en las tareas que lanza el trabajo, así que los logs de trabajos simultáneos se
+pueden separar.
+
+LOG_FORMAT elige entre "text" (una línea legible) y "json" (un objeto por línea con
+los campos extra del mensaje); LOG_LEVEL fija el nivel. Los mensajes usan el formato
+perezoso de logging ("%s" + argumentos) y lo que es caro de calcular se envuelve en
+lazy(), de modo que un DEBUG desactivado no formatea ni serializa nada.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+ROOT_LOGGER = "video_resumen"
+
+_job_id = contextvars.ContextVar("job_id", default=None)
+_configured = False
+
+# Atributos propios de LogRecord: todo lo demás son campos extra del mensaje
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "job_id"}
+
+
+def new_job_id():
+    return uuid.uuid4().hex[:8]
+
+
+def current_job_id():
+    """ID de correlación del trabajo en curso (None fuera de un trabajo)"""
+    return _job_id.get()
+
+
+@contextmanager
+def job_context(job_id=None):
+    """Asocia un ID de correlación a todo lo que se loguee dentro del bloque
+
+    Sin job_id se reutiliza el del trabajo en curso o, si no hay, se crea uno nuevo.
+    """
+    if job_id is None and _job_id.get() is not None:
+        yield _job_id.get()
+        return
+    token = _job_id.set(str(job_id) if job_id is not None else new_job_id())
+    try:
+        yield _job_id.get()
+    finally:
+        _job_id.reset(token)
+
+
+class lazy:
+    """Argumento de log que solo se calcula si el mensaje llega a emitirse"""
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class _JobIdFilter(logging.Filter):
+    def filter(self, record):
+        record.job_id = _job_id.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """2026-02-04 12:00:00 INFO    [a1b2c3d4] mensaje clave=valor"""
+
+    def format(self, record):
+        line = (
+            f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} "
+            f"[{record.job_id or '-'}] {record.getMessage()}"
+        )
+        extra = _extra_fields(record)
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea: ts, level, logger, job_id, message y los campos extra"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "job_id": record.job_id,
+            "message": record.getMessage(),
+        }
+        data.update(_extra_fields(record))
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def configure(level=LOG_LEVEL, log_format=LOG_FORMAT):
+    """Instala el handler de los loggers del servicio (se puede volver a llamar para cambiarlo)"""
+    global _configured
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    handler.addFilter(_JobIdFilter())
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    # Sin propagar: uvicorn configura el logger raíz con su propio formato
+    logger.propagate = False
+    _configured = True
+
+
+def get_logger(name):
+    """Logger de un módulo ("workflow" -> "video_resumen.workflow")"""
+    if not _configured:
+        configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
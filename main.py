@@ -1,30 +1,170 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import workflow
+import async_workflow
+import circuit_breaker
+import hedging
+import http_client
+import logs
+import metrics
+import rate_limit
 import asyncio
+import os
+import time
 from datetime import datetime
+from cache import summary_cache, transcript_cache
+from job_queue import JobQueue
+from playlist_checkpoint import playlist_checkpoint
+from video_metadata import canonical_video_url, metadata_cache, parse_video_id
+
+log = logs.get_logger("main")
 
 app = FastAPI(title="Video Resumen Processor")
 
+# Trabajos que se ejecutan a la vez y cada cuánto se revisa la cola si nadie avisa
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Workers extra que solo atienden /telegram: los mensajes no esperan detrás de playlists enteras
+JOB_TELEGRAM_WORKERS = int(os.getenv("JOB_TELEGRAM_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+
+job_queue = JobQueue()
+_job_available = None
+_worker_tasks = []
+
+@app.on_event("startup")
+async def start_job_workers():
+    """Recupera los trabajos interrumpidos y arranca el pool de workers"""
+    global _job_available
+    _job_available = asyncio.Event()
+    requeued, failed = job_queue.requeue_running()
+    if requeued:
+        log.info("♻️ %d trabajos interrumpidos vuelven a la cola", requeued)
+    if failed:
+        log.warning("⚠️ %d trabajos interrumpidos en su último intento se dan por fallidos", failed)
+    pruned = job_queue.prune()
+    if pruned:
+        log.info("🧹 %d trabajos terminados antiguos borrados de la cola", pruned)
+    for worker_id in range(JOB_WORKERS):
+        _worker_tasks.append(asyncio.create_task(job_worker(worker_id)))
+    for worker_id in range(JOB_WORKERS, JOB_WORKERS + JOB_TELEGRAM_WORKERS):
+        _worker_tasks.append(asyncio.create_task(job_worker(worker_id, kinds=("telegram",))))
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Detiene los workers y cierra los pools de conexiones al apagar el servidor"""
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+    await http_client.aclose_all()
+
+def enqueue_job(kind, payload, concurrency_key=None, dedup_key=None):
+    """Guarda el trabajo en la cola persistente y despierta a los workers; devuelve (id, creado)"""
+    job_id, created = job_queue.enqueue(kind, payload, concurrency_key=concurrency_key, dedup_key=dedup_key)
+    if created and _job_available is not None:
+        _job_available.set()
+    return job_id, created
+
+async def job_worker(worker_id, kinds=None):
+    """Toma trabajos de la cola (solo de kinds, si se indica) uno a uno hasta que se apaga el servidor"""
+    while True:
+        job = job_queue.claim(kinds)
+        if job is None:
+            wait = job_queue.next_run_in(kinds)
+            timeout = JOB_POLL_INTERVAL if wait is None else min(wait, JOB_POLL_INTERVAL)
+            try:
+                await asyncio.wait_for(_job_available.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            _job_available.clear()
+            continue
+        
+        # Todo lo que se loguee durante el trabajo (también en sus hilos) lleva su ID
+        with logs.job_context(f"job-{job['id']}"):
+            await run_claimed_job(worker_id, job)
+
+async def run_claimed_job(worker_id, job):
+    """Ejecuta un trabajo ya reclamado y registra en la cola si terminó o falló"""
+    log.info("👷 Worker %d: trabajo %s (%s), intento %d/%d",
+             worker_id, job['id'], job['kind'], job['attempts'], job['max_attempts'])
+    started = time.monotonic()
+    try:
+        await run_job(job)
+        job_queue.complete(job["id"])
+        metrics.JOB_SECONDS.observe(time.monotonic() - started, kind=job["kind"], outcome="done")
+    except asyncio.CancelledError:
+        # Apagado: el trabajo queda 'running' y se recupera en el próximo arranque
+        raise
+    except Exception as e:
+        metrics.JOB_SECONDS.observe(time.monotonic() - started, kind=job["kind"], outcome="failed")
+        will_retry = job_queue.fail(job["id"], e)
+        log.error("Trabajo %s falló (%s): %s", job['id'], 'se reintentará' if will_retry else 'sin más reintentos', e)
+        if not will_retry:
+            await notify_job_failure(job, e)
+
+async def run_job(job):
+    """Ejecuta un trabajo según su tipo"""
+    payload = job["payload"]
+    if job["kind"] == "playlist":
+        # Los trabajos encolados antes de PLAYLISTS no llevan playlist: la de siempre
+        await run_workflow_async(payload.get("playlist_id", workflow.PLAYLIST_ID), payload.get("name"))
+    elif job["kind"] == "telegram":
+        await run_telegram_workflow_async(payload["video_url"], payload["chat_id"], job["attempts"])
+    else:
+        raise ValueError(f"Tipo de trabajo desconocido: {job['kind']}")
+
+async def notify_job_failure(job, error):
+    """Avisa al usuario cuando un trabajo agota sus reintentos"""
+    if job["kind"] == "telegram":
+        await async_workflow.send_telegram_message(job["payload"]["chat_id"], f"❌ Error al procesar el video: {str(error)}")
+
+def enqueue_playlist(name, playlist_id):
+    """Encola el workflow de una playlist: nunca hay dos procesados de la misma playlist a la vez"""
+    job_id, _ = enqueue_job("playlist", {"playlist_id": playlist_id, "name": name},
+                            concurrency_key=f"playlist:{playlist_id}")
+    return job_id
+
+def find_playlist(playlist):
+    """Nombre en PLAYLISTS de una playlist dada por nombre o por ID (None si no está configurada)"""
+    if playlist in workflow.PLAYLISTS:
+        return playlist
+    for name, playlist_id in workflow.PLAYLISTS.items():
+        if playlist_id == playlist:
+            return name
+    return None
+
+def _processing_response(jobs):
+    content = {
+        "status": "processing",
+        "message": "Workflow iniciado",
+        "jobs": jobs,
+        "timestamp": datetime.now().isoformat()
+    }
+    if len(jobs) == 1:
+        content["job_id"] = next(iter(jobs.values()))
+    return JSONResponse(status_code=200, content=content)
+
 @app.post("/webhook")
 async def trigger_processing():
     """
     Endpoint que reemplaza tu webhook de N8N.
     Lo llamas desde el shortcut de tu teléfono.
-    Procesa una playlist completa.
+    Procesa todas las playlists configuradas (PLAYLISTS), cada una en su propio trabajo.
     """
     try:
-        # Ejecutar el workflow en background para no timeout
-        asyncio.create_task(run_workflow_async())
-        
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "processing",
-                "message": "Workflow iniciado",
-                "timestamp": datetime.now().isoformat()
-            }
-        )
+        jobs = {name: enqueue_playlist(name, playlist_id) for name, playlist_id in workflow.PLAYLISTS.items()}
+        return _processing_response(jobs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/webhook/{playlist}")
+async def trigger_playlist_processing(playlist: str):
+    """Procesa solo una de las playlists configuradas, por nombre o por ID"""
+    name = find_playlist(playlist)
+    if name is None:
+        raise HTTPException(status_code=404, detail=f"Playlist no configurada: {playlist}")
+    try:
+        return _processing_response({name: enqueue_playlist(name, workflow.PLAYLISTS[name])})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -37,24 +177,37 @@ async def telegram_webhook(request: Request):
     try:
         data = await request.json()
         
+        # Telegram reenvía la misma actualización si tardamos en responder
+        update_id = data.get("update_id")
+        dedup_key = f"telegram:update:{update_id}" if update_id is not None else None
+        
         # Extraer datos del mensaje de Telegram
         if "message" in data and "text" in data["message"]:
             video_url = data["message"]["text"]
             chat_id = data["message"]["chat"]["id"]
             
-            # Verificar que sea una URL de YouTube
-            if "youtube.com" in video_url or "youtu.be" in video_url:
-                # Ejecutar procesamiento en background
-                asyncio.create_task(run_telegram_workflow_async(video_url, chat_id))
+            # Verificar que sea una URL de YouTube (cualquier formato) y normalizarla
+            try:
+                video_url = canonical_video_url(parse_video_id(video_url))
+            except ValueError:
+                video_url = None
+            
+            if video_url:
+                # Encolar el procesamiento en background
+                job_id, created = enqueue_job("telegram", {"video_url": video_url, "chat_id": chat_id}, dedup_key=dedup_key)
                 
                 return JSONResponse(
                     status_code=200,
-                    content={"status": "processing", "message": "Video recibido"}
+                    content={
+                        "status": "processing" if created else "duplicate",
+                        "message": "Video recibido" if created else "Actualización ya recibida",
+                        "job_id": job_id
+                    }
                 )
             else:
                 # Enviar mensaje de error por Telegram
                 asyncio.create_task(
-                    asyncio.to_thread(workflow.send_telegram_message, chat_id, "Por favor envía una URL válida de YouTube.")
+                    async_workflow.send_telegram_message(chat_id, "Por favor envía una URL válida de YouTube.")
                 )
                 return JSONResponse(
                     status_code=400,
@@ -67,41 +220,93 @@ async def telegram_webhook(request: Request):
         )
         
     except Exception as e:
-        print(f"[{datetime.now()}] Error en webhook Telegram: {e}")
+        log.exception("Error en webhook Telegram: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def run_workflow_async():
-    """Ejecuta el workflow de playlist sin bloquear la respuesta HTTP"""
-    try:
-        await asyncio.to_thread(workflow.process_playlist)
-        print(f"[{datetime.now()}] Workflow de playlist completado exitosamente")
-    except Exception as e:
-        print(f"[{datetime.now()}] Error en workflow de playlist: {e}")
+async def run_workflow_async(playlist_id=workflow.PLAYLIST_ID, name=None):
+    """Ejecuta el workflow de playlist (los errores se propagan para que el worker reintente)"""
+    await async_workflow.process_playlist(playlist_id, name)
+    log.info("Workflow de playlist completado exitosamente")
 
-async def run_telegram_workflow_async(video_url: str, chat_id: int):
-    """Ejecuta el workflow de Telegram sin bloquear la respuesta HTTP"""
-    try:
-        await asyncio.to_thread(workflow.process_video_from_telegram, video_url, chat_id)
-        print(f"[{datetime.now()}] Workflow de Telegram completado exitosamente")
-    except Exception as e:
-        print(f"[{datetime.now()}] Error en workflow de Telegram: {e}")
-        # Notificar error por Telegram
-        await asyncio.to_thread(workflow.send_telegram_message, chat_id, f"❌ Error al procesar el video: {str(e)}")
+async def run_telegram_workflow_async(video_url: str, chat_id: int, attempt: int = 1):
+    """Ejecuta el workflow de Telegram (los errores se propagan para que el worker reintente)"""
+    await async_workflow.process_video_from_telegram(video_url, chat_id, attempt)
+    log.info("Workflow de Telegram completado exitosamente")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    """Estado de un trabajo encolado"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
 
 @app.get("/health")
 async def health_check():
-    import os
     return {
         "status": "ok", 
         "service": "video-processor",
-        "yt_env_configured": bool(os.getenv("YT_CLIENT_ID") and os.getenv("YT_CLIENT_SECRET") and os.getenv("YT_REFRESH_TOKEN"))
+        "yt_env_configured": bool(os.getenv("YT_CLIENT_ID") and os.getenv("YT_CLIENT_SECRET") and os.getenv("YT_REFRESH_TOKEN")),
+        "jobs": job_queue.stats(),
+        "rate_limits": rate_limit.stats(),
+        "llm_hedging": hedging.stats(),
+        "circuits": circuit_breaker.stats(),
+        "playlist_progress": playlist_checkpoint.count(),
+        "playlists": workflow.PLAYLISTS,
+        "concurrency": http_client.concurrency_stats()
+    }
+
+def _collected_metrics():
+    """Contadores que ya llevan otros módulos, en el formato que espera metrics.render"""
+    caches = {
+        "summary": summary_cache.stats(),
+        "transcript": transcript_cache.stats(),
+        "metadata": metadata_cache.stats(),
     }
+    circuits = circuit_breaker.stats()
+    limits = rate_limit.stats()
+    llm_hedging = hedging.stats()
+    concurrency = http_client.concurrency_stats()
+    return [
+        ("cache_hits_total", "counter", "Aciertos de cada caché",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("cache_misses_total", "counter", "Fallos de cada caché",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("cache_entries", "gauge", "Entradas guardadas en cada caché",
+         [({"cache": name}, stats["entries"]) for name, stats in caches.items()]),
+        ("circuit_open", "gauge", "1 si el circuito del proveedor no está cerrado",
+         [({"provider": provider}, int(stats["state"] != circuit_breaker.CLOSED)) for provider, stats in circuits.items()]),
+        ("circuit_trips_total", "counter", "Veces que se ha abierto el circuito de cada proveedor",
+         [({"provider": provider}, stats["trips"]) for provider, stats in circuits.items()]),
+        ("rate_limit_throttled_total", "counter", "Respuestas 429 por proveedor",
+         [({"provider": provider}, stats["throttled"]) for provider, stats in limits.items()]),
+        ("rate_limit_wait_seconds_total", "counter", "Segundos esperados por el limitador de cada proveedor",
+         [({"provider": provider}, stats["waited_seconds"]) for provider, stats in limits.items()]),
+        ("provider_slots_in_use", "gauge", "Peticiones en curso por proveedor e inquilino (playlist, telegram)",
+         [({"provider": provider, "tenant": tenant}, count)
+          for provider, stats in concurrency.items() for tenant, count in stats["in_use"].items()]),
+        ("provider_slots_waiting", "gauge", "Peticiones esperando hueco por proveedor e inquilino",
+         [({"provider": provider, "tenant": tenant}, count)
+          for provider, stats in concurrency.items() for tenant, count in stats["waiting"].items()]),
+        ("provider_slots_granted_total", "counter", "Huecos concedidos por proveedor e inquilino",
+         [({"provider": provider, "tenant": tenant}, count)
+          for provider, stats in concurrency.items() for tenant, count in stats["granted"].items()]),
+        ("llm_hedged_total", "counter", "Llamadas al LLM en las que se lanzó la petición de respaldo",
+         [({}, llm_hedging["hedged"])]),
+        ("jobs", "gauge", "Trabajos de la cola por estado",
+         [({"status": status}, count) for status, count in job_queue.stats().items()]),
+    ]
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(metrics.render(_collected_metrics()), media_type="text/plain; version=0.0.4")
 
 @app.get("/test-youtube")
 async def test_youtube():
     """Endpoint de diagnóstico para probar las credenciales de YouTube"""
     try:
-        token = workflow._get_youtube_access_token()
+        token = await async_workflow._get_youtube_access_token()
         return {
             "status": "OK",
             "message": "Token obtenido exitosamente",
@@ -122,10 +327,11 @@ async def test_youtube():
 
 @app.get("/test-gemini")
 async def test_gemini():
-    """Endpoint de diagnóstico para probar APIs de IA desde Render"""
-    import requests as req
-    import os
-    
+    """Endpoint de diagnóstico para probar APIs de IA desde Render
+
+    Usa el cliente asíncrono de http_client: una llamada bloqueante aquí pararía el
+    event loop y con él todos los trabajos en curso.
+    """
     results = {
         "gemini_key_configured": bool(os.getenv("GEMINI_KEY")),
         "gemini_key_preview": (os.getenv("GEMINI_KEY", "")[:10] + "...") if os.getenv("GEMINI_KEY") else "NOT SET",
@@ -137,7 +343,7 @@ async def test_gemini():
     
     # Obtener IP pública del servidor
     try:
-        ip_resp = req.get("https://api.ipify.org?format=json", timeout=5)
+        ip_resp = await http_client.aget("https://api.ipify.org?format=json", timeout=5)
         results["server_ip"] = ip_resp.json().get("ip", "unknown")
     except:
         results["server_ip"] = "could not determine"
@@ -146,7 +352,7 @@ async def test_gemini():
     openrouter_key = os.getenv("OPENROUTER_KEY", "")
     if openrouter_key:
         try:
-            r = req.post(
+            r = await http_client.apost(
                 "https://openrouter.ai/api/v1/chat/completions",
                 headers={
                     "Authorization": f"Bearer {openrouter_key}",
@@ -173,7 +379,7 @@ async def test_gemini():
     api_key = os.getenv("GEMINI_KEY", "")
     if api_key:
         try:
-            r = req.post(
+            r = await http_client.apost(
                 f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
                 json={"contents": [{"parts": [{"text": "Responde solo: OK"}]}]},
                 timeout=30
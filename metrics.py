@@ -0,0 +1,175 @@
+"""Métricas del proceso en el formato de texto de Prometheus (endpoint /metrics).
+
+Histogramas de latencia por etapa, por proveedor HTTP y por LLM, y contadores de
+reintentos, fallbacks y tamaños. Todo vive en memoria del proceso (como los límites
+de ritmo y los circuitos) y es seguro entre hilos. Los contadores que ya llevan otros
+módulos (cachés, circuitos, cola de trabajos) no se duplican aquí: quien sirve
+/metrics los pasa a render() como muestras ya calculadas.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_PREFIX = "video_resumen"
+
+# Límites superiores de los buckets (segundos y tokens estimados)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"Etiquetas esperadas {label_names}, recibidas {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+
+    type = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, list(zip(self.label_names, key)), value
+
+
+class Histogram:
+    """Histograma acumulativo (buckets, _sum y _count) con etiquetas"""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mide la duración del bloque (también con await dentro), acabe bien o con error"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + [("le", _format_value(bound))], cumulative
+            yield f"{self.name}_bucket", labels + [("le", "+Inf")], count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def counter(name, help_text, label_names=()):
+    return _register(Counter(name, help_text, label_names))
+
+
+def histogram(name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help_text, label_names, buckets))
+
+
+def render(collected=()):
+    """Texto de /metrics: las métricas registradas más las muestras de collected
+
+    collected es una lista de (nombre sin prefijo, tipo, ayuda, [(etiquetas, valor)]).
+    """
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for name, metric_type, help_text, samples in collected:
+        full_name = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{full_name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Métricas del workflow ---
+
+STAGE_SECONDS = histogram(
+    "stage_seconds",
+    "Duración de cada etapa del workflow (playlist_fetch, apify, html_build, readwise_save, playlist_cleanup...)",
+    ("stage",),
+)
+HTTP_REQUEST_SECONDS = histogram("http_request_seconds", "Latencia de las peticiones HTTP por proveedor", ("provider",))
+HTTP_RESPONSES = counter("http_responses_total", "Respuestas HTTP por proveedor y código ('error' = sin respuesta)",
+                         ("provider", "status"))
+HTTP_RETRIES = counter("http_retries_total", "Reintentos automáticos de http_client por proveedor y motivo",
+                       ("provider", "reason"))
+LLM_SECONDS = histogram("llm_request_seconds", "Latencia de las llamadas al LLM que devolvieron un resumen", ("provider",))
+LLM_FALLBACKS = counter("llm_fallbacks_total", "Resúmenes que pasaron de un proveedor LLM a otro",
+                        ("from_provider", "to_provider"))
+RETRIES = counter("retries_total", "Reintentos del workflow por operación (llm, readwise, playlist_delete)", ("operation",))
+TRANSCRIPT_TOKENS = histogram("transcript_tokens", "Tokens estimados de cada transcript, antes y después de compactar",
+                              ("phase",), buckets=TOKEN_BUCKETS)
+PROMPT_TOKENS = histogram("prompt_tokens", "Tokens estimados de cada prompt enviado al LLM", (), buckets=TOKEN_BUCKETS)
+JOB_SECONDS = histogram("job_seconds", "Duración de cada trabajo de la cola por tipo y resultado", ("kind", "outcome"))
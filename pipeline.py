@@ -0,0 +1,172 @@
+"""Pipeline productor/consumidor por etapas sobre asyncio.
+
+Cada etapa tiene su propia cola acotada y su número de workers; un elemento pasa a
+la siguiente etapa en cuanto termina la anterior, sin esperar al resto. Las colas
+acotadas hacen de contrapresión: si el LLM va lento, Apify deja de pedir más lotes.
+"""
+import asyncio
+import time
+
+from logs import get_logger
+
+log = get_logger("pipeline")
+
+_DONE = object()
+
+
+class Stage:
+    """Definición de una etapa: handler(item) o handler(lista) si batch_size > 1"""
+
+    def __init__(self, name, handler, workers=1, batch_size=1, queue_size=20, batch_wait=0.0):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size
+        # Tiempo que se espera a completar un lote antes de procesarlo incompleto
+        self.batch_wait = batch_wait
+
+
+class StageStats:
+    """Contadores de una etapa: elementos procesados, profundidad de cola y throughput"""
+
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def as_dict(self, queue=None):
+        end = self.finished_at or time.monotonic()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        return {
+            "stage": self.name,
+            "processed": self.processed,
+            "batches": self.batches,
+            "queue_depth": queue.qsize() if queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "throughput_per_s": round(self.processed / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+
+class Pipeline:
+    """Encadena etapas con colas acotadas y devuelve las salidas de la última"""
+
+    def __init__(self, stages, report_interval=None, name="pipeline"):
+        self.stages = stages
+        self.name = name
+        self.report_interval = report_interval
+        self.stats = [StageStats(stage.name) for stage in stages]
+        self._queues = []
+
+    def snapshot(self):
+        """Estado actual de cada etapa (para logs o métricas)"""
+        queues = self._queues or [None] * len(self.stages)
+        return [stats.as_dict(queue) for stats, queue in zip(self.stats, queues)]
+
+    def report(self):
+        for entry in self.snapshot():
+            log.info(
+                "📊 [%s] %s: %d procesados, cola %d (máx %d), %s/s",
+                self.name, entry['stage'], entry['processed'], entry['queue_depth'],
+                entry['max_queue_depth'], entry['throughput_per_s'],
+            )
+
+    async def _put(self, index, item):
+        queue = self._queues[index]
+        await queue.put(item)
+        if item is not _DONE:
+            stats = self.stats[index]
+            stats.max_queue_depth = max(stats.max_queue_depth, queue.qsize())
+
+    async def _next_batch(self, stage, queue):
+        """Toma hasta batch_size elementos; devuelve (lote, terminado)"""
+        item = await queue.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            try:
+                if stage.batch_wait > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                else:
+                    item = queue.get_nowait()
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _worker(self, index, outputs):
+        stage = self.stages[index]
+        stats = self.stats[index]
+        queue = self._queues[index]
+        is_last = index == len(self.stages) - 1
+        done = False
+        while not done:
+            batch, done = await self._next_batch(stage, queue)
+            if not batch:
+                continue
+            if stats.started_at is None:
+                stats.started_at = time.monotonic()
+            started = time.monotonic()
+            if stage.batch_size > 1:
+                results = await stage.handler(batch)
+            else:
+                results = [await stage.handler(batch[0])]
+            stats.busy_seconds += time.monotonic() - started
+            stats.processed += len(batch)
+            stats.batches += 1
+            for result in results:
+                if is_last:
+                    outputs.append(result)
+                else:
+                    await self._put(index + 1, result)
+
+    async def _run_stage(self, index, outputs):
+        stage = self.stages[index]
+        await asyncio.gather(*[self._worker(index, outputs) for _ in range(stage.workers)])
+        self.stats[index].finished_at = time.monotonic()
+        # Avisar a cada worker de la siguiente etapa de que no llegarán más elementos
+        if index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                await self._put(index + 1, _DONE)
+
+    async def _feed(self, source):
+        async for item in source:
+            await self._put(0, item)
+        for _ in range(self.stages[0].workers):
+            await self._put(0, _DONE)
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.report()
+
+    async def run(self, source):
+        """Ejecuta el pipeline consumiendo un iterable asíncrono; si una etapa falla se cancela todo"""
+        self._queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        outputs = []
+        tasks = [asyncio.create_task(self._feed(source))]
+        tasks += [asyncio.create_task(self._run_stage(i, outputs)) for i in range(len(self.stages))]
+        reporter = asyncio.create_task(self._report_periodically()) if self.report_interval else None
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if reporter:
+                reporter.cancel()
+        return outputs
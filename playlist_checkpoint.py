@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Progreso de cada video de la playlist (debe sobrevivir a reinicios, como la cola)
+PLAYLIST_CHECKPOINT_PATH = os.getenv("PLAYLIST_CHECKPOINT_PATH", os.path.join(".data", "playlist_progress.sqlite3"))
+# Pasado este tiempo sin avanzar, un video se vuelve a procesar desde el principio
+PLAYLIST_CHECKPOINT_TTL_DAYS = float(os.getenv("PLAYLIST_CHECKPOINT_TTL_DAYS", "30"))
+# Intentos fallidos tras los que un video deja de procesarse (sigue en la playlist hasta que
+# caduque su registro); un video sin transcript agota los intentos de una vez
+PLAYLIST_MAX_VIDEO_ATTEMPTS = int(os.getenv("PLAYLIST_MAX_VIDEO_ATTEMPTS", "3"))
+
+# Etapas en orden: cada una implica las anteriores. transcribed es solo informativa: el
+# transcript no se guarda aquí, un nuevo intento lo vuelve a leer de la caché de transcripts
+# (o, con TRANSCRIPT_CACHE_ENABLED=0, lo vuelve a pedir a Apify)
+TRANSCRIBED = "transcribed"
+SUMMARIZED = "summarized"
+SAVED = "saved"
+DELETED = "deleted"
+STAGES = (TRANSCRIBED, SUMMARIZED, SAVED, DELETED)
+
+
+def reached(stage, target):
+    """True si un video en la etapa stage ya completó target"""
+    return stage is not None and STAGES.index(stage) >= STAGES.index(target)
+
+
+class PlaylistCheckpoint:
+    """Hasta dónde llegó cada item de la playlist, para que un nuevo intento no repita trabajo
+
+    La clave es el item de la playlist (no el video): si el video se vuelve a añadir tras
+    borrarlo, es un item nuevo y se procesa otra vez. En la etapa summarized se guardan el
+    resumen y el bloque HTML, que es todo lo que falta para guardarlo en Readwise; antes de
+    esa etapa un nuevo intento retoma el video desde el transcript.
+
+    Los videos que no se pudieron resumir se apuntan aparte (fail) con su número de intentos,
+    para que una playlist no se atasque reintentando sin fin un video sin subtítulos.
+    """
+
+    def __init__(self, path=PLAYLIST_CHECKPOINT_PATH, ttl_days=PLAYLIST_CHECKPOINT_TTL_DAYS,
+                 max_attempts=PLAYLIST_MAX_VIDEO_ATTEMPTS):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """Abre la conexión (perezosamente) y crea la tabla si no existe"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS playlist_progress (
+                    playlist_id TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    summary TEXT,
+                    html_block TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (playlist_id, item_id)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS playlist_failures (
+                    playlist_id TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (playlist_id, item_id)
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self, playlist_id):
+        """Progreso guardado de la playlist: {item_id: {stage, summary, html_block, failures, error}}
+
+        failures son los intentos fallidos del video y error el último motivo. De paso olvida
+        los items que llevan más de PLAYLIST_CHECKPOINT_TTL_DAYS sin avanzar.
+        """
+        with self._lock:
+            conn = self._connect()
+            expired = time.time() - self.ttl
+            conn.execute("DELETE FROM playlist_progress WHERE updated_at < ?", (expired,))
+            conn.execute("DELETE FROM playlist_failures WHERE updated_at < ?", (expired,))
+            conn.commit()
+            rows = conn.execute(
+                "SELECT item_id, stage, summary, html_block FROM playlist_progress WHERE playlist_id = ?",
+                (playlist_id,),
+            ).fetchall()
+            failures = conn.execute(
+                "SELECT item_id, attempts, error FROM playlist_failures WHERE playlist_id = ?",
+                (playlist_id,),
+            ).fetchall()
+        progress = {
+            item_id: {"stage": stage, "summary": summary, "html_block": html_block, "failures": 0, "error": None}
+            for item_id, stage, summary, html_block in rows
+        }
+        for item_id, attempts, error in failures:
+            entry = progress.setdefault(item_id, {"stage": None, "summary": None, "html_block": None})
+            entry.update(failures=attempts, error=error)
+        return progress
+
+    def exhausted(self, progress):
+        """True si el video (una entrada de load) agotó sus intentos y no debe procesarse"""
+        return progress is not None and progress["failures"] >= self.max_attempts
+
+    def fail(self, playlist_id, records):
+        """Suma un intento fallido a los videos (dicts con item_id, video_id, error y, si el
+        fallo no se arregla reintentando, permanent=True, que agota los intentos)"""
+        now = time.time()
+        rows = [
+            (
+                playlist_id,
+                record["item_id"],
+                record["video_id"],
+                self.max_attempts if record.get("permanent") else 1,
+                record.get("error"),
+                now,
+            )
+            for record in records
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                """INSERT INTO playlist_failures (playlist_id, item_id, video_id, attempts, error, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (playlist_id, item_id) DO UPDATE SET
+                       attempts = MAX(excluded.attempts, attempts + 1),
+                       error = excluded.error,
+                       updated_at = excluded.updated_at""",
+                rows,
+            )
+            conn.commit()
+
+    def mark(self, playlist_id, records, stage):
+        """Registra que los videos (dicts con item_id, video_id y, si aplica, summary y
+        html_block) completaron stage; desde saved ya no hace falta guardar el contenido"""
+        keep_content = stage == SUMMARIZED
+        now = time.time()
+        rows = [
+            (
+                playlist_id,
+                record["item_id"],
+                record["video_id"],
+                stage,
+                record.get("summary") if keep_content else None,
+                record.get("html_block") if keep_content else None,
+                now,
+            )
+            for record in records
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                """INSERT OR REPLACE INTO playlist_progress
+                   (playlist_id, item_id, video_id, stage, summary, html_block, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+            # Un video que avanza deja de contar como fallido
+            conn.executemany(
+                "DELETE FROM playlist_failures WHERE playlist_id = ? AND item_id = ?",
+                [(playlist_id, row[1]) for row in rows],
+            )
+            conn.commit()
+
+    def count(self, playlist_id=None):
+        """Items con progreso guardado, por etapa, y videos que agotaron sus intentos (failed)"""
+        where = ""
+        params = ()
+        if playlist_id is not None:
+            where = " WHERE playlist_id = ?"
+            params = (playlist_id,)
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT stage, COUNT(*) FROM playlist_progress" + where + " GROUP BY stage",
+                                params).fetchall()
+            failed = conn.execute(
+                "SELECT COUNT(*) FROM playlist_failures" + (where + " AND" if where else " WHERE") + " attempts >= ?",
+                params + (self.max_attempts,),
+            ).fetchone()[0]
+        counts = dict(rows)
+        if failed:
+            counts["failed"] = failed
+        return counts
+
+
+playlist_checkpoint = PlaylistCheckpoint()
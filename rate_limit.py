@@ -0,0 +1,157 @@
+"""Límites de ritmo por proveedor (token bucket) compartidos por todos los trabajos.
+
+Cada proveedor tiene un bucket de peticiones/minuto y, opcionalmente, otro de
+tokens/minuto (para los LLM). Los buckets admiten reservas: quien llama descuenta
+ya su coste y espera (asyncio.sleep) lo que haga falta hasta que el bucket se rellene.
+Cuando un proveedor responde 429 se bloquea entero hasta el Retry-After indicado.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from logs import get_logger
+
+log = get_logger("rate_limit")
+
+# Valores por defecto (peticiones/min, tokens/min); 0 = sin límite
+_DEFAULT_LIMITS = {
+    "youtube": (600, 0),
+    "oauth": (60, 0),
+    "apify": (30, 0),
+    "openrouter": (60, 0),
+    "gemini": (15, 1000000),
+    "readwise": (50, 0),
+    "telegram": (600, 0),
+    "pushover": (60, 0),
+}
+
+# RATE_LIMIT_<PROVEEDOR>_RPM / RATE_LIMIT_<PROVEEDOR>_TPM
+RATE_LIMITS = {
+    provider: (
+        float(os.getenv(f"RATE_LIMIT_{provider.upper()}_RPM", str(rpm))),
+        float(os.getenv(f"RATE_LIMIT_{provider.upper()}_TPM", str(tpm))),
+    )
+    for provider, (rpm, tpm) in _DEFAULT_LIMITS.items()
+}
+# Ráfaga permitida, en segundos de cuota acumulada
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))
+# Reintentos automáticos de una petición que recibe 429
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+# Espera si un 429 no trae Retry-After, y máximo que se respeta de un Retry-After
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF", "5"))
+RATE_LIMIT_MAX_BACKOFF = float(os.getenv("RATE_LIMIT_MAX_BACKOFF", "120"))
+
+
+class RateLimitError(ValueError):
+    """El proveedor rechazó la petición por límite de ritmo (HTTP 429)"""
+
+
+class TokenBucket:
+    """Bucket que se rellena a per_minute/60 unidades por segundo"""
+
+    def __init__(self, per_minute, burst_seconds=RATE_LIMIT_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, amount, now):
+        """Descuenta amount y devuelve los segundos a esperar para poder usarlo"""
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        # Una petición más grande que la ráfaga entera pasa cuando el bucket está lleno
+        self._tokens -= min(amount, self.capacity)
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+
+class ProviderLimiter:
+    """Limitador de un proveedor: peticiones/min, tokens/min y bloqueo por 429"""
+
+    def __init__(self, provider, rpm=0, tpm=0):
+        self.provider = provider
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=0):
+        """Reserva una petición (y sus tokens); devuelve los segundos que hay que esperar"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            if wait > 0:
+                self.waits += 1
+                self.waited_seconds += wait
+            return wait
+
+    async def aacquire(self, tokens=0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after):
+        """Bloquea el proveedor tras un 429 durante retry_after segundos"""
+        with self._lock:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        log.warning("🚦 %s: límite de ritmo alcanzado, pausa de %.1fs", self.provider, retry_after)
+
+    def stats(self):
+        return {
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3),
+            "throttled": self.throttled,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 3),
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """Limitador compartido del proveedor (proveedores desconocidos no tienen límite)"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            rpm, tpm = RATE_LIMITS.get(provider, (0, 0))
+            limiter = ProviderLimiter(provider, rpm, tpm)
+            _limiters[provider] = limiter
+        return limiter
+
+
+def retry_after_seconds(headers):
+    """Segundos indicados en Retry-After (número o fecha HTTP), acotados"""
+    value = headers.get("Retry-After") if headers is not None else None
+    seconds = None
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                seconds = None
+    if seconds is None or seconds < 0:
+        seconds = RATE_LIMIT_DEFAULT_BACKOFF
+    return min(seconds, RATE_LIMIT_MAX_BACKOFF)
+
+
+def stats():
+    """Esperas y 429 por proveedor"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.provider: limiter.stats() for limiter in limiters}
@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import make_key
+
+# Registro de documentos ya guardados en Readwise (debe sobrevivir a reinicios, como la cola)
+READWISE_LEDGER_PATH = os.getenv("READWISE_LEDGER_PATH", os.path.join(".data", "readwise.sqlite3"))
+# Días que se recuerda un guardado; los reintentos (cola y checkpoint) ocurren mucho antes
+READWISE_LEDGER_RETENTION_DAYS = float(os.getenv("READWISE_LEDGER_RETENTION_DAYS", "90"))
+# Cada cuánto (segundos) se borran los guardados viejos al registrar uno nuevo
+_PRUNE_INTERVAL = 3600
+
+
+def document_key(html_content, title, url):
+    """Clave de idempotencia de un documento: mismo contenido, título y URL = mismo guardado"""
+    return make_key(url, title, html_content)
+
+
+class ReadwiseLedger:
+    """Documentos guardados en Readwise, para que un reintento no cree duplicados"""
+
+    def __init__(self, path=READWISE_LEDGER_PATH, retention_days=READWISE_LEDGER_RETENTION_DAYS):
+        self.path = path
+        self.retention = retention_days * 86400
+        self._last_prune = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """Abre la conexión (perezosamente) y crea la tabla si no existe"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS readwise_saves (
+                    key TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    saved_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """Respuesta de Readwise del guardado anterior con esta clave, o None"""
+        with self._lock:
+            row = self._connect().execute("SELECT response FROM readwise_saves WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record(self, key, title, url, response):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO readwise_saves (key, title, url, response, saved_at) VALUES (?, ?, ?, ?, ?)",
+                (key, title, url, json.dumps(response), now),
+            )
+            if self._last_prune is None or now - self._last_prune >= _PRUNE_INTERVAL:
+                self._last_prune = now
+                conn.execute("DELETE FROM readwise_saves WHERE saved_at < ?", (now - self.retention,))
+            conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM readwise_saves").fetchone()[0]
+
+
+readwise_ledger = ReadwiseLedger()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from apify_dataset import JsonArrayParser, aiter_transcript_records
+
+ITEMS = [
+    {"videoId": "aaaaaaaaaaa", "text": 'dice "hola" y cierra ] con \\"comillas\\"'},
+    {"videoId": "bbbbbbbbbbb", "captions": [{"text": "[corchetes] {llaves}"}, "a,b"]},
+    {"videoId": "ccccccccccc", "text": "acentos: canción ñandú", "views": 1234},
+]
+PAYLOAD = json.dumps(ITEMS, ensure_ascii=False)
+
+
+def parse_in_chunks(text, size):
+    parser = JsonArrayParser()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    items.extend(parser.close())
+    return items
+
+
+def test_every_split_point_yields_the_same_items():
+    for cut in range(1, len(PAYLOAD)):
+        parser = JsonArrayParser()
+        items = parser.feed(PAYLOAD[:cut]) + parser.feed(PAYLOAD[cut:]) + parser.close()
+        assert items == ITEMS, f"corte en {cut}"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_small_chunks(size):
+    assert parse_in_chunks(PAYLOAD, size) == ITEMS
+
+
+def test_number_at_chunk_end_waits_for_more_digits():
+    parser = JsonArrayParser()
+    assert parser.feed("[12") == []
+    assert parser.feed("34, 5") == [1234]
+    assert parser.feed("6]") == [56]
+    assert parser.close() == []
+
+
+def test_items_are_returned_as_soon_as_complete():
+    parser = JsonArrayParser()
+    assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(': 2}]') == [{"b": 2}]
+    assert parser.close() == []
+
+
+def test_root_object_is_returned_on_close():
+    parser = JsonArrayParser()
+    assert parser.feed('{"error": "sin ') == []
+    assert parser.feed('crédito"}') == []
+    assert not parser.is_array
+    assert parser.close() == [{"error": "sin crédito"}]
+
+
+def test_truncated_array_raises():
+    parser = JsonArrayParser()
+    parser.feed('[{"a": 1}, {"b": ')
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def collect_records(chunks):
+    async def byte_chunks():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [record async for record in aiter_transcript_records(byte_chunks())]
+
+    return asyncio.run(collect())
+
+
+def test_records_from_bytes_split_inside_multibyte_characters():
+    data = PAYLOAD.encode("utf-8")
+    records = collect_records([data[i:i + 3] for i in range(0, len(data), 3)])
+    assert [record["video_id"] for record in records] == ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"]
+    assert records[1]["text"] == "[corchetes] {llaves}\na,b"
+    assert records[2]["text"] == "acentos: canción ñandú"
+
+
+def test_root_error_raises():
+    with pytest.raises(ValueError, match="Apify error"):
+        collect_records([b'{"error": "sin cr', b'\xc3\xa9dito"}'])
@@ -0,0 +1,69 @@
+import pytest
+
+import cache
+from cache import SqliteCache, make_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_make_key_separates_parts():
+    assert make_key("ab", "c") != make_key("a", "bc")
+    assert make_key("a", None) == make_key("a", "")
+    assert make_key("x", "y") == make_key("x", "y")
+
+
+def test_values_persist_across_instances(db_path, clock):
+    SqliteCache("t", path=db_path).set("k", "valor")
+    reopened = SqliteCache("t", path=db_path)
+    assert reopened.get("k") == "valor"
+    assert reopened.get("otra") is None
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 1
+
+
+def test_entries_expire_by_age(db_path, clock):
+    store = SqliteCache("t", path=db_path, max_age=100)
+    store.set("k", "valor")
+    clock.now += 100
+    assert store.get("k") == "valor"
+    clock.now += 1
+    assert store.get("k") is None
+    assert store.stats()["evictions"] == 1 and store.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(db_path, clock):
+    store = SqliteCache("t", path=db_path, max_bytes=30)
+    for key in ("a", "b", "c"):
+        store.set(key, "x" * 10)
+        clock.now += 1
+    # Leer "a" la hace la más reciente: al pasarse del límite sale "b"
+    assert store.get("a")
+    clock.now += 1
+    store.set("d", "x" * 10)
+    assert store.get("b") is None
+    assert [store.get(key) is not None for key in ("a", "c", "d")] == [True, True, True]
+    assert store.stats()["bytes"] == 30
+
+
+def test_disabled_cache_stores_nothing(db_path):
+    store = SqliteCache("t", path=db_path, enabled=False)
+    store.set("k", "valor")
+    assert store.get("k") is None
+    assert store.stats()["entries"] == 0
@@ -0,0 +1,36 @@
+from chunking import estimate_tokens, split_transcript
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abc") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_short_transcript_is_a_single_chunk():
+    assert split_transcript("hola\nqué tal\n\n", 100) == ["hola\nqué tal"]
+
+
+def test_chunks_break_at_caption_boundaries_within_the_budget():
+    captions = [f"caption número {i:02d}" for i in range(20)]  # 17 caracteres: 5 tokens + 1
+    chunks = split_transcript("\n".join(captions), 20)
+    assert all(estimate_tokens(chunk) <= 20 for chunk in chunks)
+    assert [len(chunk.splitlines()) for chunk in chunks] == [3] * 6 + [2]
+    # Ningún caption se parte ni se pierde
+    assert "\n".join(chunks).splitlines() == captions
+
+
+def test_oversized_caption_is_split_by_sentences():
+    caption = "Primera frase bastante larga aquí. Segunda frase también larga! ¿Tercera pregunta final?"
+    chunks = split_transcript(caption, 12)
+    assert "Primera frase bastante larga aquí." in chunks[0]
+    assert all(estimate_tokens(chunk) <= 12 for chunk in chunks)
+    assert " ".join(chunk.replace("\n", " ") for chunk in chunks).split() == caption.split()
+
+
+def test_sentence_without_punctuation_is_split_by_words():
+    caption = " ".join(f"palabra{i}" for i in range(30))
+    chunks = split_transcript(caption, 10)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 10 for chunk in chunks)
+    assert " ".join(chunks).replace("\n", " ").split() == caption.split()
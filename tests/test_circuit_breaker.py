@@ -0,0 +1,80 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("llm", failure_threshold=3, cooldown=60)
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_lets_a_single_probe_through(breaker, clock):
+    trip(breaker)
+    clock.now += 60
+    assert breaker.stats()["state"] == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_for_a_full_cooldown(breaker, clock):
+    trip(breaker)
+    clock.now += 60
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    clock.now += 59
+    assert not breaker.available()
+    clock.now += 1
+    assert breaker.available()
+
+
+def test_probe_that_never_reports_does_not_block_forever(breaker, clock):
+    trip(breaker)
+    clock.now += 60
+    breaker.before_call()
+    assert not breaker.available()
+    clock.now += 60
+    assert breaker.available()
+    breaker.before_call()
@@ -0,0 +1,44 @@
+from compaction import compact_transcript, compact_with_stats
+
+
+def test_overlapping_captions_are_merged():
+    text = "hoy vamos a hablar\nvamos a hablar de bases de datos\nde bases de datos relacionales"
+    assert compact_transcript(text) == "hoy vamos a hablar\nde bases de datos\nrelacionales"
+
+
+def test_caption_fully_contained_in_the_previous_one_is_dropped():
+    assert compact_transcript("esto es una prueba\nuna prueba") == "esto es una prueba"
+
+
+def test_single_repeated_word_is_not_treated_as_overlap():
+    # Un caption de una palabra que coincide con la última no es un solape: "no" / "no"
+    assert compact_transcript("te dije que no\nno") == "te dije que no\nno"
+    assert compact_transcript("primero esto y\ny luego aquello") == "primero esto y\ny luego aquello"
+
+
+def test_known_noise_markers_are_removed():
+    text = "[Music]\n[Música] hola a todos (risas)\n♪ suena ♪ bienvenidos [ __ ] al canal [Aplausos]"
+    assert compact_transcript(text) == "hola a todos\nsuena bienvenidos al canal"
+
+
+def test_other_bracketed_text_is_kept():
+    text = "como dice el artículo [1] esto es así [sic]\nveremos la [Parte 2]"
+    assert compact_transcript(text) == text
+
+
+def test_timestamps_and_srt_numbers_are_removed_but_times_in_sentences_kept():
+    text = "1\n00:00:01,000 --> 00:00:03,500\nquedamos a las 10:30\n2\n0:04 en la estación"
+    assert compact_transcript(text) == "quedamos a las 10:30\nen la estación"
+
+
+def test_filler_words_and_repeats_are_removed():
+    assert compact_transcript("eh, que que que bueno, um, lo que lo que digo") == "que bueno, lo que digo"
+    assert compact_transcript("eh que", strip_filler=False) == "eh que"
+
+
+def test_compact_with_stats_reports_tokens_and_can_be_disabled():
+    text = "[Music]\nhola hola hola mundo"
+    compacted, before, after = compact_with_stats(text)
+    assert compacted == "hola mundo"
+    assert after < before
+    assert compact_with_stats(text, enabled=False) == (text, before, before)
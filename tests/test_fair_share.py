@@ -0,0 +1,97 @@
+import asyncio
+
+from fair_share import FairSemaphore, tenant_context
+
+
+async def acquire_as(semaphore, tenant):
+    with tenant_context(tenant):
+        await semaphore.acquire()
+
+
+def release_as(semaphore, tenant):
+    with tenant_context(tenant):
+        semaphore.release()
+
+
+def start(tenant, coroutine):
+    """Tarea que hereda el inquilino, como las de un trabajo"""
+    with tenant_context(tenant):
+        return asyncio.ensure_future(coroutine)
+
+
+def test_waiting_tenants_take_turns():
+    async def scenario():
+        semaphore = FairSemaphore(1)
+        order = []
+
+        async def worker(name):
+            await semaphore.acquire()
+            order.append(name)
+            await asyncio.sleep(0)
+            semaphore.release()
+
+        await acquire_as(semaphore, "x")
+        tasks = [start(name[0], worker(name)) for name in ("a1", "a2", "a3", "b1", "b2")]
+        await asyncio.sleep(0)
+        release_as(semaphore, "x")
+        await asyncio.gather(*tasks)
+        return order, semaphore.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["a1", "b1", "a2", "b2", "a3"]
+    assert stats["in_use"] == {} and stats["waiting"] == {}
+    assert stats["granted"] == {"x": 1, "a": 3, "b": 2}
+
+
+def test_tenant_with_fewer_slots_goes_first():
+    async def scenario():
+        semaphore = FairSemaphore(2)
+        await acquire_as(semaphore, "a")
+        await acquire_as(semaphore, "a")
+        waiting_a = start("a", semaphore.acquire())
+        await asyncio.sleep(0)
+        waiting_b = start("b", semaphore.acquire())
+        await asyncio.sleep(0)
+        release_as(semaphore, "a")
+        await asyncio.sleep(0)
+        return waiting_a.done(), waiting_b.done(), semaphore.stats()
+
+    a_done, b_done, stats = asyncio.run(scenario())
+    assert (a_done, b_done) == (False, True)
+    assert stats["in_use"] == {"a": 1, "b": 1}
+    assert stats["waiting"] == {"a": 1}
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        semaphore = FairSemaphore(1)
+        await acquire_as(semaphore, "a")
+        waiter = start("b", semaphore.acquire())
+        await asyncio.sleep(0)
+        assert semaphore.stats()["waiting"] == {"b": 1}
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release_as(semaphore, "a")
+        return semaphore.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["waiting"] == {} and stats["in_use"] == {}
+    assert stats["granted"] == {"a": 1}
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_returned():
+    async def scenario():
+        semaphore = FairSemaphore(1)
+        await acquire_as(semaphore, "a")
+        waiter = start("b", semaphore.acquire())
+        await asyncio.sleep(0)
+        # El hueco llega y la tarea se cancela antes de poder usarlo
+        release_as(semaphore, "a")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(acquire_as(semaphore, "c"), 1)
+        return waiter.cancelled(), semaphore.stats()
+
+    cancelled, stats = asyncio.run(scenario())
+    assert cancelled
+    assert stats["in_use"] == {"c": 1}
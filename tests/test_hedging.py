@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import hedging
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(hedging, "_latencies", {})
+    monkeypatch.setattr(hedging, "_stats", {"calls": 0, "hedged": 0, "cancelled": 0, "failed": 0, "wins": {}})
+    monkeypatch.setattr(hedging, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(hedging, "LLM_HEDGE_MIN_DELAY", 0.01)
+    monkeypatch.setattr(hedging, "LLM_HEDGE_MIN_SAMPLES", 3)
+
+
+def provider(name, seconds, result=None, error=None, calls=None):
+    async def call():
+        if calls is not None:
+            calls.append(name)
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            if calls is not None:
+                calls.append(f"{name} cancelado")
+            raise
+        if error:
+            raise error
+        return result or name
+
+    return name, call
+
+
+def run(primary, secondary):
+    return asyncio.run(hedging.arun_hedged(primary, secondary))
+
+
+def test_fast_primary_wins_without_hedging():
+    calls = []
+    assert run(provider("a", 0, calls=calls), provider("b", 0, calls=calls)) == ("a", "a")
+    assert calls == ["a"]
+    assert hedging.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_raced_and_cancelled():
+    calls = []
+    assert run(provider("a", 1, calls=calls), provider("b", 0, calls=calls)) == ("b", "b")
+    assert calls == ["a", "b", "a cancelado"]
+    stats = hedging.stats()
+    assert (stats["hedged"], stats["cancelled"], stats["wins"]) == (1, 1, {"b": 1})
+
+
+def test_cancelled_primary_counts_as_a_slow_sample():
+    run(provider("a", 1), provider("b", 0))
+    [sample] = hedging._latencies["a"]
+    assert sample >= 0.05
+
+
+def test_lost_races_keep_the_hedge_delay_from_shrinking():
+    for _ in range(3):
+        hedging.observe("a", 0.02)
+    delay = hedging.hedge_delay("a")
+    for _ in range(5):
+        run(provider("a", 1), provider("b", 0))
+    samples = list(hedging._latencies["a"])
+    assert len(samples) == 8
+    assert all(sample >= delay for sample in samples[3:])
+
+
+def test_failed_primary_launches_the_backup_at_once():
+    calls = []
+    assert run(provider("a", 0, error=ValueError("caído"), calls=calls), provider("b", 0, calls=calls)) == ("b", "b")
+    assert calls == ["a", "b"]
+
+
+def test_both_failing_raises_with_both_errors():
+    with pytest.raises(ValueError, match="a: uno .* b: dos"):
+        run(provider("a", 0, error=ValueError("uno")), provider("b", 0, error=RuntimeError("dos")))
+    assert hedging.stats()["failed"] == 1
+
+
+def test_delay_is_a_percentile_of_recent_latencies():
+    assert hedging.hedge_delay("a") == 0.05
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        hedging.observe("a", seconds)
+    assert hedging.hedge_delay("a") == 0.5
@@ -0,0 +1,60 @@
+from html_document import build_documents, escape, part_title, part_url, safe_url, video_block
+
+
+def test_escape_quotes_and_tags():
+    assert escape('<b>"x" & \'y\'</b>') == "&lt;b&gt;&quot;x&quot; &amp; &#x27;y&#x27;&lt;/b&gt;"
+    assert escape(None) == ""
+
+
+def test_safe_url_only_allows_http():
+    assert safe_url("javascript:alert(1)") == "#"
+    assert safe_url(None) == "#"
+    assert safe_url(' https://youtu.be/x?a=1&b="2" ') == "https://youtu.be/x?a=1&amp;b=&quot;2&quot;"
+
+
+def test_video_block_escapes_everything_from_outside():
+    block = video_block(0, "<script>alert(1)</script>", 'Título <i>"raro"</i>', "javascript:x", "Canal & Co")
+    assert "<script>" not in block and "<i>" not in block
+    assert "&lt;script&gt;" in block
+    assert "Video 1: Título &lt;i&gt;&quot;raro&quot;&lt;/i&gt;" in block
+    assert 'href="#"' in block
+    assert "Canal &amp; Co" in block
+
+
+def test_summary_html_is_inserted_as_is():
+    [document] = build_documents("<h2>NIVEL 1</h2><ul><li>ok</li></ul>", ["<div>a</div>"])
+    assert "<h2>NIVEL 1</h2><ul><li>ok</li></ul>" in document
+    assert "<h1>Análisis de Videos</h1>" in document
+    assert document.index("NIVEL 1") < document.index("<div>a</div>")
+
+
+def test_documents_are_split_between_video_blocks():
+    blocks = [f"<div>{i}{'x' * 1000}</div>" for i in range(10)]
+    documents = build_documents("<p>resumen</p>", blocks, max_bytes=3000)
+    assert len(documents) > 1
+    assert all(len(document.encode("utf-8")) <= 3000 for document in documents)
+    # Cada bloque aparece entero y una sola vez, en orden
+    joined = "".join(documents)
+    assert [joined.index(block) for block in blocks] == sorted(joined.index(block) for block in blocks)
+    assert sum(document.count("<div>") for document in documents) == 10
+    assert "<p>resumen</p>" in documents[0] and "<p>resumen</p>" not in documents[1]
+    assert f"(parte 2/{len(documents)})" in documents[1]
+
+
+def test_oversized_block_gets_its_own_document():
+    documents = build_documents("", ["<div>chico</div>", "<div>" + "x" * 5000 + "</div>", "<div>otro</div>"],
+                                max_bytes=1000)
+    assert len(documents) == 3
+    assert "x" * 5000 in documents[1]
+
+
+def test_no_limit_gives_a_single_document():
+    assert len(build_documents("", ["x" * 5000] * 5, max_bytes=None)) == 1
+
+
+def test_part_titles_and_urls_are_unique():
+    assert part_title("Resumen", 1, 1) == "Resumen"
+    assert part_title("Resumen", 2, 3) == "Resumen (2/3)"
+    assert part_url("https://a.b/x", 1) == "https://a.b/x"
+    assert part_url("https://a.b/x", 2) == "https://a.b/x?parte=2"
+    assert part_url("https://a.b/x?v=1", 3) == "https://a.b/x?v=1&parte=3"
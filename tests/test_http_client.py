@@ -0,0 +1,31 @@
+import asyncio
+import gc
+
+import http_client
+
+
+def test_clients_and_semaphores_are_per_loop_and_closed_by_aclose_all():
+    async def scenario():
+        client = http_client.get_async_client("https://api.example.com/a")
+        assert http_client.get_async_client("https://api.example.com/b") is client
+        assert http_client._provider_semaphore("youtube") is http_client._provider_semaphore("youtube")
+        assert "youtube" in http_client.concurrency_stats()
+        await http_client.aclose_all()
+        assert http_client.concurrency_stats() == {}
+        return client
+
+    first = asyncio.run(scenario())
+    assert first.is_closed
+    second = asyncio.run(scenario())
+    assert second is not first
+
+
+def test_state_of_a_finished_loop_is_released_without_aclose_all():
+    async def scenario():
+        http_client.get_async_client("https://api.example.com/")
+        http_client._provider_semaphore("youtube")
+
+    before = (len(http_client._async_clients), len(http_client._async_semaphores))
+    asyncio.run(scenario())
+    gc.collect()
+    assert (len(http_client._async_clients), len(http_client._async_semaphores)) == before
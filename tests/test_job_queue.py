@@ -0,0 +1,130 @@
+import pytest
+
+import job_queue
+from job_queue import DONE, FAILED, PENDING, RUNNING, JobQueue, PermanentJobError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(job_queue, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(path=str(tmp_path / "jobs.sqlite3"), max_attempts=3, retry_base_delay=10)
+
+
+def test_claim_marks_running_and_counts_the_attempt(queue):
+    job_id, created = queue.enqueue("telegram", {"video_url": "u", "chat_id": 1})
+    assert created
+    job = queue.claim()
+    assert (job["id"], job["attempts"], job["payload"]) == (job_id, 1, {"video_url": "u", "chat_id": 1})
+    assert queue.get(job_id)["status"] == RUNNING
+    assert queue.claim() is None
+    queue.complete(job_id)
+    assert queue.stats() == {PENDING: 0, RUNNING: 0, DONE: 1, FAILED: 0}
+
+
+def test_failed_job_is_retried_after_the_backoff(queue, clock):
+    job_id, _ = queue.enqueue("playlist", {})
+    queue.claim()
+    assert queue.fail(job_id, ValueError("caído"))
+    job = queue.get(job_id)
+    assert (job["status"], job["last_error"]) == (PENDING, "caído")
+    assert queue.claim() is None
+    assert queue.next_run_in() == pytest.approx(10)
+
+    clock.now += 10
+    assert queue.claim()["attempts"] == 2
+    assert queue.fail(job_id, ValueError("otra vez"))
+    # El backoff se duplica en cada intento
+    clock.now += 19
+    assert queue.claim() is None
+    clock.now += 1
+    assert queue.claim()["attempts"] == 3
+    assert not queue.fail(job_id, ValueError("definitivo"))
+    assert queue.get(job_id)["status"] == FAILED
+
+
+def test_permanent_error_is_not_retried(queue):
+    job_id, _ = queue.enqueue("telegram", {})
+    queue.claim()
+    assert not queue.fail(job_id, PermanentJobError("sin transcript"))
+    assert queue.get(job_id)["status"] == FAILED
+
+
+def test_running_jobs_are_requeued_after_a_restart(queue):
+    job_id, _ = queue.enqueue("playlist", {})
+    queue.claim()
+    # Un proceso nuevo sobre la misma base recupera el trabajo que quedó a medias
+    restarted = JobQueue(path=queue.path, max_attempts=3, retry_base_delay=10)
+    assert restarted.requeue_running() == (1, 0)
+    job = restarted.claim()
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+
+
+def test_running_job_without_attempts_left_fails_instead_of_requeuing(queue, clock):
+    job_id, _ = queue.enqueue("playlist", {}, max_attempts=1)
+    queue.claim()
+    # Si este trabajo es el que tumba el proceso, reencolarlo lo repetiría sin fin
+    restarted = JobQueue(path=queue.path, max_attempts=3, retry_base_delay=10)
+    assert restarted.requeue_running() == (0, 1)
+    assert restarted.get(job_id)["status"] == FAILED
+    assert restarted.claim() is None
+
+
+def test_prune_drops_old_finished_jobs_and_frees_their_dedup_key(tmp_path, clock):
+    queue = JobQueue(path=str(tmp_path / "jobs.sqlite3"), retention_days=1)
+    done, _ = queue.enqueue("telegram", {}, dedup_key="update:1")
+    queue.claim()
+    queue.complete(done)
+    pending, _ = queue.enqueue("telegram", {})
+    clock.now += 86400 - 1
+    assert queue.prune() == 0
+    clock.now += 2
+    assert queue.prune() == 1
+    assert queue.get(done) is None
+    assert queue.get(pending)["status"] == PENDING
+    assert queue.enqueue("telegram", {}, dedup_key="update:1")[1]
+
+
+def test_jobs_with_the_same_concurrency_key_never_run_together(queue):
+    first, _ = queue.enqueue("playlist", {"n": 1}, concurrency_key="playlist:A")
+    other, _ = queue.enqueue("playlist", {}, concurrency_key="playlist:B")
+    assert queue.claim()["id"] == first
+    # Mientras el primero corre, otro encolado con la clave queda pendiente
+    second, created = queue.enqueue("playlist", {"n": 2}, concurrency_key="playlist:A")
+    assert created
+    assert queue.claim()["id"] == other
+    assert queue.claim() is None
+    # ... y absorbe los siguientes en lugar de duplicarse
+    assert queue.enqueue("playlist", {"n": 3}, concurrency_key="playlist:A") == (second, False)
+    queue.complete(first)
+    assert queue.claim()["id"] == second
+
+
+def test_dedup_key_returns_the_existing_job(queue):
+    job_id, _ = queue.enqueue("telegram", {}, dedup_key="telegram:update:1")
+    queue.claim()
+    queue.complete(job_id)
+    assert queue.enqueue("telegram", {}, dedup_key="telegram:update:1") == (job_id, False)
+
+
+def test_claim_can_be_limited_to_some_kinds(queue, clock):
+    playlist, _ = queue.enqueue("playlist", {})
+    telegram, _ = queue.enqueue("telegram", {})
+    assert queue.claim(("telegram",))["id"] == telegram
+    assert queue.claim(("telegram",)) is None
+    assert queue.next_run_in(("telegram",)) is None
+    assert queue.next_run_in() == 0
+    assert queue.claim()["id"] == playlist
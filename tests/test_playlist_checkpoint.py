@@ -0,0 +1,83 @@
+import pytest
+
+import playlist_checkpoint as checkpoint_module
+from playlist_checkpoint import DELETED, SAVED, SUMMARIZED, TRANSCRIBED, PlaylistCheckpoint, reached
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(checkpoint_module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def checkpoint(tmp_path, clock):
+    return PlaylistCheckpoint(path=str(tmp_path / "progress.sqlite3"), ttl_days=1, max_attempts=3)
+
+
+def video(item_id, **fields):
+    return dict({"item_id": item_id, "video_id": f"v-{item_id}"}, **fields)
+
+
+def test_reached_follows_the_stage_order():
+    assert reached(SAVED, SUMMARIZED)
+    assert reached(SUMMARIZED, SUMMARIZED)
+    assert not reached(TRANSCRIBED, SUMMARIZED)
+    assert not reached(None, TRANSCRIBED)
+
+
+def test_summary_is_kept_until_the_video_is_saved(checkpoint):
+    checkpoint.mark("PL", [video("a", summary="resumen", html_block="<p>a</p>")], SUMMARIZED)
+    assert checkpoint.load("PL")["a"] == {
+        "stage": SUMMARIZED, "summary": "resumen", "html_block": "<p>a</p>", "failures": 0, "error": None,
+    }
+    checkpoint.mark("PL", [video("a", summary="resumen", html_block="<p>a</p>")], SAVED)
+    progress = checkpoint.load("PL")["a"]
+    assert (progress["stage"], progress["summary"], progress["html_block"]) == (SAVED, None, None)
+
+
+def test_progress_is_per_playlist_and_survives_a_restart(checkpoint):
+    checkpoint.mark("PL", [video("a"), video("b")], DELETED)
+    reopened = PlaylistCheckpoint(path=checkpoint.path, ttl_days=1)
+    assert set(reopened.load("PL")) == {"a", "b"}
+    assert reopened.load("OTRA") == {}
+    assert reopened.count("PL") == {DELETED: 2}
+
+
+def test_stale_progress_is_forgotten(checkpoint, clock):
+    checkpoint.mark("PL", [video("a")], TRANSCRIBED)
+    checkpoint.fail("PL", [video("b", error="LLM caído")])
+    clock.now += 86400 + 1
+    assert checkpoint.load("PL") == {}
+
+
+def test_failures_accumulate_until_the_video_is_exhausted(checkpoint):
+    for attempt in range(1, 4):
+        checkpoint.fail("PL", [video("a", error=f"fallo {attempt}")])
+        progress = checkpoint.load("PL")["a"]
+        assert (progress["failures"], progress["error"]) == (attempt, f"fallo {attempt}")
+        assert checkpoint.exhausted(progress) == (attempt == 3)
+    assert checkpoint.count("PL") == {"failed": 1}
+
+
+def test_permanent_failure_exhausts_at_once(checkpoint):
+    checkpoint.fail("PL", [video("a", error="sin transcript", permanent=True)])
+    assert checkpoint.exhausted(checkpoint.load("PL")["a"])
+
+
+def test_progress_clears_the_failure_count(checkpoint):
+    checkpoint.fail("PL", [video("a", error="LLM caído")])
+    checkpoint.mark("PL", [video("a", summary="s", html_block="h")], SUMMARIZED)
+    progress = checkpoint.load("PL")["a"]
+    assert (progress["stage"], progress["failures"]) == (SUMMARIZED, 0)
+    assert not checkpoint.exhausted(progress)
+    assert not checkpoint.exhausted(None)
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import rate_limit
+from rate_limit import ProviderLimiter, TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", fake)
+    return fake
+
+
+def test_bucket_allows_a_burst_then_waits():
+    bucket = TokenBucket(60, burst_seconds=2)  # 1 por segundo, ráfaga de 2
+    now = bucket._updated
+    assert bucket.reserve(1, now) == 0.0
+    assert bucket.reserve(1, now) == 0.0
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+    assert bucket.reserve(1, now) == pytest.approx(2.0)
+
+
+def test_bucket_refills_with_time_up_to_capacity():
+    bucket = TokenBucket(60, burst_seconds=2)
+    now = bucket._updated
+    bucket.reserve(2, now)
+    assert bucket.reserve(1, now + 1) == 0.0
+    # Mucho tiempo después solo caben capacity unidades seguidas
+    assert bucket.reserve(2, now + 100) == 0.0
+    assert bucket.reserve(1, now + 100) == pytest.approx(1.0)
+
+
+def test_request_larger_than_the_burst_passes_with_a_full_bucket():
+    bucket = TokenBucket(600, burst_seconds=1)  # capacity 10
+    assert bucket.reserve(50, bucket._updated) == 0.0
+
+
+def test_limiter_waits_for_the_slowest_bucket(clock):
+    # Peticiones de sobra (600/min) pero solo 1 token/s, con ráfaga de 10
+    limiter = ProviderLimiter("llm", rpm=600, tpm=60)
+    assert limiter.reserve(tokens=10) == 0.0
+    assert limiter.reserve(tokens=4) == pytest.approx(4.0)
+    clock.now += 4
+    assert limiter.reserve() == 0.0
+    assert limiter.stats()["waits"] == 1
+
+
+def test_penalize_blocks_until_retry_after(clock):
+    limiter = ProviderLimiter("apify")
+    limiter.penalize(5)
+    assert limiter.reserve() == pytest.approx(5.0)
+    clock.now += 3
+    assert limiter.reserve() == pytest.approx(2.0)
+    clock.now += 2
+    assert limiter.reserve() == 0.0
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_retry_after_in_seconds():
+    assert retry_after_seconds({"Retry-After": "7"}) == 7.0
+
+
+def test_retry_after_as_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert retry_after_seconds({"Retry-After": format_datetime(when, usegmt=True)}) == pytest.approx(30, abs=2)
+
+
+def test_retry_after_missing_or_invalid_uses_default():
+    assert retry_after_seconds({}) == rate_limit.RATE_LIMIT_DEFAULT_BACKOFF
+    assert retry_after_seconds({"Retry-After": "pronto"}) == rate_limit.RATE_LIMIT_DEFAULT_BACKOFF
+    assert retry_after_seconds(None) == rate_limit.RATE_LIMIT_DEFAULT_BACKOFF
+
+
+def test_retry_after_is_capped():
+    assert retry_after_seconds({"Retry-After": "100000"}) == rate_limit.RATE_LIMIT_MAX_BACKOFF
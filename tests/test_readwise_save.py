@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+import pytest
+
+import async_workflow
+import workflow
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Sustituye el POST a Readwise por una lista de respuestas y cuenta las llamadas"""
+    queued = []
+    calls = []
+
+    async def apost(url, **kwargs):
+        calls.append(url)
+        return queued.pop(0)
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(async_workflow.http_client, "apost", apost)
+    monkeypatch.setattr(async_workflow.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(workflow, "_already_saved", lambda key, title: None)
+    monkeypatch.setattr(async_workflow.readwise_ledger, "record", lambda *args: None)
+    return queued, calls
+
+
+def save():
+    return asyncio.run(async_workflow.save_to_readwise("<p>resumen</p>", "Título", "https://youtu.be/x"))
+
+
+def test_server_errors_are_retried(responses):
+    queued, calls = responses
+    queued.extend([httpx.Response(503, text="caído"), httpx.Response(201, json={"id": "doc"})])
+    assert save() == {"id": "doc"}
+    assert len(calls) == 2
+
+
+def test_rate_limit_is_left_to_http_client(responses):
+    # http_client ya reintentó el 429 con el Retry-After; repetirlo aquí multiplicaría los POST
+    queued, calls = responses
+    queued.append(httpx.Response(429, text="demasiadas"))
+    with pytest.raises(ValueError, match="429"):
+        save()
+    assert len(calls) == 1
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import async_workflow
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    """Sustituye el envío y la edición de mensajes; devuelve la lista de acciones"""
+    actions = []
+
+    async def send(chat_id, message, parse_mode="HTML"):
+        actions.append(("send", chat_id, message))
+        return chat_id * 100
+
+    async def edit(chat_id, message_id, message):
+        actions.append(("edit", chat_id, message_id, message))
+
+    monkeypatch.setattr(async_workflow, "send_telegram_message", send)
+    monkeypatch.setattr(async_workflow, "edit_telegram_message", edit)
+    return actions
+
+
+def test_chats_that_join_mid_stream_get_the_preview_and_later_edits(telegram):
+    async def scenario():
+        chat_ids = [1]
+        progress = async_workflow._SummaryProgress(chat_ids, interval=0)
+        await progress.start("🤖 Generando")
+        progress.update("<p>Primera idea</p>")
+        await progress._edit_task
+        # Otro chat pide el mismo video mientras se genera el resumen
+        chat_ids.append(2)
+        await progress.finish("<p>Primera idea</p><p>Segunda idea</p>")
+
+    asyncio.run(scenario())
+    assert telegram == [
+        ("send", 1, "🤖 Generando"),
+        ("edit", 1, 100, "Primera idea"),
+        ("send", 2, "Primera idea\nSegunda idea"),
+        ("edit", 1, 100, "Primera idea\nSegunda idea"),
+    ]
+
+
+def test_chat_that_joins_after_the_last_change_still_gets_the_summary(telegram):
+    async def scenario():
+        chat_ids = [1]
+        progress = async_workflow._SummaryProgress(chat_ids, interval=0)
+        await progress.start("🤖 Generando")
+        progress.update("<p>Resumen</p>")
+        await progress._edit_task
+        chat_ids.extend([2, 2])
+        await progress.finish("<p>Resumen</p>")
+
+    asyncio.run(scenario())
+    assert telegram[-1] == ("send", 2, "Resumen")
+    assert [action for action in telegram if action[1] == 2] == [("send", 2, "Resumen")]
@@ -0,0 +1,72 @@
+import pytest
+
+import workflow
+
+
+class FakeTranscriptCache:
+    def __init__(self):
+        self.stored = {}
+
+    def set(self, video_id, text):
+        self.stored[video_id] = text
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    fake = FakeTranscriptCache()
+    monkeypatch.setattr(workflow, "transcript_cache", fake)
+    return fake
+
+
+def record(video_id, text):
+    return {"video_id": video_id, "url": None, "text": text}
+
+
+def assign(records, missing_ids):
+    assignment = workflow._TranscriptAssignment(missing_ids)
+    for item in records:
+        assignment.add(item)
+    return assignment.finish()
+
+
+def test_assigns_records_by_video_id(cache):
+    fetched = assign([record("B", "texto B"), record("A", "texto A")], ["A", "B"])
+    assert fetched == {"A": "texto A", "B": "texto B"}
+    assert cache.stored == fetched
+
+
+def test_duplicate_record_is_not_given_to_another_video(cache):
+    fetched = assign([record("A", "A"), record("A", "A dup")], ["A", "B"])
+    assert fetched == {"A": "A"}
+    assert "B" not in cache.stored
+
+
+def test_unexpected_video_id_is_dropped(cache):
+    fetched = assign([record("ZZZ", "otro video")], ["CCC"])
+    assert fetched == {}
+    assert cache.stored == {}
+
+
+def test_records_without_id_fill_missing_videos_in_order(cache):
+    fetched = assign(
+        [record("B", "texto B"), record(None, "primero"), record(None, "segundo")],
+        ["A", "B", "C"],
+    )
+    assert fetched == {"A": "primero", "B": "texto B", "C": "segundo"}
+
+
+def test_records_without_id_that_do_not_match_the_pending_videos_are_dropped(cache):
+    # Apify omitió un video: no se sabe a cuál de los dos pertenece el único registro sin ID
+    fetched = assign([record("B", "texto B"), record(None, "¿A o C?")], ["A", "B", "C"])
+    assert fetched == {"B": "texto B"}
+    assert cache.stored == {"B": "texto B"}
+    # Y tampoco si sobran
+    assert assign([record(None, "uno"), record(None, "dos")], ["A"]) == {}
+
+
+def test_records_with_id_are_cached_as_they_arrive(cache):
+    assignment = workflow._TranscriptAssignment(["A", "B"])
+    assignment.add(record("A", "texto A"))
+    assert cache.stored == {"A": "texto A"}
+    assignment.add(record(None, "sin id"))
+    assert assignment.finish() == {"A": "texto A", "B": "sin id"}
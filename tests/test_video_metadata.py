@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+import async_workflow
+from job_queue import PermanentJobError
+from video_metadata import canonical_video_url, parse_video_id
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("text", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtube.com/watch?feature=share&v={VIDEO_ID}&t=42",
+    f"http://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}&list=PL123",
+    f"https://youtu.be/{VIDEO_ID}?si=abc",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}?feature=share",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"youtube.com/watch?v={VIDEO_ID}",
+    f"Mira esto: https://youtu.be/{VIDEO_ID} está genial",
+])
+def test_parse_video_id_accepts_youtube_urls(text):
+    assert parse_video_id(text) == VIDEO_ID
+
+
+@pytest.mark.parametrize("text", [
+    f"https://evilyoutube.com/watch?v={VIDEO_ID}",
+    f"https://www.notyoutu.be/{VIDEO_ID}",
+    f"https://youtube.com@evil.com/watch?v={VIDEO_ID}",
+    f"https://example.com/watch?v={VIDEO_ID}",
+    "https://www.youtube.com/watch?v=corto",
+    "https://www.youtube.com/channel/UC1234567890",
+    "",
+    None,
+])
+def test_parse_video_id_rejects_other_urls(text):
+    with pytest.raises(ValueError):
+        parse_video_id(text)
+
+
+def test_canonical_video_url_round_trips():
+    assert parse_video_id(canonical_video_url(VIDEO_ID)) == VIDEO_ID
+
+
+@pytest.mark.parametrize("status, error", [(400, PermanentJobError), (403, PermanentJobError), (503, ValueError)])
+def test_fetch_videos_info_raises_on_error_status(monkeypatch, status, error):
+    async def aget(url, **kwargs):
+        return httpx.Response(status, json={"error": {"message": "keyInvalid"}})
+
+    monkeypatch.setattr(async_workflow.http_client, "aget", aget)
+    with pytest.raises(error, match="keyInvalid") as raised:
+        asyncio.run(async_workflow._fetch_videos_info([VIDEO_ID]))
+    assert isinstance(raised.value, PermanentJobError) == (error is PermanentJobError)
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+# Máximo de IDs que acepta el endpoint videos de la YouTube Data API por petición
+MAX_IDS_PER_REQUEST = 50
+# Ventana en la que se juntan las peticiones concurrentes antes de llamar a la API
+VIDEO_METADATA_BATCH_WINDOW = float(os.getenv("VIDEO_METADATA_BATCH_WINDOW", "0.05"))
+VIDEO_METADATA_CACHE_SIZE = int(os.getenv("VIDEO_METADATA_CACHE_SIZE", "1000"))
+VIDEO_METADATA_TTL = float(os.getenv("VIDEO_METADATA_TTL", str(24 * 3600)))
+
+_VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# El dominio no puede ir pegado a otro nombre: "evilyoutube.com" no es YouTube
+_URL_IN_TEXT = re.compile(
+    r"(?:https?://)?(?<![\w.-])(?:[\w-]+\.)*(?:youtube\.com|youtube-nocookie\.com|youtu\.be)/\S+", re.IGNORECASE
+)
+# Rutas de youtube.com en las que el ID va como segmento: /shorts/ID, /embed/ID, /live/ID, /v/ID
+_PATH_PREFIXES = ("shorts", "embed", "live", "v", "e")
+
+
+def parse_video_id(text):
+    """Extrae el video ID de cualquier forma de URL de YouTube (o de un texto que la contenga)
+
+    Soporta watch?v=, youtu.be/, shorts/, embed/, live/, m.youtube.com, music.youtube.com
+    y youtube-nocookie.com.
+    """
+    match = _URL_IN_TEXT.search(text or "")
+    if not match:
+        raise ValueError("URL de YouTube no válida")
+    url = match.group(0)
+    if not re.match(r"^https?://", url, re.IGNORECASE):
+        url = "https://" + url
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    segments = [segment for segment in parts.path.split("/") if segment]
+
+    candidate = None
+    if host == "youtu.be":
+        candidate = segments[0] if segments else None
+    else:
+        query = parse_qs(parts.query)
+        if "v" in query:
+            candidate = query["v"][0]
+        elif len(segments) >= 2 and segments[0] in _PATH_PREFIXES:
+            candidate = segments[1]
+
+    if candidate and _VIDEO_ID.match(candidate):
+        return candidate
+    raise ValueError("URL de YouTube no válida")
+
+
+def canonical_video_url(video_id):
+    """URL estándar de un video (la que se manda a Apify y se guarda en Readwise)"""
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class TTLCache:
+    """Caché LRU en memoria con caducidad por entrada"""
+
+    def __init__(self, max_entries=VIDEO_METADATA_CACHE_SIZE, ttl=VIDEO_METADATA_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._data)}
+
+
+metadata_cache = TTLCache()
+
+
+class MetadataBatcher:
+    """Agrupa las peticiones de metadatos concurrentes en llamadas de hasta 50 IDs
+
+    fetch_batch(video_ids) es una corrutina que devuelve {video_id: info}; los IDs que
+    no aparezcan en el resultado fallan con ValueError.
+    """
+
+    def __init__(self, fetch_batch, cache=metadata_cache, window=VIDEO_METADATA_BATCH_WINDOW):
+        self.fetch_batch = fetch_batch
+        self.cache = cache
+        self.window = window
+        self.batches = 0
+        self._pending = {}
+        self._flush_handle = None
+
+    async def get(self, video_id):
+        """Devuelve la info del video, desde la caché o en el próximo lote"""
+        cached = self.cache.get(video_id)
+        if cached is not None:
+            return cached
+
+        future = self._pending.get(video_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[video_id] = future
+            if len(self._pending) >= MAX_IDS_PER_REQUEST:
+                self._flush_now()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        return await asyncio.shield(future)
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            asyncio.get_running_loop().create_task(self._flush(pending))
+
+    async def _flush(self, pending):
+        self.batches += 1
+        try:
+            infos = await self.fetch_batch(list(pending))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for video_id, future in pending.items():
+            if future.done():
+                continue
+            info = infos.get(video_id)
+            if info is None:
+                future.set_exception(ValueError("No se pudo obtener información del video"))
+            else:
+                self.cache.set(video_id, info)
+                future.set_result(info)
@@ -1,8 +1,23 @@
-import requests
+import asyncio
+import html
 import json
 import os
+import re
 import time
-from datetime import datetime
+
+import hedging
+import html_document
+import http_client
+import metrics
+from cache import make_key, summary_cache, transcript_cache
+from circuit_breaker import CircuitOpenError, is_available
+from compaction import compact_with_stats
+from html_document import READWISE_MAX_DOCUMENT_BYTES
+from rate_limit import RateLimitError
+from readwise_ledger import readwise_ledger
+from logs import get_logger
+
+log = get_logger("workflow")
 
 # Obtener credenciales de variables de entorno
 YT_API_KEY = os.getenv("YT_API_KEY")
@@ -18,163 +33,137 @@ PUSHOVER_TOKEN = os.getenv("PUSHOVER_TOKEN")
 PUSHOVER_USER = os.getenv("PUSHOVER_USER")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-def send_notification(message):
-    """Envía notificación a tu teléfono"""
-    if PUSHOVER_TOKEN and PUSHOVER_USER:
-        try:
-            requests.post("https://api.pushover.net/1/messages.json", json={
-                "token": PUSHOVER_TOKEN,
-                "user": PUSHOVER_USER,
-                "message": message
-            })
-        except:
-            pass
+# Playlist de YouTube que se procesa por defecto
+PLAYLIST_ID = os.getenv("PLAYLIST_ID", "PL_0E-MP0df5mxMX0NrZxSCufMcK6e9z3b")
 
-def send_telegram_message(chat_id, message):
-    """Envía mensaje a Telegram"""
-    if TELEGRAM_BOT_TOKEN:
-        try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-            requests.post(url, json={
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "HTML"
-            })
-        except Exception as e:
-            print(f"Error enviando mensaje a Telegram: {e}")
-
-def get_video_info(video_url):
-    """Obtiene información de un video de YouTube individual"""
-    # Extraer video ID de la URL
-    if "v=" in video_url:
-        video_id = video_url.split("v=")[1].split("&")[0]
-    elif "youtu.be/" in video_url:
-        video_id = video_url.split("youtu.be/")[1].split("?")[0]
-    else:
-        raise ValueError("URL de YouTube no válida")
-    
-    # Obtener información del video
-    url = "https://www.googleapis.com/youtube/v3/videos"
-    params = {
+
+def _parse_playlists(value):
+    """'nombre=PLAYLIST_ID,otro=...' -> {nombre: playlist_id} (vacío = solo PLAYLIST_ID)"""
+    playlists = {}
+    for entry in value.split(","):
+        name, _, playlist_id = entry.strip().partition("=")
+        if name and playlist_id:
+            playlists[name.strip()] = playlist_id.strip()
+    return playlists or {"default": PLAYLIST_ID}
+
+
+# Playlists que procesa /webhook, por nombre (una por usuario, por ejemplo)
+PLAYLISTS = _parse_playlists(os.getenv("PLAYLISTS", ""))
+
+# Número de videos que se resumen en paralelo
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+# Videos por lote enviado a Apify y tamaño de las colas entre etapas del pipeline
+APIFY_BATCH_SIZE = int(os.getenv("APIFY_BATCH_SIZE", "5"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "20"))
+# Cada cuántos segundos se informa del estado de las colas (0 = solo al final)
+PIPELINE_REPORT_INTERVAL = float(os.getenv("PIPELINE_REPORT_INTERVAL", "15"))
+
+# Modelos usados por cada proveedor (forman parte de la clave de la caché de resúmenes)
+OPENROUTER_MODEL = "google/gemini-2.0-flash-001"
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Transcripts por encima de este tamaño se resumen por partes (map-reduce)
+SUMMARY_CHUNK_THRESHOLD_TOKENS = int(os.getenv("SUMMARY_CHUNK_THRESHOLD_TOKENS", "30000"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "12000"))
+
+# Timeout de lectura de las llamadas al LLM (segundos)
+LLM_TIMEOUT = 120
+# Respuestas del LLM por streaming (SSE) cuando alguien las está mirando (Telegram)
+LLM_STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "true").lower() not in ("0", "false", "no")
+# Mínimo de segundos entre ediciones del mensaje de Telegram con el resumen parcial
+TELEGRAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "1.5"))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+
+def _pushover_payload(message):
+    """Payload de una notificación de Pushover"""
+    return {
+        "token": PUSHOVER_TOKEN,
+        "user": PUSHOVER_USER,
+        "message": message
+    }
+
+def _telegram_url(method):
+    """URL de un método de la Bot API de Telegram"""
+    return f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/{method}"
+
+def _telegram_message_payload(chat_id, message, parse_mode="HTML"):
+    """Payload de sendMessage de Telegram (parse_mode=None para texto plano)"""
+    payload = {
+        "chat_id": chat_id,
+        "text": message
+    }
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    return payload
+
+def _telegram_edit_payload(chat_id, message_id, message):
+    """Payload de editMessageText (texto plano: el HTML a medio generar no siempre es válido)"""
+    return {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": message
+    }
+
+def _summary_preview(summary_html):
+    """Texto plano del NIVEL 1 de un resumen (completo o a medio generar) para Telegram"""
+    level2 = re.search(r"<h2[^>]*>\s*NIVEL 2", summary_html, re.IGNORECASE)
+    section = summary_html[:level2.start()] if level2 else summary_html
+    # Quitar una etiqueta cortada al final del stream
+    section = re.sub(r"<[^>]*$", "", section)
+    section = re.sub(r"<li[^>]*>", "• ", section, flags=re.IGNORECASE)
+    section = re.sub(r"<br\s*/?>|</(?:li|p|h\d|ul|ol|div)>", "\n", section, flags=re.IGNORECASE)
+    section = html.unescape(re.sub(r"<[^>]+>", "", section))
+    lines = [line.strip() for line in section.splitlines()]
+    preview = "\n".join(line for line in lines if line)
+    if len(preview) > TELEGRAM_MESSAGE_LIMIT:
+        preview = preview[:TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+    return preview
+
+YT_VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+YT_PLAYLIST_ITEMS_URL = "https://www.googleapis.com/youtube/v3/playlistItems"
+YT_OAUTH_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+# El access token se refresca este número de segundos antes de que caduque
+YT_TOKEN_REFRESH_MARGIN = 300
+# Borrados simultáneos de items de la playlist y reintentos ante 5xx
+YT_DELETE_WORKERS = int(os.getenv("YT_DELETE_WORKERS", "8"))
+YT_DELETE_MAX_RETRIES = 3
+
+def _video_info_params(video_ids):
+    """Parámetros de la llamada a videos de la YouTube Data API (hasta 50 IDs)"""
+    return {
         "part": "snippet",
-        "id": video_id,
+        "id": ",".join(video_ids),
         "key": YT_API_KEY
     }
-    response = requests.get(url, params=params)
-    data = response.json()
-    
-    if data.get('items'):
-        return {
-            'video_id': video_id,
-            'title': data['items'][0]['snippet']['title'],
-            'channel': data['items'][0]['snippet']['channelTitle']
+
+def _parse_videos_response(data):
+    """Extrae título y canal de cada video de la respuesta de videos: {video_id: info}"""
+    infos = {}
+    for item in data.get('items', []):
+        infos[item['id']] = {
+            'video_id': item['id'],
+            'title': item['snippet']['title'],
+            'channel': item['snippet']['channelTitle']
         }
-    else:
-        raise ValueError("No se pudo obtener información del video")
+    return infos
 
-def process_video_from_telegram(video_url, chat_id):
-    """Procesa un video individual enviado desde Telegram"""
-    try:
-        print(f"[{datetime.now()}] 🚀 Iniciando procesamiento desde Telegram...")
-        send_telegram_message(chat_id, "🚀 <b>Procesando video...</b>\nExtrayendo información y transcripción")
-        
-        # Obtener información del video
-        video_info = get_video_info(video_url)
-        print(f"📹 Video: {video_info['title']}")
-        
-        # Obtener transcripción
-        print("📝 Obteniendo transcripción...")
-        transcripts_data = get_transcripts([video_url])
-        print(f"Respuesta Apify: {json.dumps(transcripts_data)[:500]}...")  # Log de debug
-        
-        # Extraer transcripciones
-        captions = []
-        
-        # Manejar diferentes formatos de respuesta
-        if isinstance(transcripts_data, list):
-            for item in transcripts_data:
-                print(f"Procesando item tipo: {type(item)}")
-                
-                if isinstance(item, dict):
-                    # Formato con campo 'text' (nuevo formato simplificado)
-                    if 'text' in item and item['text']:
-                        transcript_text = item['text']
-                        print(f"Transcript encontrado (formato text): {len(transcript_text)} caracteres")
-                        captions.append(transcript_text)
-                    # Formato antiguo con 'captions'
-                    elif 'captions' in item and item['captions']:
-                        caption_list = item['captions']
-                        print(f"Captions encontrados: {len(caption_list)} items")
-                        
-                        caption_texts = []
-                        for caption in caption_list:
-                            if isinstance(caption, dict) and 'text' in caption:
-                                caption_texts.append(caption['text'])
-                            elif isinstance(caption, str):
-                                caption_texts.append(caption)
-                            else:
-                                caption_texts.append(str(caption))
-                        
-                        full_transcript = " ".join(caption_texts)
-                        print(f"Transcript extraído: {len(full_transcript)} caracteres")
-                        captions.append(full_transcript)
-                    else:
-                        print(f"Keys disponibles: {item.keys()}")
-                elif isinstance(item, str):
-                    # Si el item es directamente un string
-                    print(f"Transcript como string: {len(item)} caracteres")
-                    captions.append(item)
-        elif isinstance(transcripts_data, dict):
-            print(f"Respuesta es dict con keys: {transcripts_data.keys()}")
-            if 'text' in transcripts_data:
-                captions.append(transcripts_data['text'])
-        
-        if not captions:
-            print(f"Respuesta completa de Apify: {json.dumps(transcripts_data)[:1000]}")
-            raise ValueError("No se pudo obtener la transcripción del video")
-        
-        all_text = " ".join(captions)
-        print(f"Texto total para resumen: {len(all_text)} caracteres")
-        print(f"Texto total para resumen: {len(all_text)} caracteres")
-        
-        # Generar resumen
-        print("🤖 Generando resumen con Gemini...")
-        send_telegram_message(chat_id, "🤖 <b>Generando resumen con IA...</b>")
-        summary = summarize_with_gemini(all_text)
-        print("✅ Resumen generado")
-        
-        # Formatear HTML
-        print("🎨 Formateando HTML...")
-        html_content = format_as_html(summary, captions, [video_info['title']], video_url)
-        
-        # Guardar en Readwise
-        print("💾 Guardando en Readwise...")
-        send_telegram_message(chat_id, "💾 <b>Guardando en Readwise...</b>")
-        result = save_to_readwise(html_content, f"Video - {video_info['title']}", video_url)
-        print(f"✅ Guardado en Readwise: {result}")
-        
-        # Notificar éxito
-        send_telegram_message(chat_id, f"✅ <b>¡Listo!</b>\n\n📹 <b>{video_info['title']}</b>\n👤 {video_info['channel']}\n\nEl resumen ha sido guardado en Readwise.")
-        print(f"[{datetime.now()}] ✅ Proceso completado exitosamente")
-        
-    except Exception as e:
-        error_msg = f"❌ Error: {str(e)}"
-        print(f"[{datetime.now()}] {error_msg}")
-        send_telegram_message(chat_id, error_msg)
-        raise
-
-def get_playlist_videos(playlist_id):
-    """Obtiene videos de playlist de YouTube"""
-    url = "https://www.googleapis.com/youtube/v3/playlistItems"
+def _playlist_params(playlist_id, page_token=None):
+    """Parámetros de la llamada a playlistItems de la YouTube Data API"""
     params = {
         "part": "contentDetails,snippet",
         "playlistId": playlist_id,
         "maxResults": 50,
         "key": YT_API_KEY
     }
-    response = requests.get(url, params=params)
-    data = response.json()
-    
+    if page_token:
+        params["pageToken"] = page_token
+    return params
+
+def _parse_playlist_items(data):
+    """Convierte una respuesta de playlistItems en las listas que usa el workflow"""
     video_urls = []
     titles = []
     video_ids = []
@@ -192,62 +181,69 @@ def get_playlist_videos(playlist_id):
         playlist_item_ids.append(item_id)
     
     return video_urls, titles, video_ids, playlist_item_ids, channel_titles
-    
-def _get_youtube_access_token():
-    """Obtiene un token de acceso fresco usando OAuth 2.0 y el Refresh Token"""
+
+def _youtube_token_request_data():
+    """Datos del refresh de OAuth 2.0 para YouTube"""
     if not all([YT_CLIENT_ID, YT_CLIENT_SECRET, YT_REFRESH_TOKEN]):
         raise ValueError("Faltan credenciales de OAuth para YouTube (Client ID, Client Secret o Refresh Token).")
-        
-    url = "https://oauth2.googleapis.com/token"
-    data = {
+    
+    return {
         "client_id": YT_CLIENT_ID,
         "client_secret": YT_CLIENT_SECRET,
         "refresh_token": YT_REFRESH_TOKEN,
         "grant_type": "refresh_token"
     }
-    
-    response = requests.post(url, data=data)
-    if response.status_code != 200:
-        print(f"❌ Error de Google Auth ({response.status_code}): {response.text}")
-        response.raise_for_status()
-    
-    tokens = response.json()
-    return tokens.get("access_token")
-
-def clear_playlist_items(playlist_item_ids):
-    """Elimina los videos de la playlist de YouTube"""
-    if not playlist_item_ids:
-        print("No hay items para borrar de la playlist.")
-        return
-        
-    try:
-        access_token = _get_youtube_access_token()
-    except Exception as e:
-        print(f"❌ Error obteniendo token de acceso para YouTube: {e}")
-        return
-        
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    
-    url = "https://www.googleapis.com/youtube/v3/playlistItems"
-    
-    deleted_count = 0
-    for item_id in playlist_item_ids:
+
+class _AccessTokenCache:
+    """Guarda el access token de OAuth en memoria hasta poco antes de que caduque"""
+    
+    def __init__(self, refresh_margin):
+        self.refresh_margin = refresh_margin
+        self.token = None
+        self.expires_at = 0.0
+    
+    def get(self):
+        if self.token and time.monotonic() < self.expires_at - self.refresh_margin:
+            return self.token
+        return None
+    
+    def store(self, tokens):
+        """Guarda la respuesta del endpoint de tokens y devuelve el access token"""
+        self.token = tokens.get("access_token")
+        self.expires_at = time.monotonic() + float(tokens.get("expires_in", 3600))
+        return self.token
+    
+    def invalidate(self):
+        self.token = None
+        self.expires_at = 0.0
+
+_youtube_token_cache = _AccessTokenCache(YT_TOKEN_REFRESH_MARGIN)
+
+def _retry_delay(response, attempt):
+    """Segundos de espera antes de reintentar: Retry-After si viene, si no backoff exponencial"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
         try:
-            response = requests.delete(f"{url}?id={item_id}", headers=headers)
-            if response.status_code == 204:
-                deleted_count += 1
-                print(f"🗑️ Eliminado item {item_id} de la playlist")
-            else:
-                print(f"⚠️ Error eliminando {item_id}: {response.status_code} - {response.text}")
-        except Exception as e:
-            print(f"❌ Excepción al eliminar {item_id}: {e}")
-            
-    print(f"🧹 Se eliminaron {deleted_count} de {len(playlist_item_ids)} videos de la playlist.")
-
-def get_transcripts(video_urls):
-    """Obtiene transcripciones con Apify"""
+            return min(float(retry_after), 60.0)
+        except ValueError:
+            pass
+    return min(0.5 * (2 ** attempt), 30.0)
+
+def _is_retryable_status(status_code):
+    """Solo 5xx: los 429 ya los reintenta http_client (hasta RATE_LIMIT_MAX_RETRIES)"""
+    return status_code >= 500
+
+def _clear_summary(playlist_item_ids, deleted):
+    """Resumen del borrado: items eliminados y los que fallaron"""
+    deleted_set = set(deleted)
+    failed = [item_id for item_id in playlist_item_ids if item_id not in deleted_set]
+    log.info("🧹 Se eliminaron %d de %d videos de la playlist.", len(deleted), len(playlist_item_ids))
+    if failed:
+        log.warning("⚠️ No se pudieron eliminar %d items: %s", len(failed), failed)
+    return {"deleted": list(deleted), "failed": failed}
+
+def _apify_request(video_urls):
+    """URL y payload de la llamada síncrona al actor de transcripts de Apify"""
     url = f"https://api.apify.com/v2/acts/karamelo~youtube-transcripts/run-sync-get-dataset-items?token={APIFY_TOKEN}"
     
     # Payload completo sin especificar país (para evitar error de proxy)
@@ -265,23 +261,77 @@ def get_transcripts(video_urls):
         "datePublishedBoolean": True,
         "relativeDateTextBoolean": True
     }
+    return url, payload
+
+def _apify_http_error(status_code, body):
+    """Error de una llamada a Apify que no devolvió 200 o 201"""
+    log.error("Error HTTP %s de Apify: %s", status_code, body[:1000])
+    return ValueError(f"Apify returned HTTP {status_code}")
+
+def _split_cached_transcripts(video_urls, video_ids):
+    """Separa los transcripts que ya están en caché de los que hay que pedir a Apify"""
+    transcripts_map = {}
+    missing_urls = []
+    missing_ids = []
+    
+    for video_url, video_id in zip(video_urls, video_ids):
+        cached = transcript_cache.get(video_id)
+        if cached is not None:
+            transcripts_map[video_id] = cached
+        else:
+            missing_urls.append(video_url)
+            missing_ids.append(video_id)
+    
+    log.info("♻️ Transcripts en caché: %d, pendientes en Apify: %d", len(transcripts_map), len(missing_ids))
+    return transcripts_map, missing_urls, missing_ids
+
+class _TranscriptAssignment:
+    """Asigna los registros de Apify a sus video IDs a medida que llegan y los guarda en caché
+
+    Un registro con un ID que no se pidió, o repetido, se descarta: guardarlo bajo otro
+    video dejaría un transcript equivocado en la caché durante días. Los registros sin
+    video ID solo se reparten por orden (en finish) si hay exactamente uno por cada video
+    que sigue sin transcript; si no cuadran (Apify omitió o falló algún video) no se sabe
+    cuál es cuál y se descartan.
+    """
     
-    print(f"Enviando petición a Apify con URLs: {video_urls}")
-    response = requests.post(url, json=payload, timeout=300)
-    
-    # Verificar si la respuesta es exitosa (200 o 201 son OK)
-    if response.status_code not in [200, 201]:
-        print(f"Error HTTP {response.status_code}: {response.text}")
-        raise ValueError(f"Apify returned HTTP {response.status_code}")
-    
-    result = response.json()
-    
-    # Verificar si hay error en la respuesta
-    if isinstance(result, dict) and 'error' in result:
-        print(f"Error de Apify: {result['error']}")
-        raise ValueError(f"Apify error: {result['error']}")
-    
-    return result
+    def __init__(self, missing_ids):
+        self.missing_ids = list(missing_ids)
+        self.pending = set(self.missing_ids)
+        self.unassigned = []
+        self.unassigned_count = 0
+        self.fetched = {}
+    
+    def add(self, record):
+        video_id = record["video_id"]
+        if video_id is None:
+            # Solo hace falta guardar tantos como videos pedidos; el resto solo se cuenta
+            self.unassigned_count += 1
+            if len(self.unassigned) < len(self.missing_ids):
+                self.unassigned.append(record["text"])
+        elif video_id in self.pending:
+            self._store(video_id, record["text"])
+            self.pending.discard(video_id)
+        else:
+            log.warning("⚠️ Transcript descartado para video_id %s (%s)", video_id,
+                        "repetido" if video_id in self.fetched else "no solicitado")
+    
+    def finish(self):
+        """Reparte los registros sin ID (si cuadran) y devuelve {video_id: transcript}"""
+        remaining = [video_id for video_id in self.missing_ids if video_id in self.pending]
+        if self.unassigned_count and self.unassigned_count == len(remaining):
+            for video_id, text in zip(remaining, self.unassigned):
+                self._store(video_id, text)
+        elif self.unassigned_count:
+            log.warning("⚠️ %d transcripts sin video_id para %d videos pendientes: se descartan",
+                        self.unassigned_count, len(remaining))
+        self.unassigned = []
+        return self.fetched
+    
+    def _store(self, video_id, text):
+        self.fetched[video_id] = text
+        transcript_cache.set(video_id, text)
+        log.debug("Transcript asignado a video_id: %s (%d caracteres)", video_id, len(text))
 
 def _build_summary_prompt(text, video_title):
     """Construye el prompt para generar el resumen"""
@@ -315,8 +365,30 @@ IMPORTANTE:
 TRANSCRIPT:
 {text}"""
 
-def _call_openrouter(prompt):
-    """Llama a Gemini a través de OpenRouter (evita bloqueo de IP)"""
+def _build_chunk_prompt(text, video_title, part, total_parts):
+    """Construye el prompt de la fase map: notas de una parte del transcript"""
+    return f"""Esta es la parte {part} de {total_parts} del transcript del video "{video_title}".
+
+Extrae notas detalladas de ESTA parte en texto plano con viñetas:
+- Todos los temas tratados, en el orden en que aparecen
+- Datos específicos, cifras, nombres y fechas
+- Argumentos y conclusiones de los participantes
+
+No escribas introducción ni conclusión; solo las notas.
+
+TRANSCRIPT (parte {part}/{total_parts}):
+{text}"""
+
+def _build_reduce_prompt(notes, video_title, total_parts):
+    """Construye el prompt de la fase reduce a partir de las notas de cada parte"""
+    preamble = (
+        f"El transcript de este video era demasiado largo y se ha condensado en notas "
+        f"de sus {total_parts} partes, en orden. Trátalas como el transcript completo.\n\n"
+    )
+    return preamble + _build_summary_prompt(notes, video_title)
+
+def _openrouter_request(prompt, stream=False):
+    """URL, headers y payload de la llamada a OpenRouter (stream=True para SSE)"""
     url = "https://openrouter.ai/api/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {OPENROUTER_KEY}",
@@ -325,36 +397,43 @@ def _call_openrouter(prompt):
         "X-Title": "Video Resumen Processor"
     }
     payload = {
-        "model": "google/gemini-2.0-flash-001",
+        "model": OPENROUTER_MODEL,
         "messages": [{"role": "user", "content": prompt}],
         "max_tokens": 8000
     }
-    
-    response = requests.post(url, headers=headers, json=payload, timeout=120)
-    data = response.json()
-    
-    if response.status_code != 200:
-        error_msg = data.get('error', {}).get('message', f'HTTP {response.status_code}')
-        raise ValueError(f"OpenRouter error: {error_msg}")
+    if stream:
+        payload["stream"] = True
+    return url, headers, payload
+
+def _parse_openrouter_response(status_code, data):
+    """Extrae el texto generado de una respuesta de OpenRouter"""
+    if status_code != 200:
+        error_msg = data.get('error', {}).get('message', f'HTTP {status_code}')
+        error_class = RateLimitError if status_code == 429 else ValueError
+        raise error_class(f"OpenRouter error: {error_msg}")
     
     if 'choices' in data and len(data['choices']) > 0:
         return data['choices'][0]['message']['content']
     else:
         raise ValueError(f"OpenRouter: respuesta inesperada: {json.dumps(data)[:300]}")
 
-def _call_gemini_direct(prompt):
-    """Llama directamente a la API de Gemini"""
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_KEY}"
+def _gemini_request(prompt, stream=False):
+    """URL y payload de la llamada directa a la API de Gemini (stream=True para SSE)"""
+    if stream:
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={GEMINI_KEY}"
+    else:
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_KEY}"
     payload = {
         "contents": [{"parts": [{"text": prompt}]}]
     }
-    
-    response = requests.post(url, json=payload, timeout=120)
-    data = response.json()
-    
-    if response.status_code != 200:
-        error_msg = data.get('error', {}).get('message', f'HTTP {response.status_code}')
-        raise ValueError(f"Gemini API error: {error_msg}")
+    return url, payload
+
+def _parse_gemini_response(status_code, data):
+    """Extrae el texto generado de una respuesta de Gemini"""
+    if status_code != 200:
+        error_msg = data.get('error', {}).get('message', f'HTTP {status_code}')
+        error_class = RateLimitError if status_code == 429 else ValueError
+        raise error_class(f"Gemini API error: {error_msg}")
     
     if 'candidates' in data:
         return data['candidates'][0]['content']['parts'][0]['text']
@@ -363,114 +442,136 @@ def _call_gemini_direct(prompt):
     else:
         raise ValueError("Gemini: No se recibieron candidates en la respuesta")
 
-def summarize_with_gemini(text, video_title="Video", max_retries=3):
-    """Resume texto usando OpenRouter (primario) o Gemini directo (fallback)"""
-    prompt = _build_summary_prompt(text, video_title)
-    
-    last_error = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            # Intentar con OpenRouter primero (evita bloqueo de IP de Render)
-            if OPENROUTER_KEY:
-                print(f"Intento {attempt}/{max_retries} via OpenRouter...")
-                result = _call_openrouter(prompt)
-                print("✅ Resumen generado via OpenRouter")
-                return result
-            
-            # Fallback: Gemini directo (funciona localmente, puede fallar en Render)
-            if GEMINI_KEY:
-                print(f"Intento {attempt}/{max_retries} via Gemini directo...")
-                result = _call_gemini_direct(prompt)
-                print("✅ Resumen generado via Gemini directo")
-                return result
-            
-            raise ValueError("No hay API key configurada. Configura OPENROUTER_KEY o GEMINI_KEY.")
-            
-        except ValueError as e:
-            last_error = str(e)
-            print(f"❌ Error (intento {attempt}): {e}")
-            
-            # Si OpenRouter falló, intentar Gemini directo como fallback
-            if OPENROUTER_KEY and GEMINI_KEY and 'OpenRouter' in str(e):
-                try:
-                    print(f"Intentando fallback con Gemini directo...")
-                    result = _call_gemini_direct(prompt)
-                    print("✅ Resumen generado via Gemini directo (fallback)")
-                    return result
-                except ValueError as e2:
-                    print(f"❌ Fallback Gemini también falló: {e2}")
-                    last_error = f"OpenRouter: {e} | Gemini: {e2}"
-            
-            if attempt < max_retries:
-                wait_time = attempt * 3
-                print(f"Esperando {wait_time}s antes de reintentar...")
-                time.sleep(wait_time)
-            
-        except requests.exceptions.RequestException as e:
-            last_error = str(e)
-            print(f"Error de conexión (intento {attempt}): {e}")
-            if attempt < max_retries:
-                time.sleep(attempt * 3)
-    
-    raise ValueError(f"Error al generar resumen después de {max_retries} intentos: {last_error}")
+def _record_llm_latency(provider, started):
+    """Latencia de una llamada correcta al LLM: alimenta el hedging y /metrics"""
+    elapsed = time.monotonic() - started
+    hedging.observe(provider, elapsed)
+    metrics.LLM_SECONDS.observe(elapsed, provider=provider)
 
-def summarize_multiple_videos(transcripts, titles):
-    """Resume múltiples videos y combina los resultados"""
-    all_summaries = []
-    
-    for i, (transcript, title) in enumerate(zip(transcripts, titles)):
-        print(f"🤖 Generando resumen para video {i+1}/{len(titles)}: {title}")
-        summary = summarize_with_gemini(transcript, title)
-        all_summaries.append(summary)
-    
-    # Combinar todos los resúmenes
-    combined_summary = "\n\n".join(all_summaries)
-    return combined_summary
-
-def format_as_html(summary, transcripts, titles, video_urls=None, channel_titles=None):
-    """Formatea el contenido como HTML con 3 niveles de análisis"""
-    html = f"""
-    <h1>Análisis de Videos</h1>
-    """
-    
-    html += f"""
-    {summary}
-    
-    <hr>
-    <h2>NIVEL 3: Transcripts y Enlaces</h2>
-    <p><i>Este nivel contiene información detallada y los enlaces directos a cada video procesado.</i></p>
+def _sse_data(line):
+    """Contenido de una línea 'data: ...' de un stream SSE (None para el resto)"""
+    if not line.startswith("data:"):
+        return None
+    return line[5:].strip()
+
+def _openrouter_stream_text(data):
+    """Texto de un evento del stream de OpenRouter ('' si no trae, None al terminar)"""
+    if data == "[DONE]":
+        return None
+    event = json.loads(data)
+    if 'error' in event:
+        raise ValueError(f"OpenRouter error: {event['error'].get('message', 'Error desconocido')}")
+    choices = event.get('choices') or [{}]
+    return (choices[0].get('delta') or {}).get('content') or ""
+
+def _gemini_stream_text(data):
+    """Texto de un evento del stream de Gemini ('' si no trae)"""
+    event = json.loads(data)
+    if 'error' in event:
+        raise ValueError(f"Gemini API error: {event['error'].get('message', 'Error desconocido')}")
+    candidates = event.get('candidates') or [{}]
+    parts = (candidates[0].get('content') or {}).get('parts') or []
+    return "".join(part.get('text', "") for part in parts)
+
+def _get_cached_summary(text, prompt):
+    """Busca en la caché, en el mismo orden de proveedores que se usaría"""
+    for model in _configured_models():
+        cached = summary_cache.get(_summary_cache_key(text, prompt, model))
+        if cached is not None:
+            log.info("♻️ Resumen recuperado de caché (%s)", model)
+            return cached
+    return None
+
+def _combine_chunk_notes(notes):
+    """Une las notas de cada parte en el texto que recibe la fase reduce"""
+    total = len(notes)
+    return "\n\n".join(
+        f"--- Parte {i + 1}/{total} ---\n{part_notes}" for i, part_notes in enumerate(notes)
+    )
+
+def _configured_models():
+    """Modelos disponibles según las API keys configuradas, en orden de preferencia"""
+    models = []
+    if OPENROUTER_KEY:
+        models.append(OPENROUTER_MODEL)
+    if GEMINI_KEY:
+        models.append(GEMINI_MODEL)
+    return models
+
+def _summary_cache_key(text, prompt, model):
+    """Clave de la caché de resúmenes: transcript + prompt + modelo"""
+    return make_key(text, prompt, model)
+
+def _hedge_providers(prompt, call_openrouter, call_gemini):
+    """(principal, respaldo) para hedging: OpenRouter primero, como en el flujo normal"""
+    return (
+        ("openrouter", lambda: call_openrouter(prompt)),
+        ("gemini", lambda: call_gemini(prompt)),
+    )
+
+_HEDGE_MODELS = {"openrouter": OPENROUTER_MODEL, "gemini": GEMINI_MODEL}
+
+def _check_llm_circuits():
+    """Falla al instante si todos los proveedores LLM configurados tienen el circuito abierto"""
+    providers = [name for name, key in (("openrouter", OPENROUTER_KEY), ("gemini", GEMINI_KEY)) if key]
+    if providers and not any(is_available(name) for name in providers):
+        raise CircuitOpenError(f"Circuito abierto para {', '.join(providers)}: no se llama al LLM")
+
+def _use_openrouter():
+    """OpenRouter es el principal salvo que su circuito esté abierto y haya Gemini directo"""
+    return bool(OPENROUTER_KEY) and (is_available("openrouter") or not GEMINI_KEY)
+
+def compact_for_summary(transcript, title="Video"):
+    """Etapa previa al LLM: compacta el transcript y registra los tokens ahorrados
+
+    Devuelve (texto, tokens_antes, tokens_después); el texto original se sigue usando
+    en el bloque HTML del NIVEL 3.
     """
-    
+    text, tokens_before, tokens_after = compact_with_stats(transcript)
+    metrics.TRANSCRIPT_TOKENS.observe(tokens_before, phase="raw")
+    metrics.TRANSCRIPT_TOKENS.observe(tokens_after, phase="compacted")
+    if tokens_before and tokens_after != tokens_before:
+        saved = 100 * (tokens_before - tokens_after) / tokens_before
+        log.debug("✂️ Transcript compactado '%s': %d → %d tokens (-%.0f%%)", title, tokens_before, tokens_after, saved)
+    return text, tokens_before, tokens_after
+
+def _format_video_block(index, transcript, title, url, channel):
+    """Bloque HTML del NIVEL 3 para un video (index empieza en 0), con todo escapado"""
+    return html_document.video_block(index, transcript, title, url, channel)
+
+def _format_documents(summary, video_blocks, max_bytes=READWISE_MAX_DOCUMENT_BYTES):
+    """Une el resumen y los bloques de cada video; varios documentos si se pasa de max_bytes"""
+    with metrics.STAGE_SECONDS.time(stage="html_build"):
+        return html_document.build_documents(summary, video_blocks, max_bytes)
+
+def _video_blocks(transcripts, titles, video_urls=None, channel_titles=None):
+    """Bloques del NIVEL 3 de cada video"""
     # Manejar caso de listas vacías para evitar errores
     if not video_urls: video_urls = ["#"] * len(titles)
     if not channel_titles: channel_titles = ["Desconocido"] * len(titles)
     
-    for i, (transcript, title, url, channel) in enumerate(zip(transcripts, titles, video_urls, channel_titles)):
-        html += f"""
-        <div style="margin-bottom: 30px; padding: 15px; border: 1px solid #eee; border-radius: 8px;">
-            <h3 style="margin-top: 0;">Video {i+1}: {title}</h3>
-            <p>
-                <b>📺 Canal:</b> {channel}<br>
-                <b>🔗 Link:</b> <a href="{url}">{url}</a>
-            </p>
-            <details>
-                <summary style="cursor: pointer; color: #555; text-decoration: underline;">Ver Transcript del Video</summary>
-                <div style="background-color: #f9f9f9; padding: 10px; border-left: 3px solid #ccc; margin-top: 10px;">
-                    {transcript}
-                </div>
-            </details>
-        </div>
-        """
-    
-    return html
+    return [
+        _format_video_block(i, transcript, title, url, channel)
+        for i, (transcript, title, url, channel) in enumerate(zip(transcripts, titles, video_urls, channel_titles))
+    ]
+
+def format_as_documents(summary, transcripts, titles, video_urls=None, channel_titles=None):
+    """Documento(s) HTML con los 3 niveles de análisis; varios si supera READWISE_MAX_DOCUMENT_BYTES"""
+    return _format_documents(summary, _video_blocks(transcripts, titles, video_urls, channel_titles))
 
-def save_to_readwise(html_content, title, video_url=None):
-    """Guarda en Readwise"""
-    url = "https://readwise.io/api/v3/save/"
+READWISE_SAVE_URL = "https://readwise.io/api/v3/save/"
+READWISE_DEFAULT_URL = "https://drive.google.com/drive/folders/1fiXci1ERcnRSN_SfwpJCZA-3z0W63xvC"
+# "digest": un documento con todos los videos; "per_video": uno por video, guardados a la vez
+READWISE_SAVE_MODE = os.getenv("READWISE_SAVE_MODE", "digest")
+READWISE_MAX_RETRIES = int(os.getenv("READWISE_MAX_RETRIES", "4"))
+READWISE_TIMEOUT = (10, float(os.getenv("READWISE_READ_TIMEOUT", "60")))
+
+def _readwise_request(html_content, title, video_url=None):
+    """Headers y payload para guardar un documento en Readwise"""
     headers = {"Authorization": f"Token {READWISE_TOKEN}"}
     
     # Usar la URL del video si se proporciona, sino usar la URL por defecto
-    article_url = video_url if video_url else "https://drive.google.com/drive/folders/1fiXci1ERcnRSN_SfwpJCZA-3z0W63xvC"
+    article_url = video_url if video_url else READWISE_DEFAULT_URL
     
     payload = {
         "url": article_url,
@@ -481,89 +582,48 @@ def save_to_readwise(html_content, title, video_url=None):
         "location": "new",
         "saved_using": "python-api"
     }
-    response = requests.post(url, headers=headers, json=payload)
-    return response.json()
+    return headers, payload
 
-def process_playlist():
-    """Ejecuta el workflow completo"""
-    playlist_id = "PL_0E-MP0df5mxMX0NrZxSCufMcK6e9z3b"
-    
+def _readwise_error(status_code, body):
+    """Error de un guardado que Readwise no aceptó (200 = ya existía, 201 = creado)"""
+    return ValueError(f"Readwise error HTTP {status_code}: {body[:300]}")
+
+def _already_saved(key, title):
+    """Respuesta del guardado anterior del mismo documento (idempotencia entre reintentos)"""
+    saved = readwise_ledger.get(key)
+    if saved is not None:
+        log.info("♻️ Documento ya guardado en Readwise: %s", title)
+    return saved
+
+def _digest_url(html_content):
+    """URL propia de cada resumen: Readwise devuelve el documento existente si la URL se repite"""
+    return f"{READWISE_DEFAULT_URL}?resumen={make_key(html_content)[:16]}"
+
+def _document_parts(documents, title, video_url=None):
+    """(html, título, url) de cada parte de un resumen repartido en varios documentos"""
+    base_url = video_url or _digest_url(documents[0])
+    total = len(documents)
+    return [
+        (document, html_document.part_title(title, part, total), html_document.part_url(base_url, part))
+        for part, document in enumerate(documents, start=1)
+    ]
+
+async def _run_and_close(coro):
+    """Espera coro y cierra los clientes HTTP del loop antes de que asyncio.run lo cierre"""
     try:
-        print(f"[{datetime.now()}] 🚀 Iniciando procesamiento...")
-        send_notification("🚀 Iniciando procesamiento de videos...")
-        
-        # Paso 1: Obtener videos
-        print("📹 Obteniendo videos de la playlist...")
-        video_urls, titles, video_ids, playlist_item_ids, channel_titles = get_playlist_videos(playlist_id)
-        print(f"✅ Encontrados {len(video_urls)} videos")
-        print(f"Video IDs: {video_ids}")
-        print(f"Títulos: {titles}")
-        print(f"Canales: {channel_titles}")
-        
-        # Paso 2: Obtener transcripciones
-        print("📝 Obteniendo transcripciones...")
-        transcripts_data = get_transcripts(video_urls)
-        print("✅ Transcripciones obtenidas")
-        
-        # Extraer captions y emparejar con video_ids
-        captions = []
-        captions_map = {}  # Mapa video_id -> transcript
-        
-        for item in transcripts_data:
-            if isinstance(item, dict):
-                # Obtener el video_id de este item
-                item_video_id = item.get('videoId') or item.get('id')
-                
-                if 'captions' in item and item['captions']:
-                    # Unir todos los textos de los captions en un solo string
-                    caption_texts = [caption['text'] if isinstance(caption, dict) and 'text' in caption else str(caption) for caption in item['captions']]
-                    full_transcript = " ".join(caption_texts)
-                    
-                    if item_video_id:
-                        captions_map[item_video_id] = full_transcript
-                        print(f"Transcript asignado a video_id: {item_video_id}")
-                    else:
-                        # Si no hay video_id, agregar a la lista en orden
-                        captions.append(full_transcript)
-        
-        # Reconstruir la lista de captions en el orden correcto de video_ids
-        if captions_map:
-            captions = []
-            for vid_id in video_ids:
-                if vid_id in captions_map:
-                    captions.append(captions_map[vid_id])
-                else:
-                    print(f"⚠️ No se encontró transcript para video_id: {vid_id}")
-                    captions.append("")
-        
-        print(f"Total de captions extraídos: {len(captions)}")
-        
-        # Paso 3: Resumir cada video individualmente
-        print("🤖 Generando resúmenes con Gemini...")
-        summary = summarize_multiple_videos(captions, titles)
-        print("✅ Resúmenes generados")
-        
-        # Paso 4: Formatear HTML
-        print("🎨 Formateando HTML...")
-        html_content = format_as_html(summary, captions, titles, video_urls, channel_titles)
-        
-        # Paso 5: Guardar en Readwise
-        print("💾 Guardando en Readwise...")
-        result = save_to_readwise(html_content, f"Video Resumen - {datetime.now().strftime('%Y-%m-%d')}", None)
-        print(f"✅ Guardado en Readwise: {result}")
-        
-        # Paso 6: Limpiar la playlist
-        print("🧹 Limpiando la playlist en YouTube...")
-        clear_playlist_items(playlist_item_ids)
-        
-        send_notification("✅ Video Resumen completado, guardado en Readwise y playlist limpiada!")
-        print(f"[{datetime.now()}] ✅ Proceso completado exitosamente")
-        
-    except Exception as e:
-        error_msg = f"❌ Error en workflow: {str(e)}"
-        print(f"[{datetime.now()}] {error_msg}")
-        send_notification(error_msg)
-        raise
+        return await coro
+    finally:
+        await http_client.aclose_all()
+
+def process_playlist(playlist_id=PLAYLIST_ID, name=None):
+    """Ejecuta el workflow completo (el pipeline por etapas de async_workflow)"""
+    import async_workflow
+    return asyncio.run(_run_and_close(async_workflow.process_playlist(playlist_id, name)))
+
+def process_playlists(playlists=None):
+    """Procesa a la vez todas las playlists configuradas en PLAYLISTS"""
+    import async_workflow
+    return asyncio.run(_run_and_close(async_workflow.process_playlists(playlists)))
 
 if __name__ == "__main__":
-    process_playlist()
+    process_playlists()